@@ -1,13 +1,33 @@
+import argparse
+import asyncio
 import json
 import os
 import time
 import random
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
 from pathlib import Path
 
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+
+from batch_mode import batch_request, run_batch, write_requests
+from call_metrics import add_metrics_args, configure_metrics_from_args, get_tally, record_call, report_metrics
+from conversation_context import ConversationContext, digest_summarizer
+from dag_scheduler import CallPool, DagScheduler
+from dead_letter import CallFailed, DeadLetterQueue
+from generation_budget import add_budget_args, budget_params, configure_budgets_from_args, report_budgets
+from instruments import add_instrument_args, load_instruments, load_instruments_from_args
+from rate_limiter import alimited_create, configure_limiter, get_limiter, is_rate_limit_error, limited_create
+from response_cache import add_cache_args, cache_lookup, cache_store, configure_cache_from_args
+from result_store import add_store_args, close_store, configure_store_from_args, store_answers, store_turns
+from sharding import add_shard_args, configure_shard_from_args
+from streaming import ChoiceAnchor, SentenceLimit, aread_stream, read_stream, stream_usage
+from transcript_jsonl import add_transcript_args, footer_event, header_event, load_transcript, save_transcript
+from turn_journal import TurnJournal
+from work_queue import HEARTBEAT_SECONDS, Heartbeat, WorkQueue, add_queue_args, format_status, worker_id
 
 # =========================
 # CONFIG
@@ -16,25 +36,53 @@ from openai import OpenAI
 MODEL_NAME = "gpt-4o-mini"
 
 CHARACTERS_PATH    = "Characters/characters.json"
-PHQ9_QUEST_PATH    = "CommonQuestions/PHQ9.json"
-GAD7_QUEST_PATH    = "CommonQuestions/GAD7.json"
-ASRM_QUEST_PATH    = "CommonQuestions/ASRM.json"
+INSTRUMENTS_DIR    = "CommonQuestions"   # one <SCALE>.json per instrument (see instruments.py)
 
 BASE_CONV_DIR      = "Conversations"
-PHQ9_QA_DIR        = os.path.join(BASE_CONV_DIR, "PHQ9", "Question based Conversation")
-GAD7_QA_DIR        = os.path.join(BASE_CONV_DIR, "GAD7", "Question based Conversation")
-ASRM_QA_DIR        = os.path.join(BASE_CONV_DIR, "ASRM", "Question based Conversation")
 CASUAL_DIR         = os.path.join(BASE_CONV_DIR, "Casual")
+JOURNAL_DIR        = os.path.join(BASE_CONV_DIR, "Journal", "Casual")
+DEAD_LETTER_PATH   = os.path.join(BASE_CONV_DIR, "dead_letter.jsonl")
+USAGE_PATH         = os.path.join(BASE_CONV_DIR, "usage_by_persona.json")
+
+BATCH_DIR           = "Batch"
+BATCH_REQUESTS_PATH = os.path.join(BATCH_DIR, "requests.jsonl")
+BATCH_STATE_PATH    = os.path.join(BATCH_DIR, "batch_state.json")
 
 ROUNDS_PER_CHARACTER = 40  # 40 friend↔persona pairs = 40 turns
+DEFAULT_CONCURRENCY  = 8   # personas in flight at once for the async engine
+SEED                 = None  # optional sampling seed (sent to the API and part of the cache key)
+CONTEXT_TOKENS       = 600   # token budget of the recent-turns window in casual prompts
+SUMMARY_TOKENS       = 150   # token budget of the summary of turns that left the window
+SUMMARIZE_EVICTED    = False # fold turns that leave the window into a running summary
+STREAM               = False # stream completions: time-to-first-token + early stop (see STOP POLICIES)
+TRANSCRIPT_FORMAT    = "json"  # "jsonl": one event per line, casual turns appended as they happen
+
+# Every instrument in CommonQuestions/ (main() narrows this with --instruments)
+INSTRUMENTS = load_instruments(INSTRUMENTS_DIR)
+
+def qa_dir(scale: str) -> str:
+    return os.path.join(BASE_CONV_DIR, scale, "Question based Conversation")
+
+def transcript_file(out_dir: str, name: str) -> str:
+    """Path of a persona's transcript in `out_dir`, in the current --transcript-format."""
+    return os.path.join(out_dir, f"{safe_name(name)}.{TRANSCRIPT_FORMAT}")
 
 # Make folders
-for d in [PHQ9_QA_DIR, GAD7_QA_DIR, ASRM_QA_DIR, CASUAL_DIR]:
+for d in [qa_dir(scale) for scale in INSTRUMENTS] + [CASUAL_DIR]:
     os.makedirs(d, exist_ok=True)
 
 # Load env + init client
 load_dotenv(Path(__file__).parent / ".env")
-client = OpenAI()
+# max_retries=0: every retry goes through call_chat and the shared rate limiter,
+# so 429s / 5xx are paced and counted there instead of being retried inside the SDK
+client = OpenAI(max_retries=0)
+async_client = AsyncOpenAI(max_retries=0)
+
+# Units (questionnaire items, casual turns) whose call failed after all retries
+dead_letters = DeadLetterQueue(DEAD_LETTER_PATH)
+
+# Shared in-flight call limit; set while the DAG engine runs (--in-flight)
+CALL_POOL: Optional[CallPool] = None
 
 # =========================
 # UTILITIES
@@ -47,221 +95,470 @@ def safe_name(s: str) -> str:
 def backoff_sleep(attempt: int):
     time.sleep(1.25 + random.random() * (1.25 + attempt))
 
-def call_chat(messages: List[Dict], temperature: float = 0.7) -> str:
-    """Simple wrapper with retry/backoff."""
+def sampling_params(temperature: float) -> Dict:
+    params = {"temperature": temperature}
+    if SEED is not None:
+        params["seed"] = SEED
+    return params
+
+def call_slot():
+    """One slot of CALL_POOL around an async API call (no limit outside the DAG engine)."""
+    return CALL_POOL.slot() if CALL_POOL is not None else nullcontext()
+
+def cache_params(params: Dict, stop_when) -> Dict:
+    """A streamed answer cut by a stop policy differs from the full one, so the policy is part of the key."""
+    if STREAM and stop_when is not None:
+        return {**params, "early_stop": stop_when.name}
+    return params
+
+def stream_fields(result) -> Dict:
+    """record_call fields of a streamed call."""
+    return {"ttft": result.ttft, "early_stopped": result.stopped, "finish_reason": result.finish_reason}
+
+def create_once(messages: List[Dict], params: Dict, stop_when, started: float):
+    """One API call -> (text, usage, streaming fields for record_call)."""
+    if not STREAM:
+        resp = limited_create(client, model=MODEL_NAME, messages=messages, **params)
+        return (resp.choices[0].message.content, getattr(resp, "usage", None),
+                {"finish_reason": resp.choices[0].finish_reason})
+    stream = limited_create(client, model=MODEL_NAME, messages=messages,
+                            stream=True, stream_options={"include_usage": True}, **params)
+    result = read_stream(stream, stop_when, started)
+    return result.text, stream_usage(result, messages), stream_fields(result)
+
+async def acreate_once(messages: List[Dict], params: Dict, stop_when, started: float):
+    """Async twin of create_once; holds a CALL_POOL slot until the stream is closed."""
+    async with call_slot():
+        if not STREAM:
+            resp = await alimited_create(async_client, model=MODEL_NAME, messages=messages, **params)
+            return (resp.choices[0].message.content, getattr(resp, "usage", None),
+                    {"finish_reason": resp.choices[0].finish_reason})
+        stream = await alimited_create(async_client, model=MODEL_NAME, messages=messages,
+                                       stream=True, stream_options={"include_usage": True}, **params)
+        result = await aread_stream(stream, stop_when, started)
+    return result.text, stream_usage(result, messages), stream_fields(result)
+
+def call_chat(messages: List[Dict], temperature: float = 0.7,
+              meta: Optional[Dict] = None, stop_when=None, **extra) -> str:
+    """
+    Simple wrapper with cache lookup and retry/backoff; raises CallFailed when retries run out.
+    `meta` (persona, phase, scale, question_id, turn, role) labels the per-call metrics record,
+    and its role picks the max_tokens / stop budget; `stop_when` is the early-stop policy used with
+    --stream; `extra` (e.g. response_format) is passed to the API. Budget and extra are part of the cache key.
+    """
+    params = {**sampling_params(temperature), **budget_params((meta or {}).get("role")), **extra}
+    key, hit = cache_lookup(MODEL_NAME, messages, **cache_params(params, stop_when))
+    if hit is not None:
+        record_call(meta, MODEL_NAME, source="cache")
+        return hit
+    started = time.perf_counter()
     for attempt in range(3):
         try:
-            resp = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=messages,
-                temperature=temperature,
-            )
-            return resp.choices[0].message.content.strip()
+            text, usage, streamed = create_once(messages, params, stop_when, started)
+            record_call(meta, MODEL_NAME, usage,
+                        latency=time.perf_counter() - started, retries=attempt, **streamed)
+            return cache_store(key, text.strip(), MODEL_NAME)
         except Exception as e:
             if attempt == 2:
-                return f"[ERROR] {type(e).__name__}: {e}"
-            backoff_sleep(attempt)
+                record_call(meta, MODEL_NAME, latency=time.perf_counter() - started,
+                            retries=attempt, error_type=type(e).__name__)
+                raise CallFailed(e, attempts=attempt + 1)
+            if not is_rate_limit_error(e):  # 429s: the shared limiter already paused
+                backoff_sleep(attempt)
 
-def load_questions(path: str) -> List[Dict]:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)["questions"]
+async def acall_chat(messages: List[Dict], temperature: float = 0.7,
+                     meta: Optional[Dict] = None, stop_when=None, **extra) -> str:
+    """Async twin of call_chat for the concurrent engine."""
+    params = {**sampling_params(temperature), **budget_params((meta or {}).get("role")), **extra}
+    key, hit = cache_lookup(MODEL_NAME, messages, **cache_params(params, stop_when))
+    if hit is not None:
+        record_call(meta, MODEL_NAME, source="cache")
+        return hit
+    started = time.perf_counter()
+    for attempt in range(3):
+        try:
+            text, usage, streamed = await acreate_once(messages, params, stop_when, started)
+            record_call(meta, MODEL_NAME, usage,
+                        latency=time.perf_counter() - started, retries=attempt, **streamed)
+            return cache_store(key, text.strip(), MODEL_NAME)
+        except Exception as e:
+            if attempt == 2:
+                record_call(meta, MODEL_NAME, latency=time.perf_counter() - started,
+                            retries=attempt, error_type=type(e).__name__)
+                raise CallFailed(e, attempts=attempt + 1)
+            if not is_rate_limit_error(e):
+                await asyncio.sleep(1.25 + random.random() * (1.25 + attempt))
 
 # =========================
 # QUESTIONNAIRE RUNNERS
 # =========================
 
-def run_phq9(persona: dict, questions: List[Dict]) -> Dict:
-    """
-    PHQ-9: 0–3
-    Options: Not at all, Several days, More than half the days, Nearly every day
-    """
-    name = persona["name"]
-    system_prompt = persona["system_prompt"]
+# scale -> (option text, output folder); the option text ends with the
+# instrument's anchors, e.g. "Not at all | Several days | ... | Nearly every day."
+QUESTIONNAIRES = {scale: (inst.option_text, qa_dir(scale)) for scale, inst in INSTRUMENTS.items()}
 
-    results = {"scale": "PHQ9", "character": name, "Common Questions": []}
+# --stream: close the stream once "Choice: <option>" names a full option
+CHOICE_STOP = {scale: ChoiceAnchor(inst.options) for scale, inst in INSTRUMENTS.items()}
 
-    option_text = (
-        "Please answer briefly and realistically in character.\n"
-        "Then on a new line, write: Choice: <one of>\n"
-        "Not at all | Several days | More than half the days | Nearly every day."
-    )
+def questionnaire_messages(system_prompt: str, question: str, option_text: str) -> List[Dict]:
+    """One stateless questionnaire item: persona prompt + question + answer options."""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user",
+         "content": f"{question}\n\n{option_text}"}
+    ]
 
-    for q in questions:
-        question = q["content"]
-        answer = call_chat(
-            [
-                {"role": "system", "content": system_prompt},
-                {"role": "user",
-                 "content": f"{question}\n\n{option_text}"}
-            ],
-            temperature=0.6,
-        )
+def save_questionnaire(persona: dict, scale: str, questions: List[Dict],
+                       answers: List[str], out_dir: str) -> Dict:
+    """Assemble the Q&A file in question order and save it."""
+    name = persona["name"]
+
+    results = {"scale": scale, "character": name, "Common Questions": []}
+    for q, answer in zip(questions, answers):
         results["Common Questions"].append({
-            "Consultant": question,
+            "Consultant": q["content"],
             name: answer
         })
 
-    out_path = os.path.join(PHQ9_QA_DIR, f"{safe_name(name)}.json")
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    # written whole (via a temp file) in either format: fan-out, structured and
+    # batch answers arrive out of order or all at once, so there is nothing to append
+    save_transcript(transcript_file(out_dir, name), results, [q["question_id"] for q in questions])
+    store_answers(name, scale, questions, answers,
+                  "structured" if out_dir == STRUCTURED_DIRS.get(scale) else "questionnaire")
     return results
 
-def run_gad7(persona: dict, questions: List[Dict]) -> Dict:
+def ask_item(persona: dict, scale: str, q: Dict, option_text: str) -> str:
     """
-    GAD-7: 0–3
-    Same options as PHQ-9.
+    One questionnaire item. A call that fails after all retries is
+    dead-lettered and leaves an empty answer (scored as missing).
     """
-    name = persona["name"]
-    system_prompt = persona["system_prompt"]
-
-    results = {"scale": "GAD7", "character": name, "Common Questions": []}
-
-    option_text = (
-        "Please answer briefly and realistically in character.\n"
-        "Then on a new line, write: Choice: <one of>\n"
-        "Not at all | Several days | More than half the days | Nearly every day."
-    )
+    try:
+        return call_chat(
+            questionnaire_messages(persona["system_prompt"], q["content"], option_text),
+            temperature=0.6,
+            meta={"persona": persona["name"], "phase": "questionnaire", "role": "answer",
+                  "scale": scale, "question_id": q["question_id"]},
+            stop_when=CHOICE_STOP[scale],
+        )
+    except CallFailed as e:
+        dead_letters.record(e, persona["name"], "questionnaire", scale=scale, question_id=q["question_id"])
+        return ""
 
-    for q in questions:
-        question = q["content"]
-        answer = call_chat(
-            [
-                {"role": "system", "content": system_prompt},
-                {"role": "user",
-                 "content": f"{question}\n\n{option_text}"}
-            ],
+async def aask_item(persona: dict, scale: str, q: Dict, option_text: str) -> str:
+    try:
+        return await acall_chat(
+            questionnaire_messages(persona["system_prompt"], q["content"], option_text),
             temperature=0.6,
+            meta={"persona": persona["name"], "phase": "questionnaire", "role": "answer",
+                  "scale": scale, "question_id": q["question_id"]},
+            stop_when=CHOICE_STOP[scale],
         )
-        results["Common Questions"].append({
-            "Consultant": question,
-            name: answer
-        })
+    except CallFailed as e:
+        dead_letters.record(e, persona["name"], "questionnaire", scale=scale, question_id=q["question_id"])
+        return ""
 
-    out_path = os.path.join(GAD7_QA_DIR, f"{safe_name(name)}.json")
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
-    return results
+def run_questionnaire(persona: dict, questions: List[Dict], scale: str,
+                      option_text: str, out_dir: str) -> Dict:
+    """Ask every item of one scale in order and save the Q&A file."""
+    answers = [ask_item(persona, scale, q, option_text) for q in questions]
+    return save_questionnaire(persona, scale, questions, answers, out_dir)
+
+def select_instruments(selected: Dict) -> Dict[str, List[Dict]]:
+    """Narrow the run to `selected` (--instruments); returns scale -> questions in registry order."""
+    global INSTRUMENTS, ALL_TOPICS
+    INSTRUMENTS = dict(selected)
+    for scale in list(QUESTIONNAIRES):
+        if scale not in INSTRUMENTS:
+            del QUESTIONNAIRES[scale]
+    ALL_TOPICS = [topic for inst in INSTRUMENTS.values() for topic in inst.topics]
+    return {scale: inst.questions for scale, inst in INSTRUMENTS.items()}
+
+def run_questionnaires(persona: dict, questions: Dict[str, List[Dict]]) -> Dict[str, Dict]:
+    """Every selected instrument for one persona, item by item, in registry order."""
+    return {scale: run_questionnaire(persona, qs, scale, *QUESTIONNAIRES[scale])
+            for scale, qs in questions.items()}
 
-def run_asrm(persona: dict, questions: List[Dict]) -> Dict:
+def run_questionnaires_fanout(persona: dict, questions: Dict[str, List[Dict]]) -> Dict[str, Dict]:
     """
-    ASRM: 0–4
-    Options: Never, Rarely, Sometimes, Often, Very Often
+    Send every questionnaire item for one persona at once on a thread pool.
+    Items are stateless (persona prompt + one question), so only the
+    reassembly has to respect question order.
     """
-    name = persona["name"]
-    system_prompt = persona["system_prompt"]
+    jobs = [(scale, q) for scale, qs in questions.items() for q in qs]
 
-    results = {"scale": "ASRM", "character": name, "Common Questions": []}
+    def ask(job):
+        scale, q = job
+        return ask_item(persona, scale, q, QUESTIONNAIRES[scale][0])
 
-    option_text = (
-        "Please answer briefly and realistically in character.\n"
-        "Then on a new line, write: Choice: <one of>\n"
-        "Never | Rarely | Sometimes | Often | Very Often."
-    )
+    with ThreadPoolExecutor(max_workers=max(1, len(jobs))) as pool:
+        answers = list(pool.map(ask, jobs))
+
+    out, i = {}, 0
+    for scale, qs in questions.items():
+        out_dir = QUESTIONNAIRES[scale][1]
+        out[scale] = save_questionnaire(persona, scale, qs, answers[i:i + len(qs)], out_dir)
+        i += len(qs)
+    return out
+
+# =========================
+# STRUCTURED QUESTIONNAIRE MODE
+# =========================
+# One request per instrument: the persona gets every item at once and
+# answers through a JSON schema (in-character text + enum choice per
+# question_id). Answers are saved in the usual Q&A layout, ending with the
+# same "Choice: <option>" line the per-item prompts ask for.
+
+STRUCTURED_DIRS = {
+    scale: os.path.join(BASE_CONV_DIR, scale, "Structured Conversation")
+    for scale in QUESTIONNAIRES
+}
+
+def use_structured_dirs():
+    """Point every questionnaire read/write (save, resume, retry) at the structured folders."""
+    for scale, (option_text, _) in QUESTIONNAIRES.items():
+        QUESTIONNAIRES[scale] = (option_text, STRUCTURED_DIRS[scale])
+        os.makedirs(STRUCTURED_DIRS[scale], exist_ok=True)
+
+def structured_messages(system_prompt: str, scale: str, questions: List[Dict]) -> List[Dict]:
+    listing = "\n".join(f"q{q['question_id']}. {q['content']}" for q in questions)
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user",
+         "content": (
+             "Please answer each question below briefly and realistically in character.\n"
+             "For each one, give your answer in your own words and pick the option that fits best: "
+             f"{' | '.join(INSTRUMENTS[scale].options)}.\n\n"
+             f"{listing}"
+         )}
+    ]
+
+def structured_response_format(scale: str, questions: List[Dict]) -> Dict:
+    item = {
+        "type": "object",
+        "properties": {
+            "answer": {"type": "string"},
+            "choice": {"type": "string", "enum": INSTRUMENTS[scale].options},
+        },
+        "required": ["answer", "choice"],
+        "additionalProperties": False,
+    }
+    keys = [f"q{q['question_id']}" for q in questions]
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": f"{scale.lower()}_answers",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {k: item for k in keys},
+                "required": keys,
+                "additionalProperties": False,
+            },
+        },
+    }
+
+def parse_structured_answers(text: str, questions: List[Dict]) -> List[str]:
+    data = json.loads(text)
+    answers = []
+    for q in questions:
+        row = data[f"q{q['question_id']}"]
+        answers.append(f"{row['answer'].strip()}\nChoice: {row['choice']}")
+    return answers
 
+def structured_failed(persona: dict, scale: str, questions: List[Dict], e: Exception) -> List[str]:
+    """Dead-letter every item of the instrument; the retry re-runs the whole instrument."""
+    failure = e if isinstance(e, CallFailed) else CallFailed(e, attempts=1)
     for q in questions:
-        question = q["content"]
-        answer = call_chat(
-            [
-                {"role": "system", "content": system_prompt},
-                {"role": "user",
-                 "content": f"{question}\n\n{option_text}"}
-            ],
+        dead_letters.record(failure, persona["name"], "questionnaire", scale=scale, question_id=q["question_id"])
+    return [""] * len(questions)
+
+def run_structured_questionnaire(persona: dict, questions: List[Dict], scale: str) -> Dict:
+    try:
+        text = call_chat(
+            structured_messages(persona["system_prompt"], scale, questions),
             temperature=0.6,
+            meta={"persona": persona["name"], "phase": "questionnaire", "role": "structured",
+                  "scale": scale},
+            response_format=structured_response_format(scale, questions),
         )
-        results["Common Questions"].append({
-            "Consultant": question,
-            name: answer
-        })
+        answers = parse_structured_answers(text, questions)
+    except (CallFailed, ValueError, KeyError, TypeError) as e:
+        answers = structured_failed(persona, scale, questions, e)
+    return save_questionnaire(persona, scale, questions, answers, QUESTIONNAIRES[scale][1])
 
-    out_path = os.path.join(ASRM_QA_DIR, f"{safe_name(name)}.json")
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
-    return results
+async def arun_structured_questionnaire(persona: dict, questions: List[Dict], scale: str) -> Dict:
+    try:
+        text = await acall_chat(
+            structured_messages(persona["system_prompt"], scale, questions),
+            temperature=0.6,
+            meta={"persona": persona["name"], "phase": "questionnaire", "role": "structured",
+                  "scale": scale},
+            response_format=structured_response_format(scale, questions),
+        )
+        answers = parse_structured_answers(text, questions)
+    except (CallFailed, ValueError, KeyError, TypeError) as e:
+        answers = structured_failed(persona, scale, questions, e)
+    return save_questionnaire(persona, scale, questions, answers, QUESTIONNAIRES[scale][1])
+
+# =========================
+# BATCH MODE
+# =========================
+
+def questionnaire_custom_id(scale: str, name: str, question_id) -> str:
+    """Stable Batch API id for one item, e.g. 'PHQ9/Jane_Doe/3'."""
+    return f"{scale}/{safe_name(name)}/{question_id}"
+
+def build_batch_items(personas: List[dict], questions: Dict[str, List[Dict]]) -> List[Dict]:
+    """Every questionnaire item for every persona, same body call_chat would send."""
+    items = []
+    for persona in personas:
+        for scale, qs in questions.items():
+            option_text = QUESTIONNAIRES[scale][0]
+            for q in qs:
+                items.append({
+                    "custom_id": questionnaire_custom_id(scale, persona["name"], q["question_id"]),
+                    "meta": {"persona": persona["name"], "phase": "questionnaire", "role": "answer",
+                             "scale": scale, "question_id": q["question_id"]},
+                    "body": {
+                        "model": MODEL_NAME,
+                        "messages": questionnaire_messages(persona["system_prompt"], q["content"], option_text),
+                        **sampling_params(0.6),
+                        **budget_params("answer"),
+                    },
+                })
+    return items
+
+def run_questionnaires_batch(personas: List[dict], questions: Dict[str, List[Dict]],
+                             poll_seconds: float = 30.0):
+    """
+    Questionnaire stage through the Batch API: write BATCH_REQUESTS_PATH,
+    submit and poll, then save the usual per-persona Q&A files.
+    Items already in the response cache are not sent again.
+    """
+    answers, pending, keys, metas, usage, finish = {}, [], {}, {}, {}, {}
+    for item in build_batch_items(personas, questions):
+        metas[item["custom_id"]] = item["meta"]
+        body = item["body"]
+        params = {k: v for k, v in body.items() if k not in ("model", "messages")}
+        key, hit = cache_lookup(body["model"], body["messages"], **params)
+        if hit is not None:
+            record_call(item["meta"], MODEL_NAME, source="cache")
+            answers[item["custom_id"]] = hit
+        else:
+            keys[item["custom_id"]] = key
+            pending.append(batch_request(item["custom_id"], body))
+
+    if pending:
+        n = write_requests(BATCH_REQUESTS_PATH, pending)
+        print(f"Wrote {n} batch requests to {BATCH_REQUESTS_PATH} ({len(answers)} served from cache)")
+        # the files / batches endpoints bypass the rate limiter; let the SDK retry those
+        results, errors = run_batch(client.with_options(max_retries=2), BATCH_REQUESTS_PATH,
+                                    BATCH_STATE_PATH, poll_seconds, usage_out=usage, finish_out=finish)
+        unknown = [cid for cid in list(results) + list(errors) if cid not in metas]
+        if unknown:
+            print(f"Ignoring {len(unknown)} batch results for requests not in this run, e.g. {unknown[0]}")
+        results = {cid: text for cid, text in results.items() if cid in metas}
+        errors = {cid: err for cid, err in errors.items() if cid in metas}
+        for cid in results:
+            record_call(metas[cid], MODEL_NAME, usage.get(cid), source="batch", finish_reason=finish.get(cid))
+        for cid, err in errors.items():
+            record_call(metas[cid], MODEL_NAME, source="batch", error_type=err["error_type"])
+        for cid, text in results.items():
+            answers[cid] = cache_store(keys.get(cid), text, MODEL_NAME)
+    else:
+        print("All questionnaire items served from cache; no batch submitted.")
+        errors = {}
+
+    for persona in personas:
+        for scale, qs in questions.items():
+            row = []
+            for q in qs:
+                cid = questionnaire_custom_id(scale, persona["name"], q["question_id"])
+                if cid not in answers:
+                    err = errors.get(cid, {"error_type": "BatchError", "error": "missing result"})
+                    dead_letters.record_raw(persona["name"], "questionnaire", err["error_type"], err["error"], 1,
+                                            scale=scale, question_id=q["question_id"])
+                row.append(answers.get(cid, ""))
+            save_questionnaire(persona, scale, qs, row, QUESTIONNAIRES[scale][1])
 
 # =========================
 # CASUAL FRIEND CONVERSATION
 # =========================
 
-# Paraphrased themes from PHQ-9
-PHQ9_TOPICS = [
-    "how much you've been enjoying things lately",
-    "feeling low, discouraged, or emotionally heavy",
-    "how your sleep has been going recently",
-    "your energy levels through the day",
-    "any changes in how much or how little you're eating",
-    "how you’ve been feeling about yourself",
-    "whether it's been hard to focus or think clearly",
-    "feeling slowed down or unusually restless",
-    "if heavy or dark thoughts have been hovering around"
-]
-
-# Paraphrased themes from GAD-7
-GAD7_TOPICS = [
-    "feeling tense or on edge",
-    "finding yourself worrying about many different things",
-    "whether it's been hard to switch your thoughts off",
-    "how easy or hard it is to relax lately",
-    "feeling so restless it's hard to sit still",
-    "feeling more irritable or snappy than usual",
-    "worrying that something bad might happen"
-]
-
-# Paraphrased themes from ASRM (activation/mania)
-ASRM_TOPICS = [
-    "times you might feel unusually upbeat or 'wired'",
-    "moments of feeling extra confident or unstoppable",
-    "nights where you sleep much less but still feel wired",
-    "talking faster or more than usual",
-    "taking on lots of projects, spending, or risks"
-]
-
-ALL_TOPICS = PHQ9_TOPICS + GAD7_TOPICS + ASRM_TOPICS
-
-def generate_friend_reply(conv_history, next_topic: str) -> str:
-    """Friend speaks warmly, 1–2 sentences, guided by topic."""
-    transcript = "\n".join(f"{t['role']}: {t['content']}" for t in conv_history[-16:])
-    system_prompt = (
-        "You are a caring, emotionally intelligent close friend (not a clinician). "
-        "You speak in a warm, natural tone, 1–2 short sentences. "
-        "You never mention questionnaires, tests, or scales. "
-        "You gently explore how your friend is doing (mood, anxiety, energy, sleep, thoughts, behavior) "
-        "based on what they said earlier."
+# Paraphrased themes of every instrument's items ("topics" in CommonQuestions/*.json),
+# cycled through by the Friend in registry order
+ALL_TOPICS = [topic for inst in INSTRUMENTS.values() for topic in inst.topics]
+
+# Message layout: static text first, changing text last. Every persona call
+# starts with the persona's system_prompt exactly as in characters.json (the
+# questionnaire calls start the same way), followed by fixed instructions;
+# the transcript and the line being answered come at the end. Providers that
+# cache prompt prefixes can then reuse the leading part across a persona's calls.
+
+FRIEND_SYSTEM_PROMPT = (
+    "You are a caring, emotionally intelligent close friend (not a clinician). "
+    "You speak in a warm, natural tone, 1–2 short sentences. "
+    "You never mention questionnaires, tests, or scales. "
+    "You gently explore how your friend is doing (mood, anxiety, energy, sleep, thoughts, behavior) "
+    "based on what they said earlier."
+)
+
+FRIEND_OPENER_PROMPT = (
+    "You are a caring close friend. Using the background, open the chat in 1–2 warm sentences. "
+    "Acknowledge they've been going through some things, but DO NOT mention questionnaires or tests."
+)
+
+PERSONA_CHAT_INSTRUCTIONS = (
+    "Reply as yourself to your close friend in 1–3 short, natural sentences. "
+    "Be consistent with your personality and previous answers."
+)
+
+# --stream: close the stream at the sentence limit the prompts above ask for
+CASUAL_STOP = {
+    "opener": SentenceLimit(2),
+    "friend": SentenceLimit(2),
+    "persona": SentenceLimit(3),
+}
+
+def new_context() -> ConversationContext:
+    """Rolling casual-chat context: recent turns within CONTEXT_TOKENS (+ optional summary)."""
+    return ConversationContext(
+        budget_tokens=CONTEXT_TOKENS,
+        summarizer=digest_summarizer if SUMMARIZE_EVICTED else None,
+        summary_tokens=SUMMARY_TOKENS,
     )
+
+def friend_messages(conv_history: ConversationContext, next_topic: str) -> List[Dict]:
+    """Friend speaks warmly, 1–2 sentences, guided by topic."""
+    transcript = conv_history.render()
     user_message = (
         f"Recent chat:\n{transcript}\n\n"
         f"Next subtle topic to explore: {next_topic}\n"
         f"Respond as the Friend. End with a simple, open question."
     )
-    return call_chat(
-        [{"role": "system", "content": system_prompt},
-         {"role": "user", "content": user_message}],
-        temperature=0.8
-    )
+    return [{"role": "system", "content": FRIEND_SYSTEM_PROMPT},
+            {"role": "user", "content": user_message}]
 
-def generate_persona_reply(persona_system_prompt: str, conv_history, friend_msg: str) -> str:
+def persona_messages(persona_system_prompt: str, conv_history: ConversationContext,
+                     friend_msg: str) -> List[Dict]:
     """Persona replies in character to friend."""
-    context = "\n".join(f"{t['role']}: {t['content']}" for t in conv_history[-16:])
-    persona_system = (
-        f"{persona_system_prompt}\n\n"
-        "Reply as yourself to your close friend in 1–3 short, natural sentences. "
-        "Be consistent with your personality and previous answers."
-    )
+    context = conv_history.render()
     user_message = (
-        f"Your friend just said:\n{friend_msg}\n\n"
         f"Recent context:\n{context}\n\n"
+        f"Your friend just said:\n{friend_msg}\n\n"
         "Now reply as the character."
     )
-    return call_chat(
-        [{"role": "system", "content": persona_system},
-         {"role": "user", "content": user_message}],
-        temperature=0.8
-    )
+    return [{"role": "system", "content": persona_system_prompt},
+            {"role": "system", "content": PERSONA_CHAT_INSTRUCTIONS},
+            {"role": "user", "content": user_message}]
+
+def opener_messages(background: str) -> List[Dict]:
+    """Initial friend line, personalized using the intake background."""
+    return [{"role": "system", "content": FRIEND_OPENER_PROMPT},
+            {"role": "user", "content": background}]
 
-def build_background(name: str,
-                     phq9: Dict,
-                     gad7: Dict,
-                     asrm: Dict) -> str:
-    """Create short intake-style background from three questionnaires."""
+def build_background(name: str, qa: Dict[str, Dict]) -> str:
+    """Create short intake-style background from the questionnaires (scale -> Q&A file)."""
     lines = [f"Intake summary for {name} (from earlier structured questions):"]
     def add_scale(tag, data, limit=6):
         if not data:
@@ -274,22 +571,12 @@ def build_background(name: str,
             if not a:
                 continue
             lines.append(f"[{tag}] {q} -> {a}")
-    add_scale("PHQ9", phq9)
-    add_scale("GAD7", gad7)
-    add_scale("ASRM", asrm)
+    for scale, data in qa.items():
+        add_scale(scale, data)
     return "\n".join(lines)
 
-def run_casual_conversation(persona: dict,
-                            phq9_data: Dict,
-                            gad7_data: Dict,
-                            asrm_data: Dict) -> Dict:
-    """40-turn friend ↔ persona conversation based on all three scales."""
-    name = persona["name"]
-    persona_system_prompt = persona["system_prompt"]
-
-    background = build_background(name, phq9_data, gad7_data, asrm_data)
-
-    transcript = {
+def new_casual_transcript(name: str) -> Dict:
+    return {
         "character": name,
         "friend_profile": "Caring, supportive close friend (not clinical).",
         "model": MODEL_NAME,
@@ -298,81 +585,577 @@ def run_casual_conversation(persona: dict,
         "turns": []
     }
 
-    # Initial friend line (personalized using background)
-    f0 = call_chat(
-        [
-            {
-                "role": "system",
-                "content":
-                    "You are a caring close friend. Using the background, open the chat in 1–2 warm sentences. "
-                    "Acknowledge they've been going through some things, but DO NOT mention questionnaires or tests."
-            },
-            {
-                "role": "user",
-                "content": background
-            }
-        ],
-        temperature=0.7
-    )
-    transcript["turns"].append({"speaker": "Friend", "text": f0})
-    conv_history = [{"role": "Friend", "content": f0}]
+def finish_casual_transcript(name: str, transcript: Dict, journal: TurnJournal):
+    """
+    Save the finished chat and drop its journal. With --transcript-format jsonl
+    the journal already is the transcript: it gets its footer and is moved into place.
+    """
+    transcript["finished_at"] = datetime.utcnow().isoformat() + "Z"
+    if TRANSCRIPT_FORMAT == "jsonl":
+        journal.append(footer_event(transcript, "casual"))
+        os.replace(journal.path, casual_path(name))
+    else:
+        save_transcript(casual_path(name), transcript)
+        journal.remove()
+    store_turns(name, transcript["turns"])
 
-    # Persona reply
-    p0 = generate_persona_reply(persona_system_prompt, conv_history, f0)
-    transcript["turns"].append({"speaker": name, "text": p0})
-    conv_history.append({"role": "Persona", "content": p0})
+def casual_path(name: str) -> str:
+    return transcript_file(CASUAL_DIR, name)
 
-    # Remaining rounds
-    for r in range(1, ROUNDS_PER_CHARACTER):
-        topic = ALL_TOPICS[r % len(ALL_TOPICS)]
+def open_casual_session(name: str, resume: bool = False):
+    """
+    Transcript, conv_history and journal for one casual conversation.
+    With `resume`, both are rebuilt from the turns already journaled;
+    otherwise any stale journal is discarded and the chat starts fresh.
+    """
+    journal = TurnJournal(os.path.join(JOURNAL_DIR, f"{safe_name(name)}.jsonl"))
+    if not resume:
+        journal.remove()
+    header, turns = journal.read()
 
-        f_msg = generate_friend_reply(conv_history, topic)
-        transcript["turns"].append({"speaker": "Friend", "text": f_msg})
-        conv_history.append({"role": "Friend", "content": f_msg})
+    transcript = new_casual_transcript(name)
+    conv_history = new_context()
+    if header is None:
+        journal.append(header_event(transcript, "casual"))
+    else:
+        transcript["started_at"] = header["started_at"]
+        for t in turns:
+            transcript["turns"].append({"speaker": "Friend" if t["role"] == "Friend" else name, "text": t["text"]})
+            conv_history.append({"role": t["role"], "content": t["text"]})
+        if turns:
+            print(f"    resuming {name} at turn {len(turns) + 1}")
+    return transcript, conv_history, journal
 
-        p_msg = generate_persona_reply(persona_system_prompt, conv_history, f_msg)
-        transcript["turns"].append({"speaker": name, "text": p_msg})
-        conv_history.append({"role": "Persona", "content": p_msg})
+def next_casual_request(persona_system_prompt: str, background: str, conv_history):
+    """
+    (role, kind, messages, temperature) for the next utterance. Turns alternate
+    Friend, Persona, ...; the first Friend line is the personalized opener.
+    `kind` ("opener", "friend", "persona") picks the stop policy and labels the metrics.
+    """
+    i = len(conv_history)
+    if i == 0:
+        return "Friend", "opener", opener_messages(background), 0.7
+    if i % 2 == 1:
+        friend_msg = conv_history[-1]["content"]
+        return "Persona", "persona", persona_messages(persona_system_prompt, conv_history, friend_msg), 0.8
+    topic = ALL_TOPICS[(i // 2) % len(ALL_TOPICS)]
+    return "Friend", "friend", friend_messages(conv_history, topic), 0.8
 
-    transcript["finished_at"] = datetime.utcnow().isoformat() + "Z"
+def commit_turn(journal: TurnJournal, transcript: Dict, conv_history, name: str, role: str, text: str):
+    """Journal the turn first, then add it to the in-memory transcript."""
+    speaker = "Friend" if role == "Friend" else name
+    journal.append({"event": "turn", "turn": len(transcript["turns"]) + 1,
+                    "speaker": speaker, "role": role, "text": text})
+    transcript["turns"].append({"speaker": speaker, "text": text})
+    conv_history.append({"role": role, "content": text})
+
+def run_casual_conversation(persona: dict, qa: Dict[str, Dict], resume: bool = False) -> Optional[Dict]:
+    """
+    40-turn friend ↔ persona conversation based on the persona's questionnaires.
+    Returns None (nothing saved yet) if a turn is dead-lettered.
+    """
+    name = persona["name"]
+    persona_system_prompt = persona["system_prompt"]
+
+    background = build_background(name, qa)
+    transcript, conv_history, journal = open_casual_session(name, resume)
+
+    while len(conv_history) < 2 * ROUNDS_PER_CHARACTER:
+        role, kind, messages, temperature = next_casual_request(persona_system_prompt, background, conv_history)
+        try:
+            text = call_chat(messages, temperature=temperature,
+                             meta={"persona": name, "phase": "casual", "role": kind,
+                                   "turn": len(conv_history) + 1},
+                             stop_when=CASUAL_STOP[kind])
+        except CallFailed as e:
+            # Stop here; the journal keeps the turns so far and --retry-failed resumes from it.
+            dead_letters.record(e, name, "casual", turn=len(conv_history) + 1)
+            return None
+        commit_turn(journal, transcript, conv_history, name, role, text)
+
+    finish_casual_transcript(name, transcript, journal)
+    return transcript
+
+def load_saved_questionnaires(persona: dict) -> Optional[Dict[str, Dict]]:
+    """Questionnaire files from an earlier run, or None unless every selected instrument has one."""
+    out = {}
+    for scale, (_, out_dir) in QUESTIONNAIRES.items():
+        path = transcript_file(out_dir, persona["name"])
+        if not os.path.exists(path):
+            return None
+        out[scale] = load_transcript(path)
+    return out
+
+def questionnaires_incomplete(qa: Dict[str, Dict], name: str) -> bool:
+    """
+    True if any item has no answer (it was dead-lettered). The casual chat
+    waits for those items, since build_background feeds them into the opener.
+    """
+    return any(not row.get(name) for data in qa.values() for row in data["Common Questions"])
+
+def run_persona(persona: dict, questions: Dict[str, List[Dict]], resume: bool = False,
+                structured: bool = False, fanout_items: bool = False) -> bool:
+    """Questionnaires then casual chat for one persona; False if a unit was dead-lettered."""
+    name = persona["name"]
+    print(f"--- {name} ---")
+
+    qa = load_saved_questionnaires(persona) if resume else None
+    if qa is None:
+        if structured:
+            qa = {scale: run_structured_questionnaire(persona, qs, scale) for scale, qs in questions.items()}
+        elif fanout_items:
+            qa = run_questionnaires_fanout(persona, questions)
+        else:
+            qa = run_questionnaires(persona, questions)
+
+    if questionnaires_incomplete(qa, name):
+        print(f"    {name}: casual chat deferred until failed items are retried")
+        return False
+
+    return run_casual_conversation(persona, qa, resume) is not None
+
+def retry_failed(personas: List[dict], questions: Dict[str, List[Dict]], structured: bool = False):
+    """
+    Re-run only the units in the dead-letter queue: failed questionnaire
+    items are re-asked and patched into their saved files (in structured
+    mode the whole instrument is re-asked), failed casual conversations
+    resume from their journal.
+    """
+    records = dead_letters.take()
+    if not records:
+        print("No failed units to retry.")
+        return
+
+    by_name = {p["name"]: p for p in personas}
+    units: Dict[str, Dict] = {}
+    for rec in records:
+        unit = units.setdefault(rec["persona"], {"items": set(), "casual": False})
+        if rec["phase"] == "questionnaire":
+            unit["items"].add((rec["scale"], rec["question_id"]))
+        else:
+            unit["casual"] = True
+    print(f"Retrying {len(records)} failed units across {len(units)} personas...\n")
+
+    for name, unit in units.items():
+        persona = by_name.get(name)
+        if persona is None:
+            print(f"[skip] {name}: not in {CHARACTERS_PATH}")
+            continue
+        print(f"--- {name} (retry) ---")
+
+        qa = load_saved_questionnaires(persona)
+        if qa is None and structured:
+            qa = {scale: run_structured_questionnaire(persona, qs, scale) for scale, qs in questions.items()}
+        elif qa is None:
+            qa = run_questionnaires(persona, questions)
+        elif structured:
+            for scale in sorted({scale for scale, _ in unit["items"]}):
+                qa[scale] = run_structured_questionnaire(persona, questions[scale], scale)
+        else:
+            for scale, question_id in sorted(unit["items"]):
+                option_text, out_dir = QUESTIONNAIRES[scale]
+                for idx, q in enumerate(questions[scale]):
+                    if q["question_id"] == question_id:
+                        answer = ask_item(persona, scale, q, option_text)
+                        qa[scale]["Common Questions"][idx][name] = answer
+                        store_answers(name, scale, [q], [answer])
+                save_transcript(transcript_file(out_dir, name), qa[scale],
+                                [q["question_id"] for q in questions[scale]])
+
+        if questionnaires_incomplete(qa, name):
+            continue
+        if unit["casual"] or not os.path.exists(casual_path(name)):
+            run_casual_conversation(persona, qa, resume=True)
+
+    dead_letters.finish_retry()
+
+# =========================
+# ASYNC ENGINE
+# =========================
+# Same prompts, same per-persona turn order and same output files as the
+# sequential runners above; only the scheduling across personas differs.
+
+async def arun_questionnaires(persona: dict, questions: Dict[str, List[Dict]],
+                              fanout: bool = False, structured: bool = False) -> Dict[str, Dict]:
+    """
+    All scales for one persona. Sequential item by item, or with `fanout`
+    every item of every scale in flight at once (reassembled in order).
+    `structured` asks one JSON-schema request per scale instead.
+    """
+    if structured:
+        if fanout:
+            done = await asyncio.gather(*(arun_structured_questionnaire(persona, qs, scale)
+                                          for scale, qs in questions.items()))
+            return dict(zip(questions, done))
+        return {scale: await arun_structured_questionnaire(persona, qs, scale)
+                for scale, qs in questions.items()}
+
+    def ask(scale, q):
+        return aask_item(persona, scale, q, QUESTIONNAIRES[scale][0])
 
-    out_path = os.path.join(CASUAL_DIR, f"{safe_name(name)}.json")
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(transcript, f, indent=2, ensure_ascii=False)
+    out = {}
+    if fanout:
+        jobs = [(scale, q) for scale, qs in questions.items() for q in qs]
+        answers = await asyncio.gather(*(ask(scale, q) for scale, q in jobs))
+        i = 0
+        for scale, qs in questions.items():
+            out_dir = QUESTIONNAIRES[scale][1]
+            out[scale] = save_questionnaire(persona, scale, qs, answers[i:i + len(qs)], out_dir)
+            i += len(qs)
+        return out
 
+    for scale, qs in questions.items():
+        answers = [await ask(scale, q) for q in qs]
+        out[scale] = save_questionnaire(persona, scale, qs, answers, QUESTIONNAIRES[scale][1])
+    return out
+
+async def arun_casual_conversation(persona: dict, qa: Dict[str, Dict],
+                                   resume: bool = False) -> Optional[Dict]:
+    name = persona["name"]
+    persona_system_prompt = persona["system_prompt"]
+
+    background = build_background(name, qa)
+    transcript, conv_history, journal = open_casual_session(name, resume)
+
+    while len(conv_history) < 2 * ROUNDS_PER_CHARACTER:
+        role, kind, messages, temperature = next_casual_request(persona_system_prompt, background, conv_history)
+        try:
+            text = await acall_chat(messages, temperature=temperature,
+                                    meta={"persona": name, "phase": "casual", "role": kind,
+                                          "turn": len(conv_history) + 1},
+                                    stop_when=CASUAL_STOP[kind])
+        except CallFailed as e:
+            dead_letters.record(e, name, "casual", turn=len(conv_history) + 1)
+            return None
+        commit_turn(journal, transcript, conv_history, name, role, text)
+
+    finish_casual_transcript(name, transcript, journal)
     return transcript
 
+async def arun_persona(persona: dict, questions: Dict[str, List[Dict]],
+                       fanout: bool = False, resume: bool = False, structured: bool = False):
+    """Full pipeline for one persona: PHQ-9 → GAD-7 → ASRM → casual chat."""
+    print(f"--- {persona['name']} ---")
+    qa = load_saved_questionnaires(persona) if resume else None
+    if qa is None:
+        qa = await arun_questionnaires(persona, questions, fanout, structured)
+    if questionnaires_incomplete(qa, persona["name"]):
+        print(f"    {persona['name']}: casual chat deferred until failed items are retried")
+        return
+    await arun_casual_conversation(persona, qa, resume)
+
+async def arun_all(personas: List[dict], questions: Dict[str, List[Dict]],
+                   concurrency: int, fanout: bool = False, resume: bool = False,
+                   structured: bool = False):
+    """Run every persona, at most `concurrency` of them at a time."""
+    sem = asyncio.Semaphore(concurrency)
+
+    async def bounded(persona):
+        async with sem:
+            await arun_persona(persona, questions, fanout, resume, structured)
+
+    await asyncio.gather(*(bounded(p) for p in personas))
+
+async def arun_scale(persona: dict, scale: str, questions: List[Dict]) -> Dict:
+    """One scale for one persona, all items in flight at once."""
+    option_text, out_dir = QUESTIONNAIRES[scale]
+    answers = await asyncio.gather(*(aask_item(persona, scale, q, option_text) for q in questions))
+    return save_questionnaire(persona, scale, questions, list(answers), out_dir)
+
+def add_persona_dag(sched: DagScheduler, persona: dict, questions: Dict[str, List[Dict]],
+                    rank: int, resume: bool = False, structured: bool = False):
+    """
+    One node per instrument (PHQ9, GAD7, ASRM, ...) -> background -> casual turns for one persona.
+    `rank` is the scheduling priority: earlier personas get free slots first.
+    """
+    name = persona["name"]
+    prefix = f"{rank}:{name}"
+    saved = load_saved_questionnaires(persona) if resume else None
+
+    scale_keys = []
+    for scale, qs in questions.items():
+        async def run_scale(scale=scale, qs=qs):
+            if saved is not None:
+                return saved[scale]
+            if structured:
+                return await arun_structured_questionnaire(persona, qs, scale)
+            return await arun_scale(persona, scale, qs)
+        scale_keys.append(sched.add(f"{prefix}/{scale}", run_scale, priority=rank))
+
+    async def background(*answers):
+        qa = dict(zip(questions, answers))
+        if questionnaires_incomplete(qa, name):
+            print(f"    {name}: casual chat deferred until failed items are retried")
+            return None
+        return qa
+
+    async def casual(qa):
+        if qa is None:
+            return None
+        return await arun_casual_conversation(persona, qa, resume)
+
+    bg = sched.add(f"{prefix}/background", background, scale_keys, priority=rank)
+    sched.add(f"{prefix}/casual", casual, [bg], priority=rank)
+
+async def arun_dag(personas: List[dict], questions: Dict[str, List[Dict]], in_flight: int,
+                   resume: bool = False, structured: bool = False, report_every: float = 10.0):
+    """Every persona as its own dependency graph, sharing one pool of `in_flight` LLM calls."""
+    global CALL_POOL
+    CALL_POOL = CallPool(in_flight)
+    sched = DagScheduler(CALL_POOL, report_every)
+    for rank, persona in enumerate(personas):
+        add_persona_dag(sched, persona, questions, rank, resume, structured)
+    try:
+        await sched.run()
+    finally:
+        stats = CALL_POOL.stats()
+        CALL_POOL = None
+    print(sched.progress())
+    for key, e in sched.errors.items():
+        print(f"    {key} failed: {type(e).__name__}: {e}")
+    return stats
+
+# =========================
+# WORK QUEUE
+# =========================
+# --queue: personas become jobs in a shared SQLite queue (work_queue.py) and
+# every worker process runs them one at a time with the sequential pipeline
+# until the queue is drained. A job claimed again after a crash resumes from
+# the saved questionnaires and the casual-chat journal.
+
+def queue_name(structured: bool = False) -> str:
+    """Workers only share jobs when they ask the same instruments the same way."""
+    return "all_in_one:" + "+".join(INSTRUMENTS) + (":structured" if structured else "")
+
+def run_queue_worker(path: str, personas: List[dict], questions: Dict[str, List[Dict]], args) -> Dict:
+    queue = WorkQueue(path, lease_seconds=args.lease_seconds)
+    name = queue_name(args.structured)
+    added = queue.enqueue(name, [(p["name"], {"persona": p["name"]}) for p in personas])
+    by_name = {p["name"]: p for p in personas}
+    worker = worker_id()
+    print(f"Queue {path} [{name}]: {added} jobs added; worker {worker}\n")
+
+    for job in queue.jobs(name, worker, poll=min(HEARTBEAT_SECONDS, args.lease_seconds / 4)):
+        persona = by_name.get(job.key)
+        if persona is None:
+            queue.fail(job, f"not in {CHARACTERS_PATH}", retry=False)
+            continue
+        hb = Heartbeat(queue, job, interval=min(HEARTBEAT_SECONDS, args.lease_seconds / 4))
+        try:
+            with hb:
+                ok = run_persona(persona, questions, args.resume or job.attempts > 1,
+                                 args.structured, args.fanout_items)
+        except KeyboardInterrupt:
+            queue.release(job)
+            raise
+        except Exception as e:
+            print(f"    {job.key}: {type(e).__name__}: {e} (attempt {job.attempts})")
+            queue.fail(job, f"{type(e).__name__}: {e}")
+            continue
+        if hb.lost:
+            owned = False
+        elif ok:
+            owned = queue.complete(job)
+        else:
+            owned = queue.fail(job, f"failed units in {DEAD_LETTER_PATH}; run --retry-failed", retry=False)
+        if not owned:
+            # the lease ran out mid-job: another worker may have rerun this persona
+            # and written the same journal and outputs, so these are not counted
+            print(f"⚠️  {job.key}: lease lost before the job finished; not marked done here, "
+                  f"and its outputs may have been superseded by another worker")
+
+    status = queue.status(name)
+    print(f"\n{format_status(name, status)}")
+    return status
+
 # =========================
 # MAIN
 # =========================
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PHQ-9 / GAD-7 / ASRM + casual conversation runner")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help=f"personas to run at once; >1 uses the async engine (e.g. {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--fanout-items", action="store_true",
+                        help="send all of a persona's questionnaire items concurrently")
+    parser.add_argument("--in-flight", type=int, default=None,
+                        help="dependency-graph scheduler: every persona at once, at most N LLM calls in flight")
+    parser.add_argument("--report-every", type=float, default=10.0,
+                        help="seconds between scheduler progress lines (throughput, queue depth)")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip personas whose casual chat is saved; continue partial chats from their journal")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help=f"re-run only the units recorded in {DEAD_LETTER_PATH}")
+    parser.add_argument("--structured", action="store_true",
+                        help="one JSON-schema request per instrument; saves to Conversations/<SCALE>/Structured Conversation")
+    parser.add_argument("--batch", action="store_true",
+                        help="run only the questionnaire stage through the OpenAI Batch API")
+    parser.add_argument("--batch-poll-seconds", type=float, default=30.0)
+    parser.add_argument("--rpm", type=float, default=None,
+                        help="requests/minute budget (default: $OPENAI_RPM or 500)")
+    parser.add_argument("--tpm", type=float, default=None,
+                        help="tokens/minute budget (default: $OPENAI_TPM or 200000)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="sampling seed sent with every request (also part of the cache key)")
+    parser.add_argument("--rounds", type=int, default=ROUNDS_PER_CHARACTER,
+                        help="friend↔persona pairs per casual chat")
+    parser.add_argument("--context-tokens", type=int, default=CONTEXT_TOKENS,
+                        help="token budget of the recent-turns window in casual-chat prompts")
+    parser.add_argument("--summarize-evicted", action="store_true",
+                        help="keep a short running summary of turns that fell out of the window")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream completions: log time-to-first-token and stop at the Choice line / sentence limit")
+    add_instrument_args(parser)
+    add_shard_args(parser)
+    add_queue_args(parser)
+    add_budget_args(parser)
+    add_cache_args(parser)
+    add_metrics_args(parser)
+    add_store_args(parser)
+    add_transcript_args(parser)
+    return parser.parse_args(argv)
+
+def use_output_root(root: str):
+    """Move every output (conversations, journal, dead letters, usage, batch files) under `root` (--shard)."""
+    global BASE_CONV_DIR, CASUAL_DIR, JOURNAL_DIR, DEAD_LETTER_PATH, USAGE_PATH
+    global BATCH_DIR, BATCH_REQUESTS_PATH, BATCH_STATE_PATH, dead_letters
+    BASE_CONV_DIR       = os.path.join(root, "Conversations")
+    CASUAL_DIR          = os.path.join(BASE_CONV_DIR, "Casual")
+    JOURNAL_DIR         = os.path.join(BASE_CONV_DIR, "Journal", "Casual")
+    DEAD_LETTER_PATH    = os.path.join(BASE_CONV_DIR, "dead_letter.jsonl")
+    USAGE_PATH          = os.path.join(BASE_CONV_DIR, "usage_by_persona.json")
+    BATCH_DIR           = os.path.join(root, "Batch")
+    BATCH_REQUESTS_PATH = os.path.join(BATCH_DIR, "requests.jsonl")
+    BATCH_STATE_PATH    = os.path.join(BATCH_DIR, "batch_state.json")
+    dead_letters = DeadLetterQueue(DEAD_LETTER_PATH)
+    for scale, (option_text, _) in QUESTIONNAIRES.items():
+        QUESTIONNAIRES[scale] = (option_text, qa_dir(scale))
+        STRUCTURED_DIRS[scale] = os.path.join(BASE_CONV_DIR, scale, "Structured Conversation")
+    for d in [qa_dir(scale) for scale in QUESTIONNAIRES] + [CASUAL_DIR]:
+        os.makedirs(d, exist_ok=True)
+
+def completed_personas(personas: List[dict], batch: bool = False) -> List[str]:
+    """Names of the personas whose outputs are all saved (questionnaires only for --batch)."""
+    if batch:
+        return [p["name"] for p in personas
+                if all(os.path.exists(transcript_file(out_dir, p["name"]))
+                       for _, out_dir in QUESTIONNAIRES.values())]
+    return [p["name"] for p in personas if os.path.exists(casual_path(p["name"]))]
+
+def report_usage(part: Optional[str] = None):
+    """
+    Prompt-cache reuse across the run; per-persona numbers go to USAGE_PATH.
+    Queue workers pass their worker id as `part` (see UsageTally.save).
+    """
+    tally = get_tally()
+    if not tally.by_persona:
+        return
+    tally.save(USAGE_PATH, part=part)
+    print(f"- Token usage:    {tally.totals()} (per persona: {USAGE_PATH})")
+
+def report_store():
+    stats = close_store()
+    if stats is not None:
+        print(f"- Result store:   {stats['rows']} rows in {stats['path']}")
+
+def report_failures():
+    if dead_letters.recorded:
+        print(f"\n⚠️  {dead_letters.recorded} failed units recorded in {DEAD_LETTER_PATH}; "
+              "rerun with --retry-failed.")
+
+def main(argv=None):
+    args = parse_args(argv)
+    global SEED, ROUNDS_PER_CHARACTER, CONTEXT_TOKENS, SUMMARIZE_EVICTED, STREAM, TRANSCRIPT_FORMAT
+    SEED = args.seed
+    ROUNDS_PER_CHARACTER = args.rounds
+    CONTEXT_TOKENS = args.context_tokens
+    SUMMARIZE_EVICTED = args.summarize_evicted
+    STREAM = args.stream
+    TRANSCRIPT_FORMAT = args.transcript_format
+    configure_limiter(rpm=args.rpm, tpm=args.tpm)
+    started_at = datetime.utcnow().isoformat() + "Z"
+    shard = configure_shard_from_args(args)
+    cache = configure_cache_from_args(args)
+    configure_metrics_from_args(args)
+    configure_budgets_from_args(args)
+
     # Load personas
     with open(CHARACTERS_PATH, "r", encoding="utf-8") as f:
         personas = json.load(f)["characters"]
 
-    # Load questionnaires
-    phq9_questions = load_questions(PHQ9_QUEST_PATH)
-    gad7_questions = load_questions(GAD7_QUEST_PATH)
-    asrm_questions = load_questions(ASRM_QUEST_PATH)
+    # Load questionnaires (all of CommonQuestions/ unless --instruments picks a subset)
+    questions = select_instruments(load_instruments_from_args(args, INSTRUMENTS_DIR))
 
-    print(f"Running for {len(personas)} personas...\n")
+    if shard is not None:
+        use_output_root(shard.root)
+        if args.store:
+            args.store = shard.path(args.store)
+        total = len(personas)
+        personas = shard.select(personas)
+        print(f"Shard {shard.spec}: {len(personas)} of {total} personas -> {shard.root}")
+    assigned = personas
 
-    for persona in personas:
-        name = persona["name"]
-        print(f"--- {name} ---")
+    configure_store_from_args(args)
 
-        phq9_data = run_phq9(persona, phq9_questions)
-        gad7_data = run_gad7(persona, gad7_questions)
-        asrm_data = run_asrm(persona, asrm_questions)
+    if args.structured:
+        if args.batch:
+            raise SystemExit("--structured and --batch cannot be combined")
+        use_structured_dirs()
+
+    if args.queue and (args.batch or args.in_flight or args.concurrency > 1 or args.retry_failed or shard):
+        raise SystemExit("--queue runs one persona at a time per worker; start more workers instead of "
+                         "combining it with --batch, --in-flight, --concurrency, --shard or --retry-failed")
+
+    if args.retry_failed:
+        retry_failed(personas, questions, args.structured)
+        report_store()
+        report_usage()
+        report_budgets(report_metrics())
+        report_failures()
+        if shard is not None:
+            shard.record_run("all_in_one", INSTRUMENTS, assigned, completed_personas(assigned), started_at)
+        return
+
+    if args.resume and not args.batch and not args.queue:
+        done = [p for p in personas if os.path.exists(casual_path(p["name"]))]
+        personas = [p for p in personas if not os.path.exists(casual_path(p["name"]))]
+        print(f"Resuming: {len(done)} personas already complete.")
+
+    print(f"Running for {len(personas)} personas...\n")
 
-        run_casual_conversation(persona, phq9_data, gad7_data, asrm_data)
+    sched_stats = None
+    if args.batch:
+        run_questionnaires_batch(personas, questions, args.batch_poll_seconds)
+    elif args.in_flight:
+        sched_stats = asyncio.run(arun_dag(personas, questions, args.in_flight,
+                                           args.resume, args.structured, args.report_every))
+    elif args.concurrency > 1:
+        asyncio.run(arun_all(personas, questions, args.concurrency, args.fanout_items,
+                             args.resume, args.structured))
+    elif args.queue:
+        run_queue_worker(args.queue, personas, questions, args)
+    else:
+        for persona in personas:
+            run_persona(persona, questions, args.resume, args.structured, args.fanout_items)
 
     print("\n✅ Done.")
-    print(f"- PHQ-9 files in: {PHQ9_QA_DIR}")
-    print(f"- GAD-7 files in: {GAD7_QA_DIR}")
-    print(f"- ASRM files in:  {ASRM_QA_DIR}")
-    print(f"- Casual convos:  {CASUAL_DIR}")
+    for scale, inst in INSTRUMENTS.items():
+        print(f"- {inst.title + ' files in:':<15} {QUESTIONNAIRES[scale][1]}")
+    if not args.batch:
+        print(f"- Casual convos:  {CASUAL_DIR}")
+    print(f"- Rate limiter:   {get_limiter().stats()}")
+    if sched_stats is not None:
+        print(f"- Scheduler:      {sched_stats}")
+    if cache is not None:
+        print(f"- Response cache: {cache.stats()}")
+    report_store()
+    report_usage(part=worker_id() if args.queue else None)
+    report_budgets(report_metrics())
+    report_failures()
+    if shard is not None:
+        path = shard.record_run("all_in_one", INSTRUMENTS, assigned,
+                                completed_personas(assigned, args.batch), started_at)
+        print(f"\nShard manifest: {path} (combine shards with merge_shards.py)")
 
 if __name__ == "__main__":
     main()
@@ -1,31 +1,45 @@
-from phq9_tools import summarize_results_folder, export_summary, character_item_detail
+from phq9_tools import analyze_results_folder, export_summary
+from score_index import ScoreIndex
+import argparse
 import os
 
 RESULTS_DIR = "PHQ9 Conversation"
 ANALYSIS_DIR = "analysis"
 
-# Make sure the output folder exists
-os.makedirs(ANALYSIS_DIR, exist_ok=True)
 
-print("🔍 Analyzing PHQ-9 results...\n")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score and export the PHQ-9 results")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes scoring new or changed transcripts (0 = one per CPU; default: 1)")
+    args = parser.parse_args(argv)
 
-# Build summaries
-df_summary = summarize_results_folder(RESULTS_DIR)
-df_detail = character_item_detail(RESULTS_DIR)
+    # Make sure the output folder exists
+    os.makedirs(ANALYSIS_DIR, exist_ok=True)
 
-# Define file paths
-summary_csv = os.path.join(ANALYSIS_DIR, "phq9_summary.csv")
-summary_xlsx = os.path.join(ANALYSIS_DIR, "phq9_summary.xlsx")
-detail_csv = os.path.join(ANALYSIS_DIR, "phq9_detail.csv")
-detail_xlsx = os.path.join(ANALYSIS_DIR, "phq9_detail.xlsx")
+    print("🔍 Analyzing PHQ-9 results...\n")
 
-# Export results to the analysis folder
-export_summary(df_summary, csv_path=summary_csv, xlsx_path=summary_xlsx)
-export_summary(df_detail, csv_path=detail_csv, xlsx_path=detail_xlsx)
+    # Build summaries (only new or changed transcripts are re-scored; see score_index.py)
+    index = ScoreIndex()
+    df_summary, df_detail = analyze_results_folder(RESULTS_DIR, index=index, workers=args.workers)
+    print(f"Index: {index.stats()}")
+    index.close()
 
-# Final confirmation
-print("✅ Exports complete!")
-print(f"- {summary_csv}")
-print(f"- {summary_xlsx}")
-print(f"- {detail_csv}")
-print(f"- {detail_xlsx}")
+    # Define file paths
+    summary_csv = os.path.join(ANALYSIS_DIR, "phq9_summary.csv")
+    summary_xlsx = os.path.join(ANALYSIS_DIR, "phq9_summary.xlsx")
+    detail_csv = os.path.join(ANALYSIS_DIR, "phq9_detail.csv")
+    detail_xlsx = os.path.join(ANALYSIS_DIR, "phq9_detail.xlsx")
+
+    # Export results to the analysis folder
+    export_summary(df_summary, csv_path=summary_csv, xlsx_path=summary_xlsx)
+    export_summary(df_detail, csv_path=detail_csv, xlsx_path=detail_xlsx)
+
+    # Final confirmation
+    print("✅ Exports complete!")
+    print(f"- {summary_csv}")
+    print(f"- {summary_xlsx}")
+    print(f"- {detail_csv}")
+    print(f"- {detail_xlsx}")
+
+if __name__ == "__main__":
+    main()
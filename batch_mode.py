@@ -0,0 +1,186 @@
+"""
+OpenAI Batch API helpers: write a JSONL of chat-completion requests,
+submit it, poll until it finishes, and read the answers back by custom_id.
+
+The runners decide what goes into each request and how answers map back
+to output files; this module only speaks the files/batches endpoints, so
+it works the same against api.openai.com or any stand-in reachable via
+OPENAI_BASE_URL.
+
+Usage:
+------
+from batch_mode import batch_request, write_requests, run_batch
+
+reqs = [batch_request("PHQ9/Jane_Doe/1", {"model": ..., "messages": [...]}), ...]
+write_requests("Batch/requests.jsonl", reqs)
+answers, errors = run_batch(client, "Batch/requests.jsonl", "Batch/batch_state.json")
+# answers: {custom_id: "assistant text"}
+# errors:  {custom_id: {"error_type": ..., "error": ...}}
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def batch_request(custom_id: str, body: Dict) -> Dict:
+    """One line of a batch input file."""
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def write_requests(path: str, requests: Iterable[Dict]) -> int:
+    """Write batch requests as JSONL; returns how many were written."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    n = 0
+    seen = set()
+    with open(path, "w", encoding="utf-8") as f:
+        for req in requests:
+            if req["custom_id"] in seen:
+                raise ValueError(f"Duplicate custom_id: {req['custom_id']}")
+            seen.add(req["custom_id"])
+            f.write(json.dumps(req, ensure_ascii=False) + "\n")
+            n += 1
+    return n
+
+
+def _file_sha1(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _request_ids(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["custom_id"] for line in f if line.strip()]
+
+
+def _load_state(state_path: Optional[str]) -> Dict:
+    if state_path and os.path.exists(state_path):
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def _save_state(state_path: Optional[str], state: Dict):
+    if not state_path:
+        return
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+
+
+def _clear_state(state_path: Optional[str]):
+    if state_path and os.path.exists(state_path):
+        os.remove(state_path)
+
+
+def submit_batch(client, requests_path: str, completion_window: str = "24h"):
+    """Upload the JSONL and create the batch."""
+    with open(requests_path, "rb") as f:
+        upload = client.files.create(file=f, purpose="batch")
+    return client.batches.create(
+        input_file_id=upload.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=completion_window,
+    )
+
+
+def wait_for_batch(client, batch_id: str, poll_seconds: float = 30.0, verbose: bool = True):
+    """Poll until the batch reaches a terminal status."""
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if verbose:
+            counts = getattr(batch, "request_counts", None)
+            done = f"{counts.completed}/{counts.total}" if counts else "?"
+            print(f"[batch {batch_id}] {batch.status} ({done})")
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        time.sleep(poll_seconds)
+
+
+def _read_jsonl(client, file_id: Optional[str]) -> List[Dict]:
+    if not file_id:
+        return []
+    text = client.files.content(file_id).text
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def read_results(client, batch,
+                 usage_out: Optional[Dict[str, Dict]] = None,
+                 finish_out: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, str], Dict[str, Dict]]:
+    """
+    Split batch output into custom_id -> assistant text and custom_id -> error.
+    If given, `usage_out` is filled with custom_id -> the response's usage dict
+    and `finish_out` with custom_id -> finish_reason.
+    """
+    answers: Dict[str, str] = {}
+    errors: Dict[str, Dict] = {}
+    for row in _read_jsonl(client, getattr(batch, "output_file_id", None)) + \
+            _read_jsonl(client, getattr(batch, "error_file_id", None)):
+        cid = row.get("custom_id")
+        response = row.get("response") or {}
+        body = response.get("body") or {}
+        error = row.get("error") or body.get("error")
+        if response.get("status_code") == 200 and body.get("choices"):
+            answers[cid] = (body["choices"][0]["message"]["content"] or "").strip()
+            if usage_out is not None and body.get("usage"):
+                usage_out[cid] = body["usage"]
+            if finish_out is not None:
+                finish_out[cid] = body["choices"][0].get("finish_reason")
+        else:
+            code = (error or {}).get("code") or response.get("status_code")
+            message = (error or {}).get("message") or "no response"
+            errors[cid] = {"error_type": f"BatchError[{code}]", "error": message}
+    return answers, errors
+
+
+def run_batch(client, requests_path: str, state_path: Optional[str] = None,
+              poll_seconds: float = 30.0,
+              completion_window: str = "24h",
+              usage_out: Optional[Dict[str, Dict]] = None,
+              finish_out: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, str], Dict[str, Dict]]:
+    """
+    Submit (or resume) a batch and return (answers, errors) by custom_id.
+    The batch id is kept in `state_path`, so an interrupted poll picks up
+    the same batch on the next run instead of paying for a second one; it is
+    only resumed while the request file is unchanged (same SHA-1).
+    An expired batch returns what finished, with every other request in
+    `errors`; a failed or cancelled one raises RuntimeError.
+    """
+    state = _load_state(state_path)
+    requests_sha1 = _file_sha1(requests_path)
+    batch_id = None
+    if state.get("requests_path") == requests_path and state.get("requests_sha1") == requests_sha1:
+        batch_id = state.get("batch_id")
+    elif state.get("batch_id"):
+        print(f"Not resuming batch {state['batch_id']}: {requests_path} has changed since it was submitted")
+
+    if batch_id is None:
+        batch = submit_batch(client, requests_path, completion_window)
+        batch_id = batch.id
+        _save_state(state_path, {"batch_id": batch_id, "requests_path": requests_path,
+                                 "requests_sha1": requests_sha1, "status": batch.status})
+        print(f"Submitted batch {batch_id}")
+    else:
+        print(f"Resuming batch {batch_id}")
+
+    batch = wait_for_batch(client, batch_id, poll_seconds)
+    # Any terminal status consumes the batch; the next --batch run submits a fresh one.
+    if batch.status not in ("completed", "expired"):
+        _clear_state(state_path)
+        raise RuntimeError(f"Batch {batch_id} ended with status {batch.status}")
+
+    answers, errors = read_results(client, batch, usage_out, finish_out)
+    _clear_state(state_path)
+    if batch.status == "expired":
+        for cid in _request_ids(requests_path):
+            if cid not in answers and cid not in errors:
+                errors[cid] = {"error_type": "BatchError[expired]",
+                               "error": "the batch expired before this request ran"}
+        print(f"Batch {batch_id} expired: {len(answers)} answers kept, {len(errors)} requests not answered")
+    return answers, errors
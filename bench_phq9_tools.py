@@ -0,0 +1,398 @@
+"""
+Benchmarks for the phq9_tools scoring and export paths.
+
+Synthetic data, so the numbers are comparable between machines and runs:
+- an answer corpus with every scoring path of _parse_score_from_text: explicit
+  numbers, canonical anchors, "Choice:" lines, each fuzzy cue bucket (3/2/1/0),
+  Q9 risk and denial phrasing and answers that match nothing (the slowest path);
+- transcript folders in the Q&A file format of the runners at 1k / 10k / 100k
+  files, mixing those answers and ~2% malformed files (broken JSON, no
+  "Common Questions", empty list, missing character key).
+Folders are generated once per size and seed under Benchmarks/data/.
+
+For every function and size it records wall time (best of --repeat),
+throughput (answers or files per second) and peak Python memory (a separate
+tracemalloc pass), plus a digest of the scores so an optimisation can show
+it returns exactly the same results. Each run is appended to
+Benchmarks/phq9_tools.jsonl and compared with the previous run of the same
+benchmark; slowdowns over --regression are flagged (and make the exit
+code 1 with --fail-on-regression).
+
+Usage:
+------
+python bench_phq9_tools.py                          # 1k, 10k and 100k files
+python bench_phq9_tools.py --sizes 1k,10k --repeat 5
+python bench_phq9_tools.py --only parse,summarize --no-memory
+python bench_phq9_tools.py --sizes 10k,50k --only summarize --workers 0   # + parallel scoring
+python bench_phq9_tools.py --sizes 1k --fail-on-regression   # e.g. in CI
+"""
+
+import argparse
+import gc
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import phq9_tools
+from phq9_tools import (
+    PHQ9_ITEMS,
+    _parse_score_from_text,
+    answer_table,
+    character_item_detail,
+    export_summary,
+    score_answers,
+    score_character_file,
+    score_table,
+    summarize_results_folder,
+)
+
+BENCH_DIR = "Benchmarks"
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+HISTORY_PATH = os.path.join(BENCH_DIR, "phq9_tools.jsonl")
+DEFAULT_SIZES = "1k,10k,100k"
+MALFORMED_RATE = 0.02
+BENCHMARKS = ("parse", "score_file", "summarize", "item_detail", "batch", "export")
+
+# ---------------------------
+# synthetic answers
+# ---------------------------
+FILLERS = [
+    "Hmm, that's a hard one to answer.",
+    "I guess it depends on the week.",
+    "Work has been busy and the evenings go by quickly.",
+    "I've been trying to keep up with my routine.",
+    "My sister keeps asking me the same thing.",
+    "It's been a strange couple of weeks overall.",
+    "I'm still figuring out how to describe it.",
+]
+# bucket -> phrases that hit exactly that scoring path
+CUE_PHRASES = {
+    "explicit": ["Score: {k}", "Rating: {k}", "I'd put it at ({k}/3).", "PHQ-9: {k}"],
+    "anchor": ["Not at all, to be honest.", "Several days, I think.",
+               "More than half the days, probably.", "Nearly every day lately."],
+    "cue3": ["I feel that way constantly.", "It's there all the time.", "Most days, really.",
+             "Almost every day, yes."],
+    "cue2": ["It happens pretty often.", "I'd say frequently.", "Most of the time, yeah.",
+             "Usually in the evenings."],
+    "cue1": ["Sometimes, when I'm tired.", "Occasionally it creeps in.", "From time to time.",
+             "Some days are like that."],
+    "cue0": ["Rarely, if ever.", "I hardly notice it.", "Not really, no.",
+             "I wouldn't say that's me."],
+    "none": [""],
+}
+Q9_PHRASES = {
+    "q9_risk": ["Honestly, sometimes I think everyone would be better off dead without me.",
+                "I've had suicidal thoughts a few times.", "Some nights I just want to die."],
+    "q9_denial": ["No, there is no intent to harm myself.", "I don't plan to hurt myself.",
+                  "I'm not thinking about hurting myself at all."],
+}
+BUCKETS = list(CUE_PHRASES) + ["choice"] + list(Q9_PHRASES)
+CHOICE_LABELS = ["Not at all", "Several days", "More than half the days", "Nearly every day"]
+
+
+def synthetic_answer(rng: random.Random, bucket: str) -> str:
+    """A conversational answer whose score comes from `bucket`'s path."""
+    before = " ".join(rng.sample(FILLERS, rng.randint(1, 3)))
+    after = " ".join(rng.sample(FILLERS, rng.randint(0, 2)))
+    if bucket == "choice":
+        return f"{before} {after}".strip() + f"\nChoice: {rng.choice(CHOICE_LABELS)}"
+    phrases = Q9_PHRASES.get(bucket) or CUE_PHRASES[bucket]
+    cue = rng.choice(phrases).format(k=rng.randint(0, 3))
+    return " ".join(s for s in (before, cue, after) if s)
+
+
+def answer_corpus(n: int, seed: int) -> List[Tuple[str, str, Optional[int]]]:
+    """n (bucket, answer, question_id) triples, evenly spread over the buckets; Q9 buckets use id 9."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        bucket = BUCKETS[i % len(BUCKETS)]
+        qid = 9 if bucket in Q9_PHRASES else rng.randint(1, 8)
+        out.append((bucket, synthetic_answer(rng, bucket), qid))
+    return out
+
+
+# ---------------------------
+# synthetic transcript folders
+# ---------------------------
+def _item_bucket(rng: random.Random, question_id: int) -> str:
+    if question_id == 9:
+        return rng.choice(["q9_risk", "q9_denial", "q9_denial", "cue0", "none", "choice"])
+    return rng.choice([b for b in BUCKETS if b not in Q9_PHRASES])
+
+
+def synthetic_transcript(rng: random.Random, name: str) -> Dict:
+    """One PHQ-9 Q&A file as the runners save it."""
+    return {
+        "scale": "PHQ9",
+        "character": name,
+        "Common Questions": [{"Consultant": q, name: synthetic_answer(rng, _item_bucket(rng, i))}
+                             for i, q in enumerate(PHQ9_ITEMS, start=1)],
+    }
+
+
+def malformed_transcript(rng: random.Random, name: str) -> str:
+    kind = rng.choice(["truncated", "no_items", "empty_items", "no_character"])
+    if kind == "truncated":
+        text = json.dumps(synthetic_transcript(rng, name))
+        return text[:rng.randint(10, len(text) - 10)]
+    if kind == "no_items":
+        return json.dumps({"scale": "PHQ9", "character": name})
+    if kind == "empty_items":
+        return json.dumps({"scale": "PHQ9", "character": name, "Common Questions": []})
+    return json.dumps({"Common Questions": [{"Consultant": q} for q in PHQ9_ITEMS]})
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    return int(float(text[:-1]) * 1000) if text.endswith("k") else int(text)
+
+
+def size_label(n: int) -> str:
+    return f"{n // 1000}k" if n % 1000 == 0 and n >= 1000 else str(n)
+
+
+def transcript_folder(n: int, seed: int) -> str:
+    """Benchmarks/data/phq9-<n>-s<seed>/, generated on first use."""
+    path = os.path.join(DATA_DIR, f"phq9-{size_label(n)}-s{seed}")
+    marker = os.path.join(path, ".complete")
+    if os.path.exists(marker):
+        return path
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    rng = random.Random(seed * 1_000_003 + n)
+    print(f"Generating {n} transcripts in {path} ...", flush=True)
+    for i in range(n):
+        name = f"Synthetic Persona {i:06d}"
+        with open(os.path.join(path, f"Synthetic_Persona_{i:06d}.json"), "w", encoding="utf-8") as f:
+            if rng.random() < MALFORMED_RATE:
+                f.write(malformed_transcript(rng, name))
+            else:
+                json.dump(synthetic_transcript(rng, name), f, indent=2, ensure_ascii=False)
+    open(marker, "w").close()
+    return path
+
+
+# ---------------------------
+# measurement
+# ---------------------------
+def digest(values) -> str:
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def measure(fn: Callable[[], object], repeat: int, memory: bool) -> Tuple[float, Optional[int], object]:
+    """(best wall time in s, peak traced bytes or None, result of the last call)."""
+    best = float("inf")
+    result = None
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best, peak, result
+
+
+def frame_digest(df, cols: Optional[List[str]] = None) -> str:
+    cols = cols or [c for c in df.columns if c.startswith("item") or c in ("character", "score", "total", "missing")]
+    return digest(df[cols].astype(object).where(df[cols].notna(), None).values.tolist())
+
+
+def run_benchmarks(sizes: List[int], only: List[str], repeat: int, memory: bool,
+                   seed: int, xlsx: bool, workers: int = 1) -> List[Dict]:
+    results = []
+
+    def add(name: str, size: int, unit: str, count: int, seconds: float, peak: Optional[int], out_digest: str):
+        row = {"benchmark": name, "size": size, "unit": unit, "count": count,
+               "seconds": round(seconds, 6), "per_s": round(count / seconds, 1) if seconds else None,
+               "peak_mb": round(peak / 2**20, 2) if peak is not None else None, "digest": out_digest}
+        results.append(row)
+        memory_col = "" if row["peak_mb"] is None else f"{row['peak_mb']:>10.1f} MB"
+        print(f"{name:<34}{size_label(size):>6}{count:>10} {unit:<8}{seconds:>10.3f} s"
+              f"{row['per_s'] or 0:>13,.0f}/s{memory_col}", flush=True)
+
+    print(f"{'benchmark':<34}{'size':>6}{'count':>10} {'unit':<8}{'time':>12}{'throughput':>15}{'peak':>13}")
+    for size in sizes:
+        if "parse" in only:
+            corpus = answer_corpus(size * len(PHQ9_ITEMS), seed)
+            for bucket in ["all"] + BUCKETS:
+                answers = [(a, q) for b, a, q in corpus if bucket == "all" or b == bucket]
+                seconds, peak, scores = measure(
+                    lambda: [_parse_score_from_text(a, question_id=q) for a, q in answers], repeat, memory)
+                add(f"_parse_score_from_text[{bucket}]", size, "answers", len(answers), seconds, peak, digest(scores))
+
+        needs_folder = [b for b in only if b != "parse"]
+        if not needs_folder:
+            continue
+        folder = transcript_folder(size, seed)
+        paths = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".json"))
+
+        if "score_file" in only:
+            def score_all():
+                out = []
+                for p in paths:
+                    try:
+                        out.append(score_character_file(p)["total_score"])
+                    except Exception as e:
+                        out.append(type(e).__name__)
+                return out
+            seconds, peak, totals = measure(score_all, repeat, memory)
+            add("score_character_file", size, "files", len(paths), seconds, peak, digest(totals))
+
+        summary = None
+        if "summarize" in only or "export" in only:
+            seconds, peak, summary = measure(lambda: summarize_results_folder(folder), repeat, memory)
+            if "summarize" in only:
+                add("summarize_results_folder", size, "files", len(paths), seconds, peak, frame_digest(summary))
+                if workers > 1:
+                    # peak memory of the parent only; the workers' is not traced
+                    seconds, peak, parallel = measure(
+                        lambda: summarize_results_folder(folder, workers=workers), repeat, memory)
+                    add(f"summarize_results_folder[workers={workers}]", size, "files", len(paths), seconds, peak,
+                        frame_digest(parallel))
+
+        if "item_detail" in only:
+            seconds, peak, detail = measure(lambda: character_item_detail(folder), repeat, memory)
+            add("character_item_detail", size, "files", len(paths), seconds, peak,
+                frame_digest(detail.sort_values(["character", "question_id"])))
+
+        if "batch" in only:
+            seconds, peak, answers = measure(lambda: answer_table({"PHQ9": folder}), repeat, memory)
+            add("answer_table", size, "files", len(paths), seconds, peak, digest(len(answers)))
+            seconds, peak, scored = measure(lambda: score_answers(answers), repeat, memory)
+            add("score_answers", size, "answers", len(answers), seconds, peak,
+                digest(scored["score"].astype(object).where(scored["score"].notna(), None).tolist()))
+            seconds, peak, wide = measure(lambda: score_table(scored), repeat, memory)
+            add("score_table", size, "answers", len(answers), seconds, peak, frame_digest(wide, list(wide.columns)))
+
+        if "export" in only:
+            with tempfile.TemporaryDirectory() as tmp:
+                csv_path = os.path.join(tmp, "summary.csv")
+                seconds, peak, _ = measure(lambda: export_summary(summary, csv_path=csv_path), repeat, memory)
+                add("export_summary[csv]", size, "rows", len(summary), seconds, peak, digest(os.path.getsize(csv_path)))
+                if xlsx:
+                    xlsx_path = os.path.join(tmp, "summary.xlsx")
+                    seconds, peak, _ = measure(lambda: export_summary(summary, xlsx_path=xlsx_path), 1, memory)
+                    add("export_summary[xlsx]", size, "rows", len(summary), seconds, peak, "-")
+    return results
+
+
+# ---------------------------
+# history
+# ---------------------------
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def previous_results(path: str) -> Dict[Tuple[str, int], Dict]:
+    """Latest earlier result per (benchmark, size)."""
+    latest = {}
+    if not os.path.exists(path):
+        return latest
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                run = json.loads(line)
+                for row in run["results"]:
+                    latest[(row["benchmark"], row["size"])] = {**row, "commit": run.get("commit")}
+    return latest
+
+
+def compare(results: List[Dict], previous: Dict[Tuple[str, int], Dict], threshold: float) -> List[str]:
+    """Print the change against the previous run; return the regressions."""
+    regressions = []
+    lines = []
+    for row in results:
+        prev = previous.get((row["benchmark"], row["size"]))
+        if not prev or not prev.get("seconds"):
+            continue
+        change = row["seconds"] / prev["seconds"] - 1
+        note = ""
+        if prev.get("digest") not in (None, "-", row["digest"]):
+            note = "  ⚠️ results differ"
+            regressions.append(f"{row['benchmark']} {size_label(row['size'])}: results differ from {prev['commit']}")
+        if change > threshold:
+            note += "  ⚠️ slower"
+            regressions.append(f"{row['benchmark']} {size_label(row['size'])}: {change:+.0%} vs {prev['commit']}")
+        lines.append(f"{row['benchmark']:<34}{size_label(row['size']):>6}{change:>+9.1%}  (was {prev['seconds']:.3f} s "
+                     f"@ {prev['commit']}){note}")
+    if lines:
+        print("\nChange vs previous run:")
+        print("\n".join(lines))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark phq9_tools scoring and export")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"transcript folder sizes (default: {DEFAULT_SIZES})")
+    parser.add_argument("--only", default=",".join(BENCHMARKS),
+                        help=f"comma-separated subset of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark; the best is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory pass")
+    parser.add_argument("--no-xlsx", action="store_true", help="skip the Excel export")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="also time summarize with this many processes (0 = one per CPU)")
+    parser.add_argument("--history", default=HISTORY_PATH, help=f"results log (default: {HISTORY_PATH})")
+    parser.add_argument("--regression", type=float, default=0.2,
+                        help="flag benchmarks more than this much slower than the previous run (default: 0.2 = 20%%)")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="exit 1 if a benchmark regressed or its results changed")
+    args = parser.parse_args(argv)
+
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    only = [b.strip() for b in args.only.split(",") if b.strip()]
+    unknown = set(only) - set(BENCHMARKS)
+    if unknown:
+        raise SystemExit(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+    xlsx = not args.no_xlsx
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        xlsx = False
+
+    results = run_benchmarks(sizes, only, args.repeat, not args.no_memory, args.seed, xlsx,
+                             phq9_tools.resolve_workers(args.workers))
+    previous = previous_results(args.history)
+    run = {
+        "ts": datetime.utcnow().isoformat() + "Z",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pandas": phq9_tools.pd.__version__,
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.history) or ".", exist_ok=True)
+    with open(args.history, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run, ensure_ascii=False) + "\n")
+
+    regressions = compare(results, previous, args.regression)
+    print(f"\nResults appended to {args.history}")
+    if regressions and args.fail_on_regression:
+        print("\n".join(f"⚠️  {r}" for r in regressions))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
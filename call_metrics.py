@@ -0,0 +1,429 @@
+"""
+Per-call token, latency and cost accounting shared by the runners.
+
+Every LLM call made through a runner's call_chat produces one record:
+who it was for (persona, phase, scale, question_id, turn), the model,
+prompt / cached / completion tokens from `resp.usage`, wall-clock latency
+(including rate-limiter waits and retry backoff), the number of retries
+and an estimated dollar cost. Records are appended to a JSONL file and
+kept in memory for the end-of-run rollup (p50/p95/p99 latency, tokens and
+cost per phase and per scale).
+
+Usage is also tallied per persona, including the share of prompt tokens
+the provider served from its prompt cache
+(`usage.prompt_tokens_details.cached_tokens`). The runners keep each
+persona's long, unchanging system prompt at the very start of every
+request, so that share shows how much of the prompt is being reused.
+
+Usage:
+------
+from call_metrics import configure_metrics, record_call, get_metrics, get_tally
+
+configure_metrics("Metrics/calls.jsonl")
+resp = limited_create(client, model=MODEL_NAME, messages=messages)
+record_call({"persona": "Jane Doe", "phase": "casual", "turn": 3}, MODEL_NAME,
+            resp.usage, latency=0.84, retries=0)
+...
+print(format_rollup(get_metrics().rollup()))
+get_tally().save("Conversations/usage_by_persona.json")
+get_tally().save("Conversations/usage_by_persona.json", part="host:1234")    # one of several queue workers
+load_usage("Conversations/usage_by_persona.json")                          # merged tally
+
+Responses served from the local response cache are logged with
+source="cache" and zero tokens; they are left out of the latency
+percentiles and the per-persona tally.
+
+Each record also keeps the response's finish_reason; the rollup counts
+"length" (the reply hit its max_tokens budget) as `truncated`.
+
+Streamed calls (all_in_one.py --stream) also carry `ttft_s` (time to the
+first content chunk) and `early_stopped`. A stream that is closed early
+never receives its usage chunk, so its tokens are estimated
+(`usage_estimated`). The rollup estimates the completion tokens saved by
+early stops: for each (phase, role), the mean completion of calls that ran
+to the end (this run and earlier runs in the JSONL) minus what the cut
+call received.
+"""
+
+from __future__ import annotations
+import json
+import math
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+DEFAULT_METRICS_PATH = os.path.join("Metrics", "calls.jsonl")
+
+# USD per 1M tokens: (input, cached input, output). Batch API calls are billed at half price.
+PRICES_PER_MILLION = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+}
+BATCH_DISCOUNT = 0.5
+
+META_FIELDS = ("persona", "phase", "scale", "question_id", "turn", "role")
+
+
+def _field(obj, name: str):
+    """Attribute of an SDK usage object, or key of the same usage as a plain dict (Batch API output)."""
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def cached_tokens(usage) -> int:
+    """usage.prompt_tokens_details.cached_tokens, or 0 when the provider does not report it."""
+    return _field(_field(usage, "prompt_tokens_details"), "cached_tokens") or 0
+
+
+def call_cost(model: str, prompt_tokens: int, cached: int, completion_tokens: int,
+              source: str = "api") -> Optional[float]:
+    """Estimated USD cost of one call; None for models without a price entry."""
+    prices = PRICES_PER_MILLION.get(model)
+    if prices is None:
+        return None
+    input_price, cached_price, output_price = prices
+    cost = ((prompt_tokens - cached) * input_price + cached * cached_price
+            + completion_tokens * output_price) / 1_000_000
+    if source == "batch":
+        cost *= BATCH_DISCOUNT
+    return cost
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile; None for an empty list."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def _role_key(r: Dict):
+    return r.get("phase"), r.get("role")
+
+
+def completion_baselines(records: List[Dict]) -> Dict:
+    """Mean completion tokens per (phase, role) over successful API calls that were not cut short."""
+    sums: Dict = {}
+    for r in records:
+        if r.get("source") != "api" or not r.get("ok") or r.get("early_stopped") or r.get("usage_estimated"):
+            continue
+        total, n = sums.get(_role_key(r), (0, 0))
+        sums[_role_key(r)] = (total + r["completion_tokens"], n + 1)
+    return {k: total / n for k, (total, n) in sums.items()}
+
+
+class UsageTally:
+    """Thread-safe per-persona token counters."""
+
+    FIELDS = ("calls", "prompt_tokens", "cached_tokens", "completion_tokens")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_persona: Dict[str, Dict[str, int]] = {}
+
+    def record(self, persona: Optional[str], usage) -> None:
+        if usage is None:
+            return
+        row_key = persona or "(unattributed)"
+        with self._lock:
+            row = self.by_persona.setdefault(row_key, dict.fromkeys(self.FIELDS, 0))
+            row["calls"] += 1
+            row["prompt_tokens"] += _field(usage, "prompt_tokens") or 0
+            row["cached_tokens"] += cached_tokens(usage)
+            row["completion_tokens"] += _field(usage, "completion_tokens") or 0
+
+    @staticmethod
+    def _with_share(row: Dict[str, int]) -> Dict:
+        prompt = row["prompt_tokens"]
+        return {**row, "cached_share": round(row["cached_tokens"] / prompt, 3) if prompt else None}
+
+    def rows(self) -> List[Dict]:
+        """One dict per persona, with the share of prompt tokens that were cached."""
+        with self._lock:
+            return [{"persona": name, **self._with_share(row)} for name, row in sorted(self.by_persona.items())]
+
+    def totals(self) -> Dict:
+        with self._lock:
+            total = dict.fromkeys(self.FIELDS, 0)
+            for row in self.by_persona.values():
+                for field in self.FIELDS:
+                    total[field] += row[field]
+        return self._with_share(total)
+
+    def load_rows(self, path: str) -> None:
+        """Set the rows of a saved usage file (a persona's row replaces any earlier one)."""
+        with open(path, "r", encoding="utf-8") as f:
+            rows = json.load(f)["personas"]
+        with self._lock:
+            for row in rows:
+                self.by_persona[row["persona"]] = {field: row[field] for field in self.FIELDS}
+
+    def _write(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"totals": self.totals(), "personas": self.rows()}, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def save(self, path: str, part: Optional[str] = None) -> None:
+        """
+        Write totals and per-persona rows. With `part` (queue workers sharing
+        one `path`), this tally goes to its own file in usage_parts_dir(path)
+        and `path` is rebuilt from every part, so workers never overwrite
+        each other's rows; load_usage(path) merges the parts directly.
+        """
+        if part is None:
+            self._write(path)
+            return
+        parts_dir = usage_parts_dir(path)
+        self._write(os.path.join(parts_dir, "".join(c if c.isalnum() or c in "-." else "_" for c in part) + ".json"))
+        # Rebuild until no part changed while merging, so the last worker to finish writes every row.
+        while True:
+            before = _parts_snapshot(parts_dir)
+            merged = load_usage(path)
+            merged._write(path)
+            if _parts_snapshot(parts_dir) == before:
+                return
+
+
+def usage_parts_dir(path: str) -> str:
+    """Folder of the per-worker usage files behind `path` (e.g. usage_by_persona.parts/)."""
+    return os.path.splitext(path)[0] + ".parts"
+
+
+def _parts_snapshot(parts_dir: str) -> Dict[str, int]:
+    if not os.path.isdir(parts_dir):
+        return {}
+    return {e.name: e.stat().st_mtime_ns for e in os.scandir(parts_dir) if e.name.endswith(".json")}
+
+
+def load_usage(path: str) -> UsageTally:
+    """
+    The usage tally saved at `path`. If queue workers wrote parts, it is
+    merged from them instead; a persona run by several workers (a lost lease,
+    a requeue) keeps the row of the most recently written part.
+    """
+    tally = UsageTally()
+    parts_dir = usage_parts_dir(path)
+    snapshot = _parts_snapshot(parts_dir)
+    if snapshot:
+        for name in sorted(snapshot, key=lambda n: (snapshot[n], n)):
+            tally.load_rows(os.path.join(parts_dir, name))
+    elif os.path.exists(path):
+        tally.load_rows(path)
+    return tally
+
+
+class MetricsLog:
+    """Per-call records: appended to a JSONL file (if a path is set) and kept for the rollup."""
+
+    def __init__(self, path: Optional[str] = DEFAULT_METRICS_PATH):
+        self.path = path
+        self.records: List[Dict] = []
+        self._lock = threading.Lock()
+        self.run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+
+    def add(self, rec: Dict) -> None:
+        rec = {"run_id": self.run_id, **rec}
+        with self._lock:
+            self.records.append(rec)
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def history(self) -> List[Dict]:
+        """Every record in the JSONL file (all runs), or this run's records without a file."""
+        if not self.path or not os.path.exists(self.path):
+            with self._lock:
+                return list(self.records)
+        with open(self.path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    @staticmethod
+    def _summarize(records: List[Dict], baselines: Optional[Dict] = None) -> Dict:
+        latencies = [r["latency_s"] for r in records if r["source"] == "api" and r["ok"]]
+        costs = [r["cost_usd"] for r in records if r["cost_usd"] is not None]
+        ttfts = [r["ttft_s"] for r in records if r.get("ttft_s") is not None]
+        stopped = [r for r in records if r.get("early_stopped")]
+        saved = [max(0.0, baselines[_role_key(r)] - r["completion_tokens"])
+                 for r in stopped if baselines and _role_key(r) in baselines]
+        return {
+            "calls": len(records),
+            "api_calls": sum(1 for r in records if r["source"] != "cache"),
+            "failed": sum(1 for r in records if not r["ok"]),
+            "retries": sum(r["retries"] for r in records),
+            "truncated": sum(1 for r in records if r.get("finish_reason") == "length"),
+            "prompt_tokens": sum(r["prompt_tokens"] for r in records),
+            "cached_tokens": sum(r["cached_tokens"] for r in records),
+            "completion_tokens": sum(r["completion_tokens"] for r in records),
+            "latency_p50_s": percentile(latencies, 50),
+            "latency_p95_s": percentile(latencies, 95),
+            "latency_p99_s": percentile(latencies, 99),
+            "cost_usd": round(sum(costs), 6) if costs else None,
+            "streamed": len(ttfts),
+            "ttft_p50_s": percentile(ttfts, 50),
+            "ttft_p95_s": percentile(ttfts, 95),
+            "early_stopped": len(stopped),
+            # None when no early-stopped call has an uncut call of the same role to compare with
+            "completion_saved_est": round(sum(saved)) if saved else None,
+        }
+
+    def rollup(self) -> Dict:
+        """Totals plus breakdowns by phase, scale and role for this run's records."""
+        with self._lock:
+            records = list(self.records)
+        baselines = completion_baselines(self.history()) if any(r.get("early_stopped") for r in records) else {}
+
+        def group(field: str) -> Dict[str, Dict]:
+            groups: Dict[str, List[Dict]] = {}
+            for r in records:
+                if r.get(field) is not None:
+                    groups.setdefault(str(r[field]), []).append(r)
+            return {k: self._summarize(v, baselines) for k, v in sorted(groups.items())}
+
+        return {
+            "run_id": self.run_id,
+            "total": self._summarize(records, baselines),
+            "by_phase": group("phase"),
+            "by_scale": group("scale"),
+            "by_role": group("role"),
+        }
+
+    def save_rollup(self, path: str) -> Dict:
+        rollup = self.rollup()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(rollup, f, indent=2, ensure_ascii=False)
+        return rollup
+
+
+def format_rollup(rollup: Dict) -> str:
+    """Plain-text table of a rollup, one line per phase / scale."""
+    def fmt(v, spec):
+        return "-" if v is None else format(v, spec)
+
+    lines = [f"{'group':<22}{'calls':>7}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}"
+             f"{'prompt':>10}{'cached':>9}{'compl':>9}{'cost $':>11}"]
+    rows = [("total", rollup["total"])]
+    rows += [(f"phase={k}", v) for k, v in rollup["by_phase"].items()]
+    rows += [(f"scale={k}", v) for k, v in rollup["by_scale"].items()]
+    rows += [(f"role={k}", v) for k, v in rollup.get("by_role", {}).items()]
+    for name, s in rows:
+        lines.append(
+            f"{name:<22}{s['calls']:>7}{fmt(s['latency_p50_s'], '.2f'):>8}"
+            f"{fmt(s['latency_p95_s'], '.2f'):>8}{fmt(s['latency_p99_s'], '.2f'):>8}"
+            f"{s['prompt_tokens']:>10}{s['cached_tokens']:>9}{s['completion_tokens']:>9}"
+            f"{fmt(s['cost_usd'], '.4f'):>11}"
+        )
+
+    streamed = [(name, s) for name, s in rows if s.get("streamed")]
+    if streamed:
+        lines.append("")
+        lines.append(f"{'streamed':<22}{'calls':>7}{'ttft p50':>10}{'ttft p95':>10}"
+                     f"{'stopped':>9}{'saved compl (est)':>19}")
+        for name, s in streamed:
+            lines.append(
+                f"{name:<22}{s['streamed']:>7}{fmt(s['ttft_p50_s'], '.2f'):>10}"
+                f"{fmt(s['ttft_p95_s'], '.2f'):>10}{s['early_stopped']:>9}"
+                f"{fmt(s['completion_saved_est'], 'd'):>19}"
+            )
+    return "\n".join(lines)
+
+
+# ---------------------------
+# process-wide instances
+# ---------------------------
+_tally = UsageTally()
+_metrics = MetricsLog(path=None)
+
+
+def get_tally() -> UsageTally:
+    return _tally
+
+
+def get_metrics() -> MetricsLog:
+    return _metrics
+
+
+def configure_metrics(path: Optional[str] = DEFAULT_METRICS_PATH) -> MetricsLog:
+    """Start a fresh in-memory log; path=None keeps records in memory only."""
+    global _metrics
+    _metrics = MetricsLog(path)
+    return _metrics
+
+
+def record_usage(persona: Optional[str], usage) -> None:
+    _tally.record(persona, usage)
+
+
+def record_call(meta: Optional[Dict], model: str, usage=None, latency: Optional[float] = None,
+                retries: int = 0, source: str = "api", error_type: Optional[str] = None,
+                ttft: Optional[float] = None, early_stopped: bool = False,
+                finish_reason: Optional[str] = None) -> Dict:
+    """
+    Log one call. `meta` carries persona / phase / scale / question_id / turn / role;
+    `source` is "api", "batch" or "cache"; a call with `error_type` set failed.
+    `ttft` and `early_stopped` are set for streamed calls; finish_reason "length"
+    means the reply was cut by its max_tokens budget.
+    """
+    meta = meta or {}
+    prompt = _field(usage, "prompt_tokens") or 0
+    cached = cached_tokens(usage)
+    completion = _field(usage, "completion_tokens") or 0
+    rec = {
+        "ts": datetime.utcnow().isoformat() + "Z",
+        **{k: meta.get(k) for k in META_FIELDS},
+        "model": model,
+        "source": source,
+        "ok": error_type is None,
+        "error_type": error_type,
+        "finish_reason": finish_reason,
+        "prompt_tokens": prompt,
+        "cached_tokens": cached,
+        "completion_tokens": completion,
+        "latency_s": round(latency, 4) if latency is not None else None,
+        "retries": retries,
+        "ttft_s": round(ttft, 4) if ttft is not None else None,
+        "early_stopped": early_stopped,
+        "usage_estimated": bool(_field(usage, "estimated")),
+        "cost_usd": call_cost(model, prompt, cached, completion, source) if usage is not None else 0.0,
+    }
+    if source != "cache":
+        record_usage(meta.get("persona"), usage)
+    _metrics.add(rec)
+    return rec
+
+
+def rollup_path(metrics_path: str) -> str:
+    """Metrics/calls.jsonl -> Metrics/calls_rollup.json"""
+    return os.path.splitext(metrics_path)[0] + "_rollup.json"
+
+
+def add_metrics_args(parser):
+    """--metrics / --no-metrics flags shared by the runners."""
+    parser.add_argument("--metrics", default=DEFAULT_METRICS_PATH,
+                        help=f"append one JSON line per LLM call here (default: {DEFAULT_METRICS_PATH})")
+    parser.add_argument("--no-metrics", action="store_true",
+                        help="keep per-call records in memory only (the end-of-run rollup is still printed)")
+
+
+def configure_metrics_from_args(args) -> MetricsLog:
+    return configure_metrics(None if args.no_metrics else args.metrics)
+
+
+def report_metrics() -> Optional[Dict]:
+    """Print the rollup (and save it next to the JSONL); None if nothing was recorded."""
+    if not _metrics.records:
+        return None
+    rollup = _metrics.save_rollup(rollup_path(_metrics.path)) if _metrics.path else _metrics.rollup()
+    print("\nLLM calls:")
+    print(format_rollup(rollup))
+    if _metrics.path:
+        print(f"(per call: {_metrics.path}; rollup: {rollup_path(_metrics.path)})")
+    return rollup
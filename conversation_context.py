@@ -0,0 +1,142 @@
+"""
+Token-budgeted rolling context for the casual / therapist conversations.
+
+The runners used to rebuild the prompt transcript on every turn by joining
+the last 16 or 20 turns. That caps history by turn count, so a few long
+persona replies can still blow up the prompt. ConversationContext keeps
+the full turn list plus a rendered window of the most recent turns that
+fits a token budget; the window is updated incrementally as turns are
+appended, not re-joined per call.
+
+Turns that fall out of the window can optionally be folded into a running
+summary (also budgeted). The summary is updated every `summary_every`
+evicted turns and cached in between, so the rendered context stays bounded
+by window + summary budgets no matter how many rounds a conversation has.
+
+Usage:
+------
+from conversation_context import ConversationContext, digest_summarizer
+
+ctx = ConversationContext(budget_tokens=600, summarizer=digest_summarizer, summary_tokens=150)
+ctx.append({"role": "Friend", "content": "Hey, how have you been?"})
+len(ctx), ctx[-1]["content"]      # behaves like the old conv_history list
+ctx.render()                      # "Summary of earlier chat: ...\n\nFriend: ...\nPersona: ..."
+"""
+
+from __future__ import annotations
+import re
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+# Same heuristic as rate_limiter.estimate_tokens: ~4 characters per token.
+CHARS_PER_TOKEN = 4
+LINE_OVERHEAD_TOKENS = 1
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def approx_tokens(text: str) -> int:
+    """Local token estimate for one rendered line (no tokenizer dependency)."""
+    return -(-len(text) // CHARS_PER_TOKEN) + LINE_OVERHEAD_TOKENS
+
+
+def clip_to_tokens(text: str, budget: int) -> str:
+    """Shorten `text` so approx_tokens(text) <= budget, marking the cut with '…'."""
+    max_chars = max(1, (budget - LINE_OVERHEAD_TOKENS) * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 1].rstrip() + "…"
+
+
+def digest_summarizer(summary: str, evicted: List[str], budget: int) -> str:
+    """
+    Extractive running summary: the first sentence of each evicted line is
+    appended to the previous summary, and the oldest entries are dropped
+    once the summary exceeds `budget` tokens. Deterministic and free, so a
+    resumed conversation rebuilds exactly the same summary.
+    """
+    entries = [e for e in summary.split("\n") if e] if summary else []
+    for line in evicted:
+        role, _, text = line.partition(": ")
+        first = _SENTENCE_END.split(text.strip(), 1)[0]
+        entries.append(f"- {role}: {clip_to_tokens(first, 40)}")
+    while entries and sum(approx_tokens(e) for e in entries) > budget:
+        entries.pop(0)
+    return "\n".join(entries)
+
+
+Summarizer = Callable[[str, List[str], int], str]
+
+
+class ConversationContext:
+    """
+    Full conversation history plus a token-budgeted rendered window.
+    Supports len(), indexing, iteration and append() like the list of
+    {"role", "content"} dicts it replaces.
+    """
+
+    def __init__(self, budget_tokens: int = 600, summarizer: Optional[Summarizer] = None,
+                 summary_tokens: int = 150, summary_every: int = 4):
+        self.budget_tokens = budget_tokens
+        self.summarizer = summarizer
+        self.summary_tokens = summary_tokens
+        self.summary_every = summary_every
+
+        self.turns: List[Dict[str, str]] = []
+        self._window: Deque[Tuple[str, int]] = deque()   # (rendered line, tokens)
+        self._window_tokens = 0
+        self._window_text: Optional[str] = ""
+        self._pending: List[str] = []                     # evicted, not yet summarized
+        self.summary = ""
+        self.evicted = 0
+
+    # list-like access to the full history
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def __getitem__(self, index):
+        return self.turns[index]
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        return iter(self.turns)
+
+    def append(self, turn: Dict[str, str]) -> None:
+        self.turns.append(turn)
+        line = clip_to_tokens(f"{turn['role']}: {turn['content']}", self.budget_tokens)
+        tokens = approx_tokens(line)
+        self._window.append((line, tokens))
+        self._window_tokens += tokens
+
+        evicted = False
+        while self._window_tokens > self.budget_tokens and len(self._window) > 1:
+            old_line, old_tokens = self._window.popleft()
+            self._window_tokens -= old_tokens
+            self._pending.append(old_line)
+            self.evicted += 1
+            evicted = True
+
+        if evicted:
+            self._window_text = None  # rebuilt on next render
+        elif self._window_text is not None:
+            self._window_text = f"{self._window_text}\n{line}" if self._window_text else line
+
+        if self.summarizer is not None and len(self._pending) >= self.summary_every:
+            self.summary = self.summarizer(self.summary, self._pending, self.summary_tokens)
+            self._pending = []
+        elif self.summarizer is None:
+            self._pending = []
+
+    def window_text(self) -> str:
+        """The recent turns, newest last, within budget_tokens."""
+        if self._window_text is None:
+            self._window_text = "\n".join(line for line, _ in self._window)
+        return self._window_text
+
+    def render(self) -> str:
+        """Summary of evicted turns (if any) followed by the recent window."""
+        if not self.summary:
+            return self.window_text()
+        return f"Summary of earlier chat:\n{self.summary}\n\n{self.window_text()}"
+
+    def window_tokens(self) -> int:
+        return self._window_tokens
@@ -0,0 +1,188 @@
+"""
+Dependency-aware scheduler for the per-persona pipelines.
+
+Each persona is a small graph of async nodes, e.g.
+
+    PHQ9 ─┐
+    GAD7 ─┼─> background ─> casual turns
+    ASRM ─┘
+
+Nodes start as soon as their dependencies have finished, so independent
+work from every persona is available at once. The number of LLM calls in
+flight is capped by one shared CallPool: a node only holds a slot while a
+request is actually on the wire (the runner's acall_chat wraps each API
+call in `pool.slot()`). When more calls are ready than there are slots,
+the waiting calls form the queue. They are served by node priority, which
+is the persona's position in the run, so personas that started earlier
+finish first while the pool stays full.
+
+Usage:
+------
+from dag_scheduler import CallPool, DagScheduler
+
+pool = CallPool(size=32)
+sched = DagScheduler(pool, report_every=10)
+sched.add("Jane/PHQ9", lambda: run_scale(...), priority=0)
+sched.add("Jane/background", lambda phq9: ..., deps=["Jane/PHQ9"], priority=0)
+results = await sched.run()   # {key: result}; prints progress lines while running
+
+# inside the call wrapper
+async with pool.slot():
+    resp = await client.chat.completions.create(...)
+"""
+
+from __future__ import annotations
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+# Priority of the node whose code is running; inherited by tasks it spawns.
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("dag_priority", default=0)
+
+
+class DependencyFailed(Exception):
+    """A node was skipped because one of its dependencies failed."""
+
+
+class CallPool:
+    """At most `size` calls in flight; waiters are served lowest priority first, FIFO within a priority."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.in_flight = 0
+        self.completed = 0
+        self.peak_waiting = 0
+        self._waiters: List = []          # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self.started_at = time.monotonic()
+        self._busy_integral = 0.0         # ∫ in_flight dt, for mean utilisation
+        self._last_change = self.started_at
+
+    @property
+    def waiting(self) -> int:
+        """Queue depth: calls that are ready but have no slot yet."""
+        return len(self._waiters)
+
+    def _account(self):
+        now = time.monotonic()
+        self._busy_integral += self.in_flight * (now - self._last_change)
+        self._last_change = now
+
+    async def acquire(self):
+        if self.in_flight < self.size and not self._waiters:
+            self._account()
+            self.in_flight += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (_priority.get(), next(self._seq), fut))
+        self.peak_waiting = max(self.peak_waiting, len(self._waiters))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()  # slot was handed over just as we were cancelled
+            else:
+                self._waiters = [w for w in self._waiters if w[2] is not fut]
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self):
+        self._account()
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)  # hand the slot straight to the next waiter
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.completed += 1
+            self.release()
+
+    def stats(self) -> Dict:
+        self._account()
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "calls": self.completed,
+            "elapsed_s": round(elapsed, 2),
+            "calls_per_s": round(self.completed / elapsed, 2),
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "peak_queue_depth": self.peak_waiting,
+            "mean_utilisation": round(self._busy_integral / (elapsed * self.size), 3),
+        }
+
+
+class DagScheduler:
+    """Runs async nodes once their dependencies are done; a failed node fails its dependents."""
+
+    def __init__(self, pool: CallPool, report_every: Optional[float] = 10.0):
+        self.pool = pool
+        self.report_every = report_every
+        self._nodes: Dict[str, Dict[str, Any]] = {}
+        self.done = 0
+        self.failed = 0
+        self.errors: Dict[str, BaseException] = {}   # nodes whose own code raised
+
+    def add(self, key: str, fn: Callable[..., Awaitable[Any]], deps: Sequence[str] = (),
+            priority: int = 0) -> str:
+        """`fn` is called with the results of `deps`, in order."""
+        if key in self._nodes:
+            raise ValueError(f"Duplicate node: {key}")
+        for dep in deps:
+            if dep not in self._nodes:
+                raise ValueError(f"Node {key} depends on unknown node {dep}")
+        self._nodes[key] = {"fn": fn, "deps": list(deps), "priority": priority}
+        return key
+
+    async def _run_node(self, key: str, tasks: Dict[str, asyncio.Task]):
+        node = self._nodes[key]
+        args = []
+        for dep in node["deps"]:
+            try:
+                args.append(await tasks[dep])
+            except Exception as e:
+                self.failed += 1
+                raise DependencyFailed(f"{key}: dependency {dep} failed") from e
+        _priority.set(node["priority"])
+        try:
+            result = await node["fn"](*args)
+        except Exception as e:
+            self.failed += 1
+            self.errors[key] = e
+            raise
+        self.done += 1
+        return result
+
+    def progress(self) -> str:
+        s = self.pool.stats()
+        return (f"[dag] nodes {self.done}/{len(self._nodes)} done, {self.failed} failed | "
+                f"calls {s['calls']} ({s['calls_per_s']}/s) | in flight {s['in_flight']}/{self.pool.size} | "
+                f"queue {s['queue_depth']}")
+
+    async def _reporter(self):
+        while True:
+            await asyncio.sleep(self.report_every)
+            print(self.progress())
+
+    async def run(self) -> Dict[str, Any]:
+        """Run every node; returns {key: result} (failed nodes map to their exception)."""
+        tasks: Dict[str, asyncio.Task] = {}
+        for key in self._nodes:  # insertion order is a valid topological order (deps must exist)
+            tasks[key] = asyncio.ensure_future(self._run_node(key, tasks))
+        reporter = asyncio.ensure_future(self._reporter()) if self.report_every else None
+        try:
+            outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+        return dict(zip(tasks, outcomes))
@@ -0,0 +1,94 @@
+"""
+Dead-letter queue for LLM calls that still fail after all retries.
+
+Instead of writing "[ERROR] ..." into a transcript as if the persona had
+said it, the runner raises CallFailed, records one structured JSONL line
+per failed unit (a questionnaire item or a casual-conversation turn) and
+carries on. `--retry-failed` then re-runs exactly those units.
+
+Record fields:
+    persona, phase ("questionnaire" | "casual" | "therapist"), scale,
+    question_id, turn, error_type, error, attempts, failed_at
+
+all_in_one.py, scale_sessions.py and run_combined_sessions.py each keep
+their own queue file.
+"""
+
+from __future__ import annotations
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+class CallFailed(Exception):
+    """An LLM call that exhausted its retries."""
+
+    def __init__(self, cause: BaseException, attempts: int):
+        super().__init__(f"{type(cause).__name__}: {cause}")
+        self.cause = cause
+        self.error_type = type(cause).__name__
+        self.attempts = attempts
+
+
+class DeadLetterQueue:
+    """Append-only JSONL file of failed units; safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    def record(self, error: CallFailed, persona: str, phase: str, **unit) -> Dict:
+        return self.record_raw(persona, phase, error.error_type, str(error.cause), error.attempts, **unit)
+
+    def record_raw(self, persona: str, phase: str, error_type: str, error: str, attempts: int,
+                   scale: Optional[str] = None, question_id: Optional[int] = None,
+                   turn: Optional[int] = None) -> Dict:
+        rec = {
+            "persona": persona,
+            "phase": phase,
+            "scale": scale,
+            "question_id": question_id,
+            "turn": turn,
+            "error_type": error_type,
+            "error": error,
+            "attempts": attempts,
+            "failed_at": datetime.utcnow().isoformat() + "Z",
+        }
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            self.recorded += 1
+        return rec
+
+    def read(self) -> List[Dict]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def take(self) -> List[Dict]:
+        """
+        Move the queue aside for a retry pass and return its records; units
+        that fail again are re-recorded in a fresh queue. Records from a
+        retry pass that never finished are picked up again.
+        """
+        aside = self.path + ".retrying"
+        with self._lock:
+            records = DeadLetterQueue(aside).read() + self.read()
+            if records:
+                with open(aside, "w", encoding="utf-8") as f:
+                    for rec in records:
+                        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        return records
+
+    def finish_retry(self):
+        """The retry pass completed; drop the set-aside records."""
+        aside = self.path + ".retrying"
+        if os.path.exists(aside):
+            os.remove(aside)
@@ -0,0 +1,123 @@
+"""
+Per-role generation budgets shared by the runners.
+
+The prompts ask for short replies ("1–2 short sentences", "1–3 sentences",
+"answer briefly ... then Choice: ..."), but nothing stopped the model from
+writing a paragraph, which costs latency and bloats the next turn's
+context. Every call now names its role and gets that role's `max_tokens`
+and `stop` sequences from ROLE_BUDGETS. The caps are loose on purpose,
+a few times the length the prompt asks for, so a reply that follows the
+prompt is never cut; they only bound the runaway ones. The stop sequences
+end a reply that starts writing the other speaker's next line.
+
+A reply that hits `max_tokens` comes back with finish_reason "length".
+The per-call metrics count those per role, so the caps can be tuned from
+the rollup without touching the prompts.
+
+Usage:
+------
+from generation_budget import add_budget_args, budget_params, configure_budgets_from_args, report_budgets
+
+configure_budgets_from_args(args)          # --no-budgets / --budget friend=60
+params = budget_params("friend")           # {"max_tokens": 100, "stop": ["\nPersona:", "\nFriend:"]}
+resp = limited_create(client, model=MODEL_NAME, messages=messages, **params)
+record_call(meta, MODEL_NAME, resp.usage, finish_reason=resp.choices[0].finish_reason)
+...
+report_budgets(report_metrics())           # per role: max_tokens, calls, truncated, rate
+"""
+
+from __future__ import annotations
+import copy
+from typing import Dict, Iterable, Optional
+
+ROLE_BUDGETS: Dict[str, Dict] = {
+    # questionnaire item: a brief answer plus the "Choice: ..." / "Rating: ..." line
+    "answer":     {"max_tokens": 200, "stop": None},
+    # one JSON object answering a whole instrument; a cut object fails to parse, so no cap
+    "structured": {"max_tokens": None, "stop": None},
+    # conversation turns: 1–2 sentences for the Friend / Therapist, 1–3 for the persona
+    "opener":     {"max_tokens": 100, "stop": ["\nPersona:"]},
+    "friend":     {"max_tokens": 100, "stop": ["\nPersona:", "\nFriend:"]},
+    "therapist":  {"max_tokens": 100, "stop": ["\nPersona:", "\nTherapist:"]},
+    "persona":    {"max_tokens": 150, "stop": ["\nFriend:", "\nTherapist:", "\nPersona:"]},
+}
+
+_budgets: Optional[Dict[str, Dict]] = copy.deepcopy(ROLE_BUDGETS)
+
+
+def configure_budgets(enabled: bool = True, overrides: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Dict]]:
+    """Start from ROLE_BUDGETS, apply max_tokens overrides; enabled=False sends no limits at all."""
+    global _budgets
+    if not enabled:
+        _budgets = None
+        return None
+    budgets = copy.deepcopy(ROLE_BUDGETS)
+    for role, max_tokens in (overrides or {}).items():
+        if role not in budgets:
+            raise ValueError(f"Unknown role {role!r}; expected one of {', '.join(budgets)}")
+        budgets[role]["max_tokens"] = max_tokens
+    _budgets = budgets
+    return _budgets
+
+
+def get_budgets() -> Optional[Dict[str, Dict]]:
+    return _budgets
+
+
+def budget_params(role: Optional[str]) -> Dict:
+    """API parameters for `role` ({} when budgets are off or the role has none)."""
+    if _budgets is None or role not in _budgets:
+        return {}
+    budget = _budgets[role]
+    params = {}
+    if budget["max_tokens"]:
+        params["max_tokens"] = budget["max_tokens"]
+    if budget["stop"]:
+        params["stop"] = list(budget["stop"])
+    return params
+
+
+def parse_overrides(values: Iterable[str]) -> Dict[str, int]:
+    """["friend=60", "persona=120"] -> {"friend": 60, "persona": 120}"""
+    out = {}
+    for value in values:
+        role, sep, n = value.partition("=")
+        if not sep or not n.strip().isdigit():
+            raise ValueError(f"Expected ROLE=N, got {value!r}")
+        out[role.strip()] = int(n)
+    return out
+
+
+def add_budget_args(parser):
+    """--budget ROLE=N / --no-budgets flags shared by the runners."""
+    parser.add_argument("--budget", action="append", default=[], metavar="ROLE=N",
+                        help=f"override a role's max_tokens (roles: {', '.join(ROLE_BUDGETS)}); repeatable")
+    parser.add_argument("--no-budgets", action="store_true",
+                        help="send no max_tokens / stop sequences (the behaviour before per-role budgets)")
+
+
+def configure_budgets_from_args(args) -> Optional[Dict[str, Dict]]:
+    try:
+        return configure_budgets(not args.no_budgets, parse_overrides(args.budget))
+    except ValueError as e:
+        raise SystemExit(f"--budget: {e}")
+
+
+def format_budgets(rollup: Dict) -> str:
+    """One line per role: its budget and how often a reply hit max_tokens."""
+    lines = [f"{'role':<12}{'max_tokens':>11}{'calls':>7}{'truncated':>11}{'rate':>8}"]
+    for role, s in rollup.get("by_role", {}).items():
+        budget = (_budgets or {}).get(role, {})
+        api_calls = s["api_calls"]
+        rate = f"{s['truncated'] / api_calls:.1%}" if api_calls else "-"
+        lines.append(f"{role:<12}{budget.get('max_tokens') or '-':>11}{api_calls:>7}"
+                     f"{s['truncated']:>11}{rate:>8}")
+    return "\n".join(lines)
+
+
+def report_budgets(rollup: Optional[Dict]) -> None:
+    """Print format_budgets for a rollup from call_metrics.report_metrics (no-op without one)."""
+    if not rollup or not rollup.get("by_role"):
+        return
+    print("\nGeneration budgets:" if _budgets is not None else "\nGeneration budgets: off (--no-budgets)")
+    print(format_budgets(rollup))
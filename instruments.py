@@ -0,0 +1,143 @@
+"""
+Instrument registry: every questionnaire the runners can ask, read from
+CommonQuestions/*.json.
+
+Each file holds the items ("questions", unchanged) plus an "instrument"
+block with what the runners need to ask, score and talk about it:
+
+    {
+      "instrument": {
+        "name": "GAD7", "title": "GAD-7", "order": 2,
+        "options": ["Not at all", "Several days", ...],   # in score order
+        "score_range": [0, 3],                               # score of the first option, of the last
+        "rating_hint": "'Rating: 0–3' (0=Not at all, ...)",   # wording of the session runners
+        "topics": ["feeling tense or on edge", ...],         # casual-chat themes (all_in_one.py)
+        "paraphrases": ["Have you been feeling on edge ...?", ...]   # friend questions (scale_sessions.py)
+      },
+      "questions": [{"question_id": 1, "content": "..."}, ...]
+    }
+
+Adding a scale (e.g. PCL-5) means dropping one such file into
+CommonQuestions/; every runner picks it up in the same pass over the
+personas. Files without an "instrument" block are ignored.
+
+Usage:
+------
+from instruments import add_instrument_args, load_instruments
+
+instruments = load_instruments()                  # {"PHQ9": Instrument, "GAD7": ..., "ASRM": ...}
+instruments = load_instruments(names=["GAD7"])    # a subset, still in registry order
+inst = instruments["GAD7"]
+inst.questions, inst.options, inst.score_range, inst.option_text
+"""
+
+from __future__ import annotations
+import glob
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+INSTRUMENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CommonQuestions")
+
+
+class Instrument:
+    """One questionnaire: its items and the anchors, range and topics used to ask and score it."""
+
+    def __init__(self, name: str, questions: List[Dict], options: List[str],
+                 title: Optional[str] = None, order: int = 100,
+                 score_range: Optional[Tuple[int, int]] = None,
+                 rating_hint: Optional[str] = None,
+                 topics: Optional[List[str]] = None,
+                 paraphrases: Optional[List[str]] = None,
+                 path: Optional[str] = None):
+        self.name = name
+        self.title = title or name
+        self.order = order
+        self.questions = questions
+        self.options = list(options)
+        self.score_range = tuple(score_range) if score_range else (0, len(self.options) - 1)
+        self.rating_hint = rating_hint
+        self.topics = list(topics or [])
+        self.paraphrases = list(paraphrases or [])
+        self.path = path
+        low, high = self.score_range
+        if high - low + 1 != len(self.options):
+            raise ValueError(f"{name}: {len(self.options)} options do not match score range {low}–{high}")
+
+    @property
+    def option_text(self) -> str:
+        """Answer instructions for one item, ending with the 'Choice: <option>' line."""
+        return (
+            "Please answer briefly and realistically in character.\n"
+            "Then on a new line, write: Choice: <one of>\n"
+            + " | ".join(self.options) + "."
+        )
+
+    def score(self, option: str) -> Optional[int]:
+        """Score of an option label (case-insensitive), or None."""
+        lowered = [o.lower() for o in self.options]
+        option = (option or "").strip().lower()
+        return self.score_range[0] + lowered.index(option) if option in lowered else None
+
+    @classmethod
+    def from_file(cls, path: str) -> Optional["Instrument"]:
+        """None for a questions file without an "instrument" block."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        meta = data.get("instrument")
+        if not meta:
+            return None
+        return cls(
+            name=meta.get("name") or os.path.splitext(os.path.basename(path))[0],
+            questions=data["questions"],
+            options=meta["options"],
+            title=meta.get("title"),
+            order=meta.get("order", 100),
+            score_range=meta.get("score_range"),
+            rating_hint=meta.get("rating_hint"),
+            topics=meta.get("topics"),
+            paraphrases=meta.get("paraphrases"),
+            path=path,
+        )
+
+
+def load_instruments(directory: str = INSTRUMENTS_DIR,
+                     names: Optional[Iterable[str]] = None) -> Dict[str, Instrument]:
+    """Instruments in `directory` sorted by (order, name); `names` selects a subset."""
+    found: Dict[str, Instrument] = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        inst = Instrument.from_file(path)
+        if inst is None:
+            continue
+        if inst.name in found:
+            raise ValueError(f"Instrument {inst.name} defined twice ({found[inst.name].path}, {path})")
+        found[inst.name] = inst
+    ordered = dict(sorted(found.items(), key=lambda kv: (kv[1].order, kv[0])))
+    if names is None:
+        return ordered
+    names = list(names)
+    unknown = [n for n in names if n not in ordered]
+    if unknown:
+        raise ValueError(f"Unknown instrument(s) {', '.join(unknown)}; available: {', '.join(ordered)}")
+    return {n: inst for n, inst in ordered.items() if n in names}
+
+
+def parse_instrument_list(value: Optional[str]) -> Optional[List[str]]:
+    """'PHQ9,GAD7' -> ["PHQ9", "GAD7"]; None / '' -> None (all instruments)."""
+    if not value:
+        return None
+    return [n.strip().upper().replace("-", "") for n in value.split(",") if n.strip()]
+
+
+def add_instrument_args(parser):
+    """--instruments flag shared by the runners."""
+    parser.add_argument("--instruments", default=None, metavar="NAMES",
+                        help="comma-separated subset of the instruments in CommonQuestions/ "
+                             "(e.g. PHQ9,GAD7; default: all)")
+
+
+def load_instruments_from_args(args, directory: str = INSTRUMENTS_DIR) -> Dict[str, Instrument]:
+    try:
+        return load_instruments(directory, parse_instrument_list(args.instruments))
+    except ValueError as e:
+        raise SystemExit(f"--instruments: {e}")
@@ -0,0 +1,220 @@
+"""
+Offline load test: the full all_in_one.py pipeline against the local
+stand-in server (stub_server.py), for any number of synthetic personas.
+
+Creates a fresh work folder (LoadTest/run-<timestamp>/) holding N
+generated personas in Characters/characters.json and a copy of
+CommonQuestions/, starts the stub on a free port (unless --base-url points
+at one already running), runs all_in_one.py there with the stub as
+OPENAI_BASE_URL and reports:
+- wall time and calls/sec;
+- latency p50 / p95 / p99 / max of the API calls (from Metrics/calls.jsonl);
+- error recovery: errors the stub injected vs. calls that needed retries,
+  calls that failed for good and dead-lettered units;
+- personas completed (casual chat saved).
+The report is also saved as loadgen_report.json in the work folder.
+
+Everything after "--" is passed to all_in_one.py unchanged, so the same
+command compares engines and settings (--in-flight, --concurrency,
+--stream, --structured, --batch, ...). The stub's own flags (latency,
+token rate, error injection, capacity) are the ones of stub_server.py.
+
+Usage:
+------
+python loadgen.py --personas 2000 --latency lognormal:0.3,0.5 --error-429 0.02 -- --in-flight 256 --rounds 5
+python loadgen.py --personas 500 --tokens-per-sec 60 -- --concurrency 16 --stream
+python loadgen.py --base-url http://127.0.0.1:8765/v1 --personas 100 -- --in-flight 64
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from call_metrics import DEFAULT_METRICS_PATH, percentile
+from stub_server import add_stub_args, config_from_args, start_server
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LOADTEST_DIR = "LoadTest"
+REPORT_NAME = "loadgen_report.json"
+DEAD_LETTER_REL = os.path.join("Conversations", "dead_letter.jsonl")
+CASUAL_REL = os.path.join("Conversations", "Casual")
+# Outputs of a previous run in the same --workdir, removed so the report covers this run only
+RUN_OUTPUTS = ("Conversations", "Metrics", "Batch", "Cache", "Queue", "Shards")
+
+FIRST_NAMES = ["Alex", "Jordan", "Maya", "Sam", "Priya", "Liam", "Noor", "Daniel", "Chloe", "Mateo",
+               "Hana", "Owen", "Zara", "Lucas", "Amara", "Ethan", "Sofia", "Kai", "Grace", "Ravi"]
+LAST_NAMES = ["Rivera", "Chen", "Okafor", "Novak", "Patel", "Schmidt", "Haddad", "Kim", "Moreau",
+              "Silva", "Andersen", "Tanaka", "Byrne", "Kowalski", "Mensah", "Ortiz"]
+OCCUPATIONS = ["a nurse working night shifts", "a university student", "a retired teacher",
+               "a warehouse supervisor", "a freelance designer", "a stay-at-home parent",
+               "a software tester", "a line cook", "between jobs"]
+PROBLEMS = ["feels persistently low and has lost interest in hobbies",
+            "worries constantly about money and sleeps poorly",
+            "has bursts of restless energy followed by exhaustion",
+            "feels isolated since moving to a new city",
+            "is stressed by caring for an ill parent",
+            "copes fairly well but has occasional bad weeks"]
+MANNERS = ["guarded at first, then candid", "talkative and quick to joke", "quiet and thoughtful",
+           "blunt and a little impatient", "warm but self-critical"]
+
+
+def synthetic_persona(i: int, rng: random.Random) -> Dict:
+    """One characters.json entry, in the shape of the real personas."""
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i:05d}"
+    age = rng.randint(16, 78)
+    return {
+        "name": name,
+        "system_prompt": (
+            f"You are {name}, a {age}-year-old participating in a simulated cognitive behavioural "
+            f"therapy (CBT) session with the user, who is playing the role of your therapist.\n\n"
+            f"Profile: {name} is {rng.choice(OCCUPATIONS)}.\n\n"
+            f"Presenting Problem: {name} {rng.choice(PROBLEMS)}.\n\n"
+            f"Interaction Guidelines:\n1. {name} is {rng.choice(MANNERS)}.\n"
+            f"2. Respond naturally and realistically as {name} would during a CBT session.\n\n"
+            f"Your task: Engage authentically as {name}, reflecting their mindset, tone, and emotional nuance."
+        ),
+    }
+
+
+def prepare_workdir(path: str, personas: int, seed: int) -> None:
+    rng = random.Random(seed)
+    for folder in RUN_OUTPUTS:
+        shutil.rmtree(os.path.join(path, folder), ignore_errors=True)
+    os.makedirs(os.path.join(path, "Characters"), exist_ok=True)
+    with open(os.path.join(path, "Characters", "characters.json"), "w", encoding="utf-8") as f:
+        json.dump({"characters": [synthetic_persona(i + 1, rng) for i in range(personas)]}, f,
+                  indent=2, ensure_ascii=False)
+    shutil.copytree(os.path.join(HERE, "CommonQuestions"), os.path.join(path, "CommonQuestions"),
+                    dirs_exist_ok=True)
+
+
+def read_jsonl(path: str) -> List[Dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def fetch_stats(base_url: str) -> Optional[Dict]:
+    """The stub's /stats counters (None if the server isn't the stub)."""
+    url = base_url.rstrip("/").rsplit("/v1", 1)[0] + "/stats"
+    try:
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            return json.load(resp)
+    except (OSError, ValueError):
+        return None
+
+
+def build_report(workdir: str, wall: float, returncode: int, personas: int,
+                 stats: Optional[Dict], runner_args: List[str]) -> Dict:
+    records = read_jsonl(os.path.join(workdir, DEFAULT_METRICS_PATH))
+    api = [r for r in records if r["source"] != "cache"]
+    latencies = [r["latency_s"] for r in api if r["ok"] and r["latency_s"] is not None]
+    ttfts = [r["ttft_s"] for r in api if r.get("ttft_s") is not None]
+    casual = os.path.join(workdir, CASUAL_REL)
+    completed = len([f for f in os.listdir(casual) if f.endswith((".json", ".jsonl"))]) if os.path.isdir(casual) else 0
+
+    def round_or_none(v):
+        return None if v is None else round(v, 4)
+    return {
+        "workdir": workdir,
+        "runner_args": runner_args,
+        "returncode": returncode,
+        "personas": personas,
+        "personas_completed": completed,
+        "wall_s": round(wall, 2),
+        "calls": len(api),
+        "calls_per_s": round(len(api) / wall, 2) if wall else None,
+        "latency_p50_s": round_or_none(percentile(latencies, 50)),
+        "latency_p95_s": round_or_none(percentile(latencies, 95)),
+        "latency_p99_s": round_or_none(percentile(latencies, 99)),
+        "latency_max_s": round_or_none(max(latencies) if latencies else None),
+        "ttft_p95_s": round_or_none(percentile(ttfts, 95)),
+        "completion_tokens": sum(r["completion_tokens"] for r in api),
+        "retried_calls": sum(1 for r in api if r["retries"]),
+        "recovered_calls": sum(1 for r in api if r["retries"] and r["ok"]),
+        "failed_calls": sum(1 for r in api if not r["ok"]),
+        "dead_letters": len(read_jsonl(os.path.join(workdir, DEAD_LETTER_REL))),
+        "server": stats,
+    }
+
+
+def format_report(report: Dict) -> str:
+    def fmt(v, spec=".3f"):
+        return "-" if v is None else format(v, spec)
+
+    lines = [
+        f"Personas:     {report['personas_completed']}/{report['personas']} casual chats saved "
+        f"(runner exit code {report['returncode']})",
+        f"Throughput:   {report['calls']} calls in {report['wall_s']:.1f} s = {fmt(report['calls_per_s'], '.1f')} calls/s",
+        f"Latency (s):  p50 {fmt(report['latency_p50_s'])}  p95 {fmt(report['latency_p95_s'])}  "
+        f"p99 {fmt(report['latency_p99_s'])}  max {fmt(report['latency_max_s'])}",
+        f"Recovery:     {report['retried_calls']} calls retried, {report['recovered_calls']} recovered, "
+        f"{report['failed_calls']} failed, {report['dead_letters']} dead letters",
+    ]
+    stats = report["server"]
+    if stats:
+        injected = stats.get("injected_429", 0) + stats.get("injected_500", 0)
+        lines.append(f"Server:       {stats.get('requests', 0)} requests, {injected} injected errors "
+                     f"({stats.get('injected_429', 0)}×429, {stats.get('injected_500', 0)}×500), "
+                     f"{stats.get('capacity_429', 0)} capacity 429s")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    runner_args = argv[argv.index("--") + 1:] if "--" in argv else []
+    own_args = argv[:argv.index("--")] if "--" in argv else argv
+
+    parser = argparse.ArgumentParser(description="Load-test all_in_one.py against the local stub server",
+                                     epilog="arguments after -- go to all_in_one.py")
+    parser.add_argument("--personas", type=int, default=1000, help="synthetic personas to generate")
+    parser.add_argument("--workdir", default=None,
+                        help=f"work folder (default: {LOADTEST_DIR}/run-<timestamp>)")
+    parser.add_argument("--base-url", default=None,
+                        help="use an already running stub (e.g. http://127.0.0.1:8765/v1) instead of starting one")
+    parser.add_argument("--persona-seed", type=int, default=0, help="seed of the generated personas")
+    add_stub_args(parser)
+    args = parser.parse_args(own_args)
+
+    workdir = os.path.abspath(args.workdir or os.path.join(
+        LOADTEST_DIR, "run-" + datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")))
+    prepare_workdir(workdir, args.personas, args.persona_seed)
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = start_server(config_from_args(args), port=0)
+        base_url = server.url
+    env = {**os.environ, "OPENAI_BASE_URL": base_url, "OPENAI_API_KEY": "stub"}
+    cmd = [sys.executable, os.path.join(HERE, "all_in_one.py")] + runner_args
+    print(f"{args.personas} personas in {workdir}; stub at {base_url}")
+    print(f"$ {' '.join(cmd)}")
+
+    start = time.perf_counter()
+    with open(os.path.join(workdir, "runner.log"), "w", encoding="utf-8") as log:
+        returncode = subprocess.call(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    wall = time.perf_counter() - start
+
+    report = build_report(workdir, wall, returncode, args.personas, fetch_stats(base_url), runner_args)
+    if server is not None:
+        server.shutdown()
+    with open(os.path.join(workdir, REPORT_NAME), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"\n{format_report(report)}")
+    print(f"\nRunner log: {os.path.join(workdir, 'runner.log')}")
+    print(f"Report:     {os.path.join(workdir, REPORT_NAME)}")
+    if returncode:
+        sys.exit(returncode)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Combine the outputs of a sharded run (--shard i/N, see sharding.py) into
+one tree, as if a single process had run every persona.
+
+Checks first, then copies:
+- every shard 1..N has a manifest.json, and all shards agree on N;
+- every persona in characters.json was completed by exactly one shard
+  (per runner and instrument set, e.g. all_in_one PHQ9+GAD7+ASRM);
+- no output file exists in two shards; no two personas share a file name.
+Any problem is reported and nothing is written unless --force is given.
+
+Then every per-persona file under Shards/<i>-of-<N>/ is copied to the same
+relative path under --out. Dead letters are concatenated, token usage is
+summed per persona, and the per-call metrics of all shards are written to
+Metrics/shards.jsonl (each record tagged with its shard) with a fresh
+rollup. The merged manifest lists the shards and their runs.
+
+Usage:
+------
+python merge_shards.py                      # Shards/* -> ./Conversations, ./Metrics
+python merge_shards.py --check              # report only
+python merge_shards.py --out Merged --force # write even with missing personas
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from call_metrics import MetricsLog, UsageTally, format_rollup
+from sharding import MANIFEST_NAME, SHARDS_DIR, read_manifest, shard_index
+
+CHARACTERS_PATH = "Characters/characters.json"
+
+# Files a shard keeps for itself or that are rebuilt from all shards, not copied as is
+# (dead letters of all_in_one.py, scale_sessions.py and run_combined_sessions.py)
+DEAD_LETTER_RELS = tuple(os.path.join("Conversations", name) for name in
+                         ("dead_letter.jsonl", "dead_letter_sessions.jsonl", "dead_letter_combined.jsonl"))
+USAGE_REL = os.path.join("Conversations", "usage_by_persona.json")
+SKIP_DIRS = ("Metrics", "Batch")
+MERGED_METRICS_REL = os.path.join("Metrics", "shards.jsonl")
+MERGED_MANIFEST_REL = os.path.join("Conversations", "shards_manifest.json")
+
+
+def safe_name(s: str) -> str:
+    out = "".join(c if c.isalnum() or c in "-_." else "_" for c in s)
+    return out.strip("._") or "conversation"
+
+
+def load_shards(shards_dir: str) -> Tuple[Dict[int, Dict], List[str]]:
+    """index -> manifest (with its folder under "root"), plus problems found on the way."""
+    manifests: Dict[int, Dict] = {}
+    problems = []
+    for root in sorted(glob.glob(os.path.join(shards_dir, "*-of-*"))):
+        manifest = read_manifest(os.path.join(root, MANIFEST_NAME))
+        if manifest is None:
+            problems.append(f"{root}: no {MANIFEST_NAME} (shard still running or crashed?)")
+            continue
+        manifests[manifest["index"]] = {**manifest, "root": root}
+    counts = sorted({m["count"] for m in manifests.values()})
+    if len(counts) > 1:
+        problems.append(f"shards disagree on N: {', '.join(map(str, counts))}; "
+                        f"merge one layout at a time (--shards-dir)")
+    elif counts:
+        missing = [i for i in range(1, counts[0] + 1) if i not in manifests]
+        if missing:
+            problems.append(f"missing shard(s) {', '.join(f'{i}/{counts[0]}' for i in missing)}")
+    return manifests, problems
+
+
+def check_personas(manifests: Dict[int, Dict], names: List[str]) -> List[str]:
+    """Missing / duplicate / misplaced personas per runner and instrument set."""
+    problems = []
+    by_file: Dict[str, List[str]] = {}
+    for name in names:
+        by_file.setdefault(safe_name(name), []).append(name)
+    for file_name, owners in by_file.items():
+        if len(owners) > 1:
+            problems.append(f"personas {', '.join(owners)} share the output name {file_name}.json")
+
+    completed: Dict[Tuple, Dict[str, set]] = {}
+    for index, manifest in sorted(manifests.items()):
+        for run in manifest["runs"]:
+            group = completed.setdefault((run["runner"], tuple(run["instruments"])), {})
+            for name in run["completed"]:
+                group.setdefault(name, set()).add(index)
+
+    known = set(names)
+    for (runner, instruments), done in sorted(completed.items()):
+        label = f"{runner} [{'+'.join(instruments)}]"
+        missing = [n for n in names if n not in done]
+        if missing:
+            problems.append(f"{label}: {len(missing)} persona(s) not completed: {', '.join(missing[:10])}"
+                            + (" ..." if len(missing) > 10 else ""))
+        for name, shards in sorted(done.items()):
+            if len(shards) > 1:
+                problems.append(f"{label}: {name} completed by shards {', '.join(map(str, sorted(shards)))}")
+            elif name not in known:
+                problems.append(f"{label}: {name} is not in {CHARACTERS_PATH}")
+            else:
+                index = next(iter(shards))
+                expected = shard_index(name, manifests[index]["count"])
+                if expected != index:
+                    problems.append(f"{label}: {name} ran in shard {index} but hashes to shard {expected}")
+    return problems
+
+
+def shard_files(root: str) -> List[str]:
+    """Relative paths of the files to copy from one shard folder."""
+    out = []
+    for path in glob.glob(os.path.join(root, "**", "*"), recursive=True):
+        rel = os.path.relpath(path, root)
+        if (os.path.isdir(path) or rel == MANIFEST_NAME or rel.split(os.sep)[0] in SKIP_DIRS
+                or rel == USAGE_REL or rel.startswith(DEAD_LETTER_RELS)):
+            continue
+        out.append(rel)
+    return sorted(out)
+
+
+def check_files(manifests: Dict[int, Dict]) -> Tuple[Dict[str, str], List[str]]:
+    """relative path -> source file, plus paths written by more than one shard."""
+    sources: Dict[str, str] = {}
+    owners: Dict[str, str] = {}
+    problems = []
+    for index, manifest in sorted(manifests.items()):
+        for rel in shard_files(manifest["root"]):
+            if rel in sources:
+                problems.append(f"{rel} exists in both {owners[rel]} and {manifest['root']}")
+                continue
+            sources[rel] = os.path.join(manifest["root"], rel)
+            owners[rel] = manifest["root"]
+    return sources, problems
+
+
+def read_jsonl(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def merge_metrics(manifests: Dict[int, Dict], out_dir: str) -> Optional[Dict]:
+    """All shards' per-call records -> one JSONL (tagged with the shard) and its rollup."""
+    log = MetricsLog(None)
+    log.run_id = "shards"
+    for index, manifest in sorted(manifests.items()):
+        for path in sorted(glob.glob(os.path.join(manifest["root"], "Metrics", "*.jsonl"))):
+            log.records.extend({**rec, "shard": manifest["shard"]} for rec in read_jsonl(path))
+    if not log.records:
+        return None
+    path = os.path.join(out_dir, MERGED_METRICS_REL)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for rec in log.records:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    return log.save_rollup(os.path.splitext(path)[0] + "_rollup.json")
+
+
+def merge_usage(manifests: Dict[int, Dict], out_dir: str) -> Optional[Dict]:
+    tally = UsageTally()
+    for manifest in manifests.values():
+        path = os.path.join(manifest["root"], USAGE_REL)
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            rows = json.load(f)["personas"]
+        for row in rows:
+            merged = tally.by_persona.setdefault(row["persona"], dict.fromkeys(UsageTally.FIELDS, 0))
+            for field in UsageTally.FIELDS:
+                merged[field] += row[field]
+    if not tally.by_persona:
+        return None
+    tally.save(os.path.join(out_dir, USAGE_REL))
+    return tally.totals()
+
+
+def merge_dead_letters(manifests: Dict[int, Dict], out_dir: str) -> Dict[str, int]:
+    """Concatenate each runner's dead letters; merged path -> failed units."""
+    merged = {}
+    for rel in DEAD_LETTER_RELS:
+        records = []
+        for index, manifest in sorted(manifests.items()):
+            path = os.path.join(manifest["root"], rel)
+            if os.path.exists(path):
+                records.extend(read_jsonl(path))
+        if records:
+            path = os.path.join(out_dir, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                for rec in records:
+                    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            merged[path] = len(records)
+    return merged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Combine --shard i/N outputs into one tree")
+    parser.add_argument("--shards-dir", default=SHARDS_DIR, help=f"folder holding <i>-of-<N>/ (default: {SHARDS_DIR})")
+    parser.add_argument("--out", default=".", help="where Conversations/ and Metrics/ are written (default: .)")
+    parser.add_argument("--characters", default=CHARACTERS_PATH,
+                        help="persona list every persona is checked against")
+    parser.add_argument("--check", action="store_true", help="report problems only; write nothing")
+    parser.add_argument("--force", action="store_true", help="merge even if personas are missing or duplicated")
+    args = parser.parse_args(argv)
+
+    manifests, problems = load_shards(args.shards_dir)
+    if not manifests:
+        raise SystemExit(f"No shard manifests under {args.shards_dir}/")
+    with open(args.characters, "r", encoding="utf-8") as f:
+        names = [p["name"] for p in json.load(f)["characters"]]
+    problems += check_personas(manifests, names)
+    sources, file_problems = check_files(manifests)
+    problems += file_problems
+
+    count = next(iter(manifests.values()))["count"]
+    print(f"{len(manifests)} of {count} shards, {len(sources)} files, {len(names)} personas in {args.characters}")
+    for problem in problems:
+        print(f"⚠️  {problem}")
+    if args.check:
+        sys.exit(1 if problems else 0)
+    if problems and not args.force:
+        raise SystemExit(f"{len(problems)} problem(s); nothing written (use --force to merge anyway)")
+
+    for rel, src in sorted(sources.items()):
+        dst = os.path.join(args.out, rel)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copy2(src, dst)
+    failed = merge_dead_letters(manifests, args.out)
+    usage = merge_usage(manifests, args.out)
+    rollup = merge_metrics(manifests, args.out)
+
+    manifest_path = os.path.join(args.out, MERGED_MANIFEST_REL)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "count": count,
+            "shards": [{"shard": m["shard"], "runs": m["runs"]} for _, m in sorted(manifests.items())],
+            "personas": len(names),
+            "files": len(sources),
+            "problems": problems,
+            "merged_at": datetime.utcnow().isoformat() + "Z",
+        }, f, indent=2, ensure_ascii=False)
+
+    print(f"\n✅ Merged {len(sources)} files into {os.path.join(args.out, 'Conversations')}")
+    print(f"- Manifest:       {manifest_path}")
+    if usage is not None:
+        print(f"- Token usage:    {usage} (per persona: {os.path.join(args.out, USAGE_REL)})")
+    for path, n in failed.items():
+        print(f"- Dead letters:   {n} failed units in {path}")
+    if rollup is not None:
+        print("\nLLM calls (all shards):")
+        print(format_rollup(rollup))
+        print(f"(per call: {os.path.join(args.out, MERGED_METRICS_REL)})")
+
+if __name__ == "__main__":
+    main()
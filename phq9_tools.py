@@ -15,17 +15,37 @@ scores = score_character_file("Results/Sherlock_Holmes.json")
 # 2) Summarize all characters under Results/
 df_summary = summarize_results_folder("PHQ9 Conversation")
 
+# 2b) Same, scored on every core (worker processes, same output)
+df_summary = summarize_results_folder("PHQ9 Conversation", workers=0)
+
 # 3) Export to CSV and/or Excel
 export_summary(df_summary, csv_path="Results/phq9_summary.csv", xlsx_path="Results/phq9_summary.xlsx")
+
+# 4) Rescore every scale at once (PHQ-9, GAD-7, ASRM, ...) from a long-form table
+answers = answer_table()                 # persona, scale, question_id, answer
+scored = score_answers(answers)          # + score, score_source
+wide = score_table(answers)              # PHQ9_Q1..PHQ9_Q9, PHQ9_total, PHQ9_missing, GAD7_Q1, ...
+
+# 5) Same, from the columnar result store (all_in_one.py --store) instead of JSON files
+answers = answer_table(store="Conversations/results.parquet")
+df_summary, df_detail = analyze_store("Conversations/results.parquet")
+
+# 6) Score a huge run directory one file at a time (.json or .jsonl, constant memory)
+for fname, result, error in iter_scored_files("PHQ9 Conversation"):
+    ...
 """
 
 from __future__ import annotations
-import json
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Optional, Tuple
 import pandas as pd
 
+from instruments import load_instruments
+from result_store import read_results
+from transcript_jsonl import is_transcript, load_transcript
+
 # ---------------------------
 # PHQ-9 canonical labels
 # ---------------------------
@@ -49,6 +69,20 @@ ANCHOR_TO_SCORE = {
     "nearly every day": 3,
 }
 
+# The instrument registry (CommonQuestions/*.json, see instruments.py) and each
+# instrument's verbal options in score order; a label scores through
+# Instrument.score, so a scale's score_range offset applies everywhere.
+# The runners ask for a final "Choice: <option>" line using these labels.
+SCALE_INSTRUMENTS = load_instruments()
+SCALE_CHOICES = {name: inst.options for name, inst in SCALE_INSTRUMENTS.items()}
+
+_CHOICE_LINE = re.compile(r"choice\s*:\s*(.+)", re.IGNORECASE)
+_CHOICE_LINE_LOWER = re.compile(r"choice\s*:\s*(.+)")
+
+# Where the runners save each scale's per-item answers
+QA_FOLDER = os.path.join("Conversations", "{scale}", "Question based Conversation")
+ANSWER_COLUMNS = ["persona", "scale", "question_id", "answer"]
+
 # Regexes to detect explicit numeric scoring in answers (e.g., "Score: 2", "(2/3)", "PHQ-9: 1")
 EXPLICIT_SCORE_PATTERNS = [
     re.compile(r"\bscore\s*[:=]\s*([0-3])\b", re.IGNORECASE),
@@ -59,9 +93,98 @@ EXPLICIT_SCORE_PATTERNS = [
 ]
 
 
+# Conversational cues per score, checked 3 -> 2 -> 1 -> 0 so stronger signals win.
+# Feel free to tweak these lists as you see real data.
+FUZZY_CUES = {
+    3: [
+        r"\bnearly every day\b", r"\bevery day\b", r"\ball the time\b", r"\balways\b",
+        r"\bconstantly\b", r"\balmost every day\b", r"\bmost days\b"
+    ],
+    2: [
+        r"\bmore than half (the )?days\b", r"\boften\b", r"\bfrequently\b",
+        r"\bpretty often\b", r"\ba lot\b", r"\bmost of the time\b", r"\busually\b"
+    ],
+    1: [
+        r"\bseveral days\b", r"\bsometimes\b", r"\bfrom time to time\b",
+        r"\boccasionally\b", r"\bsome days\b", r"\bkinda\b", r"\bkind of\b"
+    ],
+    0: [
+        r"\bnot at all\b", r"\brarely\b", r"\bhardly\b", r"\bnot really\b",
+        r"\bdon'?t\b.*\b(have|feel|notice)\b", r"\bwouldn'?t say\b", r"\bno,?\s?not\b"
+    ],
+}
+
+# Q9 (self-harm): strong positive risk language -> 3, clear denials -> 0,
+# both before the general cues to reduce false positives/negatives.
+Q9_RISK = [
+    r"\bwish( i)? (were|was) dead\b", r"\b(i )?want to die\b",
+    r"\bkill myself\b", r"\b(end|ending) (my|their) life\b",
+    r"\bsuicidal\b", r"\bself-?harm\b", r"\bbetter off dead\b"
+]
+Q9_DENIALS = [
+    r"\bno (thoughts|intent|plans) (of|to) (hurt|harm|kill) (myself|me)\b",
+    r"\bi don'?t (want|plan|intend) to (hurt|harm|kill) myself\b",
+    r"\bwouldn'?t say i want to (hurt|harm|kill) myself\b",
+    r"\bnot thinking about (hurting|harming|killing) myself\b",
+    r"\bno,? not (really )?(thinking|having thoughts) of (self-?harm|hurting myself|being dead)\b",
+]
+
+_DIGIT_0_3 = re.compile(r"[0-3]")
+_ANCHORS_LONGEST_FIRST = sorted(ANCHOR_TO_SCORE, key=len, reverse=True)
+
+
+def _first_letters(pattern: str) -> Optional[set]:
+    """
+    Letters a cue can start with: '\\bfoo' -> {'f'}, '\\b(i )?want' -> {'i', 'w'},
+    '\\b(end|ending)' -> {'e'}. None if the pattern has another shape.
+    """
+    body = pattern[2:] if pattern.startswith(r"\b") else pattern
+    if body[:1].isalpha():
+        return {body[0]}
+    m = re.match(r"\(([a-z' |-]+)\)(\??)(.?)", body)
+    if not m or "" in m.group(1).split("|"):
+        return None
+    letters = {alt[0] for alt in m.group(1).split("|")}
+    if m.group(2):
+        letters.add(m.group(3))
+    return letters if all(c.isalpha() for c in letters) else None
+
+
+def _compile_cue_scan(buckets: List[Tuple[int, List[str]]]) -> Tuple["re.Pattern", List[int]]:
+    """
+    One regex over (score, patterns) buckets in priority order. At every word
+    boundary it reports the first bucket with a pattern matching there (as group
+    b<i>); the lookahead is zero-width, so overlapping cues are all seen, exactly
+    as with one re.search per pattern. Positions whose letter starts no cue are
+    skipped cheaply. Returns (pattern, score per bucket).
+    """
+    alternatives = "|".join(f"(?P<b{i}>{'|'.join(f'(?:{p})' for p in patterns)})"
+                            for i, (_, patterns) in enumerate(buckets))
+    firsts = [_first_letters(p) for _, patterns in buckets for p in patterns]
+    gate = "" if None in firsts else f"(?=[{''.join(sorted(set().union(*firsts)))}])"
+    return re.compile(rf"\b{gate}(?=(?:{alternatives}))"), [score for score, _ in buckets]
+
+
+_CUE_SCAN = _compile_cue_scan([(score, FUZZY_CUES[score]) for score in (3, 2, 1, 0)])
+_Q9_SCAN = _compile_cue_scan([(3, Q9_RISK), (0, Q9_DENIALS)] + [(score, FUZZY_CUES[score]) for score in (3, 2, 1, 0)])
+
+
+def _scan_cues(scan: Tuple["re.Pattern", List[int]], text: str) -> Optional[int]:
+    """Score of the highest-priority bucket matching anywhere in `text` (None if none does)."""
+    pattern, scores = scan
+    best = None
+    for m in pattern.finditer(text):
+        bucket = int(m.lastgroup[1:])
+        if best is None or bucket < best:
+            best = bucket
+            if best == 0:
+                break
+    return None if best is None else scores[best]
+
+
 def _normalize(s: str) -> str:
     """Lowercase and collapse whitespace for robust matching."""
-    return re.sub(r"\s+", " ", (s or "").strip().lower())
+    return " ".join((s or "").lower().split())
 
 
 def _parse_score_from_text(answer: str, question_id: Optional[int] = None) -> Optional[int]:
@@ -72,99 +195,49 @@ def _parse_score_from_text(answer: str, question_id: Optional[int] = None) -> Op
       2) canonical PHQ-9 anchors
       3) fuzzy conversational cues (e.g., 'sometimes', 'often', 'always', 'not really')
     Special handling for Q9 (self-harm).
+    The cues are scanned in one pass (see _compile_cue_scan).
     """
     if not answer:
         return None
 
-    # 1) explicit numeric
-    for pat in EXPLICIT_SCORE_PATTERNS:
-        m = pat.search(answer)
-        if m:
-            try:
-                val = int(m.group(1))
-                if 0 <= val <= 3:
-                    return val
-            except Exception:
-                pass
+    # 1) explicit numeric (every pattern needs a 0-3 digit)
+    if _DIGIT_0_3.search(answer):
+        for pat in EXPLICIT_SCORE_PATTERNS:
+            m = pat.search(answer)
+            if m:
+                return int(m.group(1))
 
     # normalize once
     ans_n = _normalize(answer)
 
     # 2) canonical anchors (longest first)
-    anchors_sorted = sorted(ANCHOR_TO_SCORE.keys(), key=len, reverse=True)
-    for phrase in anchors_sorted:
+    for phrase in _ANCHORS_LONGEST_FIRST:
         if phrase in ans_n:
             return ANCHOR_TO_SCORE[phrase]
 
-    # 3) fuzzy conversational cues
-    #   We search in order 3 -> 2 -> 1 -> 0 so stronger signals win.
-    #   Feel free to tweak these lists as you see real data.
-    cues3 = [
-        r"\bnearly every day\b", r"\bevery day\b", r"\ball the time\b", r"\balways\b",
-        r"\bconstantly\b", r"\balmost every day\b", r"\bmost days\b"
-    ]
-    cues2 = [
-        r"\bmore than half (the )?days\b", r"\boften\b", r"\bfrequently\b",
-        r"\bpretty often\b", r"\ba lot\b", r"\bmost of the time\b", r"\busually\b"
-    ]
-    cues1 = [
-        r"\bseveral days\b", r"\bsometimes\b", r"\bfrom time to time\b",
-        r"\boccasionally\b", r"\bsome days\b", r"\bkinda\b", r"\bkind of\b"
-    ]
-    cues0 = [
-        r"\bnot at all\b", r"\brarely\b", r"\bhardly\b", r"\bnot really\b",
-        r"\bdon'?t\b.*\b(have|feel|notice)\b", r"\bwouldn'?t say\b", r"\bno,?\s?not\b"
-    ]
-
-    def match_any(patterns):
-        return any(re.search(p, ans_n) for p in patterns)
-
-    # Special handling for Q9 (self-harm) to reduce false positives/negatives
-    if question_id == 9:
-        # Strong positive risk language -> 3
-        risk3 = [
-            r"\bwish( i)? (were|was) dead\b", r"\b(i )?want to die\b",
-            r"\bkill myself\b", r"\b(end|ending) (my|their) life\b",
-            r"\bsuicidal\b", r"\bself-?harm\b", r"\bbetter off dead\b"
-        ]
-        if match_any(risk3):
-            return 3
-
-        # Clear denials -> 0
-        denials = [
-            r"\bno (thoughts|intent|plans) (of|to) (hurt|harm|kill) (myself|me)\b",
-            r"\bi don'?t (want|plan|intend) to (hurt|harm|kill) myself\b",
-            r"\bwouldn'?t say i want to (hurt|harm|kill) myself\b",
-            r"\bnot thinking about (hurting|harming|killing) myself\b",
-            r"\bno,? not (really )?(thinking|having thoughts) of (self-?harm|hurting myself|being dead)\b",
-        ]
-        if match_any(denials):
-            return 0
-
-        # Softer language → use general cues
-        if match_any(cues3): return 3
-        if match_any(cues2): return 2
-        if match_any(cues1): return 1
-        if match_any(cues0): return 0
-        return None
+    # 3) fuzzy conversational cues (Q9: risk and denials first)
+    return _scan_cues(_Q9_SCAN if question_id == 9 else _CUE_SCAN, ans_n)
 
-    # Non-Q9 items: general cues fallback
-    if match_any(cues3): return 3
-    if match_any(cues2): return 2
-    if match_any(cues1): return 1
-    if match_any(cues0): return 0
 
-    return None
-
-
-def _load_character_conversation(path: str) -> Tuple[str, List[Dict[str, str]]]:
+def extract_choice(answer: str, scale: str = "PHQ9") -> Optional[int]:
     """
-    Read one Results/<Character>.json, return (character_name, qa_list).
-    qa_list items are dicts with keys: 'Consultant' and '<Character Name>'.
+    Score an answer from its 'Choice: <option>' line (or the whole answer
+    if there is none), as the rating notebook does. Longer labels are
+    tried first so 'Very Often' is not read as 'Often'.
     """
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    if not answer:
+        return None
+    m = _CHOICE_LINE.search(answer)
+    choice = (m.group(1) if m else answer).strip().lower()
+    labels = SCALE_CHOICES[scale]
+    for label in sorted(labels, key=len, reverse=True):
+        if label.lower() in choice:
+            return SCALE_INSTRUMENTS[scale].score(label)
+    return None
+
 
+def _character_conversation(data: Dict, path: str) -> Tuple[str, List[Dict[str, str]]]:
+    """(character_name, qa_list) of a parsed Results/<Character>.json."""
     # The character name is dynamic: the other key beside 'Consultant' in each item
     # Grab it from the first item.
     items = data.get("Common Questions", [])
@@ -180,6 +253,14 @@ def _load_character_conversation(path: str) -> Tuple[str, List[Dict[str, str]]]:
     return character_name, items
 
 
+def _load_character_conversation(path: str) -> Tuple[str, List[Dict[str, str]]]:
+    """
+    Read one Results/<Character>.json (or .jsonl), return (character_name, qa_list).
+    qa_list items are dicts with keys: 'Consultant' and '<Character Name>'.
+    """
+    return _character_conversation(load_transcript(path), path)
+
+
 def score_character_file(path: str) -> Dict:
     """
     Score all PHQ-9 items for a single character file.
@@ -195,8 +276,11 @@ def score_character_file(path: str) -> Dict:
       "missing": <count of None scores>
     }
     """
-    character_name, items = _load_character_conversation(path)
+    return score_character_data(*_load_character_conversation(path))
+
 
+def score_character_data(character_name: str, items: List[Dict[str, str]]) -> Dict:
+    """score_character_file for an already parsed conversation (see _character_conversation)."""
     # Build a mapping from question -> answer for robustness
     q_to_a: Dict[str, str] = {}
     for row in items:
@@ -231,26 +315,89 @@ def score_character_file(path: str) -> Dict:
     }
 
 
-def summarize_results_folder(results_dir: str) -> pd.DataFrame:
+# Files per task handed to a worker process; big enough to amortize the pickling
+CHUNK_FILES = 256
+
+
+def resolve_workers(workers: Optional[int]) -> int:
+    """Worker process count: None/1 = in-process, 0 = one per CPU."""
+    if workers is None:
+        return 1
+    if workers == 0:
+        return os.cpu_count() or 1
+    if workers < 0:
+        raise ValueError(f"workers must be >= 0, got {workers}")
+    return workers
+
+
+def map_chunks(fn, items: List, workers: Optional[int] = 1) -> List:
     """
-    Walk a Results/ folder, score each <Character>.json, and return a tidy DataFrame.
-    Columns: character, item1..item9, total, missing
+    fn(chunk) -> list of results, applied to consecutive chunks of `items`
+    in worker processes; results come back in input order. `fn` must be a
+    module-level function (it is pickled). Runs in-process for one worker.
     """
-    rows = []
-    for fname in os.listdir(results_dir):
-        if not fname.lower().endswith(".json"):
-            continue
-        path = os.path.join(results_dir, fname)
+    workers = min(resolve_workers(workers), max(1, len(items)))
+    if workers == 1:
+        return fn(items)
+    # ~4 chunks per worker evens out slow files without paying per-file IPC
+    size = max(1, min(CHUNK_FILES, -(-len(items) // (workers * 4))))
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    out = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for part in pool.map(fn, chunks):
+            out.extend(part)
+    return out
+
+
+def _score_paths(paths: List[str]) -> List[Tuple[Optional[Dict], Optional[str]]]:
+    out = []
+    for path in paths:
         try:
-            scored = score_character_file(path)
-            row = {"character": scored["character"]}
-            for item in scored["items"]:
+            out.append((score_character_file(path), None))
+        except Exception as e:
+            out.append((None, f"{type(e).__name__}: {e}"))
+    return out
+
+
+def iter_scored_files(results_dir: str):
+    """
+    (file name, score_character_file result or None, error or None) for every
+    .json / .jsonl file in `results_dir`, one file at a time in directory order;
+    memory stays flat however many files the folder holds.
+    """
+    with os.scandir(results_dir) as entries:
+        for entry in entries:
+            if is_transcript(entry.name) and entry.is_file():
+                yield (entry.name, *_score_paths([entry.path])[0])
+
+
+def scored_files(results_dir: str, index=None, answers: bool = True,
+                 workers: Optional[int] = 1) -> List[Tuple[str, Optional[Dict], Optional[str]]]:
+    """
+    (file name, score_character_file result or None, error or None) for every
+    .json / .jsonl file in `results_dir`, in file name order. With a ScoreIndex
+    (score_index.py) only new or changed files are read and scored; the rest
+    come from the index (answers=False lets it skip the answer texts).
+    workers > 1 scores the files in that many processes (0 = one per CPU).
+    """
+    if index is not None:
+        return index.scored_files(results_dir, answers, workers)
+    fnames = sorted(f for f in os.listdir(results_dir) if is_transcript(f))
+    scored = map_chunks(_score_paths, [os.path.join(results_dir, f) for f in fnames], workers)
+    return [(fname, result, error) for fname, (result, error) in zip(fnames, scored)]
+
+
+def _summary_frame(scored: List[Tuple[str, Optional[Dict], Optional[str]]]) -> pd.DataFrame:
+    rows = []
+    for fname, result, error in scored:
+        if result is not None:
+            row = {"character": result["character"]}
+            for item in result["items"]:
                 row[f"item{item['question_id']}"] = item["score"]
-            row["total"] = scored["total_score"]
-            row["missing"] = scored["missing"]
+            row["total"] = result["total_score"]
+            row["missing"] = result["missing"]
             rows.append(row)
-
-        except Exception as e:
+        else:
             # If a file is malformed, still include a row with NaNs so you can spot it
             empty_items = {f"item{i}": None for i in range(1, 10)}  # <-- fixed
             rows.append({
@@ -258,15 +405,74 @@ def summarize_results_folder(results_dir: str) -> pd.DataFrame:
                 **empty_items,
                 "total": None,
                 "missing": None,
-                "error": f"{type(e).__name__}: {e}"
+                "error": error
             })
 
     df = pd.DataFrame(rows)
     if "character" in df.columns:
-        df = df.sort_values("character").reset_index(drop=True)
+        df = df.sort_values("character", kind="stable").reset_index(drop=True)
     return df
 
 
+def _detail_frame(scored: List[Tuple[str, Optional[Dict], Optional[str]]]) -> pd.DataFrame:
+    records = []
+    for _, result, _ in scored:
+        if result is None:
+            continue
+        for item in result["items"]:
+            records.append({
+                "character": result["character"],
+                "question_id": item["question_id"],
+                "question": item["question"],
+                "score": item["score"],
+                "answer": item["answer"],
+            })
+    return pd.DataFrame.from_records(records)
+
+
+def summarize_results_folder(results_dir: str, index=None, workers: Optional[int] = 1) -> pd.DataFrame:
+    """
+    Walk a Results/ folder, score each <Character>.json, and return a tidy DataFrame.
+    Columns: character, item1..item9, total, missing
+    Pass a ScoreIndex to skip files scored before, workers to score in parallel (see scored_files).
+    """
+    return _summary_frame(scored_files(results_dir, index, answers=False, workers=workers))
+
+
+def analyze_results_folder(results_dir: str, index=None,
+                           workers: Optional[int] = 1) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    (summarize_results_folder, character_item_detail) of a folder from a
+    single parse and score per file.
+    """
+    scored = scored_files(results_dir, index, workers=workers)
+    return _summary_frame(scored), _detail_frame(scored)
+
+
+def store_scored(store: str, phase: str = "questionnaire") -> List[Tuple[str, Optional[Dict], Optional[str]]]:
+    """
+    scored_files for the PHQ-9 answers in a result store (result_store.py):
+    one (persona, score_character_file result, None) per persona, by name.
+    """
+    answers = read_results(store, phase=phase, scale="PHQ9", columns=["persona", "question_id", "text"])
+    by_persona: Dict[str, Dict[int, str]] = {}
+    for persona, question_id, text in zip(answers["persona"].tolist(), answers["question_id"].tolist(),
+                                          answers["text"].tolist()):
+        by_persona.setdefault(persona, {})[question_id] = text
+    out = []
+    for persona, texts in by_persona.items():
+        items = [{"Consultant": question, persona: texts.get(idx, "")}
+                 for idx, question in enumerate(PHQ9_ITEMS, start=1)]
+        out.append((persona, score_character_data(persona, items), None))
+    return out
+
+
+def analyze_store(store: str, phase: str = "questionnaire") -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """analyze_results_folder for the PHQ-9 answers in a result store instead of a folder."""
+    scored = store_scored(store, phase)
+    return _summary_frame(scored), _detail_frame(scored)
+
+
 def export_summary(df: pd.DataFrame, csv_path: Optional[str] = None, xlsx_path: Optional[str] = None) -> None:
     """
     Export the summary DataFrame to CSV and/or Excel.
@@ -281,27 +487,157 @@ def export_summary(df: pd.DataFrame, csv_path: Optional[str] = None, xlsx_path:
         df.to_excel(xlsx_path, index=False)
 
 
-def character_item_detail(results_dir: str) -> pd.DataFrame:
+def choice_item_scores(results_dir: str, scale: str) -> pd.DataFrame:
     """
-    Optional: produce a long-form table with one row per (character, question).
-    Columns: character, question_id, question, score, answer
-    Useful for qualitative review alongside scores.
+    Long-form choice scores for any scale's Q&A folder.
+    Columns: character, question_id, score (items numbered in file order).
     """
     records = []
-    for fname in os.listdir(results_dir):
-        if not fname.lower().endswith(".json"):
+    for fname in sorted(os.listdir(results_dir)):
+        if not is_transcript(fname):
             continue
-        path = os.path.join(results_dir, fname)
         try:
-            scored = score_character_file(path)
+            character_name, items = _load_character_conversation(os.path.join(results_dir, fname))
         except Exception:
             continue
-        for item in scored["items"]:
+        for idx, row in enumerate(items, start=1):
             records.append({
-                "character": scored["character"],
-                "question_id": item["question_id"],
-                "question": item["question"],
-                "score": item["score"],
-                "answer": item["answer"],
+                "character": character_name,
+                "question_id": idx,
+                "score": extract_choice(row.get(character_name, ""), scale),
             })
-    return pd.DataFrame.from_records(records)
+    return pd.DataFrame.from_records(records, columns=["character", "question_id", "score"])
+
+
+def character_item_detail(results_dir: str, index=None, workers: Optional[int] = 1) -> pd.DataFrame:
+    """
+    Optional: produce a long-form table with one row per (character, question).
+    Columns: character, question_id, question, score, answer
+    Useful for qualitative review alongside scores.
+    """
+    return _detail_frame(scored_files(results_dir, index, workers=workers))
+
+
+# ---------------------------
+# batch scoring (all scales, whole columns)
+# ---------------------------
+def _cue_scales() -> List[str]:
+    """Scales whose options are the PHQ-9 frequency anchors scored 0–3, so the 0–3 cues apply."""
+    anchors = list(ANCHOR_TO_SCORE)
+    return [name for name, inst in SCALE_INSTRUMENTS.items()
+            if [o.lower() for o in inst.options] == anchors and inst.score_range[0] == 0]
+
+
+def _choice_text(answer: str) -> str:
+    """The lowercased 'Choice:' line of an answer, or the whole answer without one."""
+    if answer.isascii():
+        # same match as _CHOICE_LINE, but a case-sensitive pattern can use the fast literal search
+        lowered = answer.lower()
+        m = _CHOICE_LINE_LOWER.search(lowered)
+        return (m.group(1) if m else lowered).strip()
+    m = _CHOICE_LINE.search(answer)
+    return (m.group(1) if m else answer).strip().lower()
+
+
+def answer_table(results_dirs: Optional[Dict[str, str]] = None, store: Optional[str] = None,
+                 phase: str = "questionnaire") -> pd.DataFrame:
+    """
+    Long-form answers of Q&A folders: one row per (persona, scale, question_id, answer),
+    items numbered in file order. `results_dirs` maps scale -> folder; by default every
+    instrument's Conversations/<SCALE>/Question based Conversation that exists.
+    Malformed files are skipped.
+    With `store` (a result_store.py Parquet folder) the answers of `phase`
+    ("questionnaire" or "structured") are read from there instead.
+    """
+    if store is not None:
+        df = read_results(store, phase=phase, columns=["persona", "scale", "question_id", "text"])
+        if results_dirs is not None:
+            df = df[df["scale"].isin(list(results_dirs))]
+        return df.rename(columns={"text": "answer"}).reset_index(drop=True)[ANSWER_COLUMNS]
+    if results_dirs is None:
+        results_dirs = {scale: QA_FOLDER.format(scale=scale) for scale in SCALE_CHOICES}
+    records = []
+    for scale, results_dir in results_dirs.items():
+        if not os.path.isdir(results_dir):
+            continue
+        for fname in sorted(os.listdir(results_dir)):
+            if not is_transcript(fname):
+                continue
+            try:
+                character_name, items = _load_character_conversation(os.path.join(results_dir, fname))
+            except Exception:
+                continue
+            for idx, row in enumerate(items, start=1):
+                records.append((character_name, scale, idx, row.get(character_name, "")))
+    return pd.DataFrame.from_records(records, columns=ANSWER_COLUMNS)
+
+
+def score_answers(answers: pd.DataFrame) -> pd.DataFrame:
+    """
+    Score a long-form table (persona, scale, question_id, answer) a column at a time.
+
+    The 'Choice: <option>' line (or the whole answer without one) is matched
+    against the scale's labels, longest first, exactly as extract_choice does
+    (once per distinct choice string, so mostly once per label).
+    Answers left unscored fall back to the conversational cues of
+    _parse_score_from_text on scales with the 0–3 frequency anchors (PHQ-9
+    incl. its Q9 handling, GAD-7); other scales (ASRM) stay unscored.
+
+    Returns a copy with `score` (nullable int) and `score_source`
+    ('choice', 'cue' or <NA>) columns.
+    """
+    unknown = set(answers["scale"].unique()) - set(SCALE_CHOICES)
+    if unknown:
+        raise ValueError(f"Unknown scale(s) {sorted(unknown)}; known: {list(SCALE_CHOICES)}")
+
+    out = answers.copy()
+    text = out["answer"].fillna("").astype(str)
+    choice = pd.Series([_choice_text(t) for t in text.tolist()], index=out.index, dtype=object)
+
+    # Few distinct choice strings per scale: match the labels once per distinct value
+    score = pd.Series(pd.NA, index=out.index, dtype="Int64")
+    for scale, labels in SCALE_CHOICES.items():
+        rows = out["scale"] == scale
+        if not rows.any():
+            continue
+        codes, uniques = pd.factorize(choice[rows])
+        inst = SCALE_INSTRUMENTS[scale]
+        longest_first = sorted(labels, key=len, reverse=True)
+        matched = [next((inst.score(l) for l in longest_first if l.lower() in u), None) for u in uniques]
+        score[rows] = pd.array(matched, dtype="Int64").take(codes)
+    source = pd.Series(pd.NA, index=out.index, dtype="string")
+    source[score.notna()] = "choice"
+
+    fallback = score.isna() & out["scale"].isin(_cue_scales()) & (text != "")
+    if fallback.any():
+        pending = out.loc[fallback]
+        cue_scores = [
+            _parse_score_from_text(answer, question_id=qid if scale == "PHQ9" else None)
+            for answer, scale, qid in zip(text[fallback].tolist(), pending["scale"].tolist(),
+                                          pending["question_id"].tolist())
+        ]
+        score[fallback] = pd.array(cue_scores, dtype="Int64")
+        source[fallback & score.notna()] = "cue"
+
+    out["score"] = score
+    out["score_source"] = source
+    return out
+
+
+def score_table(answers: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per persona with every scale side by side: <SCALE>_Q<i> item scores,
+    <SCALE>_total (sum of scored items) and <SCALE>_missing (unscored items),
+    scales in registry order. Accepts raw answers or the output of score_answers.
+    """
+    scored = answers if "score" in answers.columns else score_answers(answers)
+    personas = pd.Index(scored["persona"].unique(), name="persona")
+    columns = {}
+    for scale in [s for s in SCALE_CHOICES if (scored["scale"] == s).any()]:
+        rows = scored[scored["scale"] == scale].drop_duplicates(["persona", "question_id"])
+        items = rows.pivot(index="persona", columns="question_id", values="score").reindex(personas)
+        for qid in sorted(items.columns):
+            columns[f"{scale}_Q{qid}"] = items[qid].astype("Int64")
+        columns[f"{scale}_total"] = items.sum(axis=1, skipna=True).astype("Int64")
+        columns[f"{scale}_missing"] = items.isna().sum(axis=1).astype("Int64")
+    return pd.DataFrame(columns, index=personas).reset_index()
@@ -0,0 +1,271 @@
+"""
+Process-wide rate limiter shared by every runner's call_chat.
+
+Two token buckets pace outgoing chat completions: one for requests per
+minute (RPM) and one for tokens per minute (TPM). Each request is charged
+an estimate of its prompt + completion tokens before it is sent, and the
+estimate is settled against `resp.usage` afterwards. The `x-ratelimit-*`
+response headers resize the buckets to the real account limits, and a
+429 (with or without `Retry-After`) pauses every caller, not just the one
+that was rejected.
+
+Usage:
+------
+from rate_limiter import limited_create, alimited_create, is_rate_limit_error
+
+resp = limited_create(client, model=MODEL_NAME, messages=messages, temperature=0.7)
+resp = await alimited_create(async_client, model=MODEL_NAME, messages=messages)
+
+Limits default to OPENAI_RPM / OPENAI_TPM from the environment and can be
+changed at startup with configure_limiter(rpm=..., tpm=...).
+"""
+
+from __future__ import annotations
+import asyncio
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_RPM = 500
+DEFAULT_TPM = 200_000
+
+HEADROOM = 0.9        # aim a little under the account limit
+BURST_SECONDS = 5.0   # bucket capacity, in seconds' worth of budget
+MAX_PENALTY = 60.0    # longest self-imposed pause after a 429 without Retry-After
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+
+
+def estimate_prompt_tokens(messages: List[Dict]) -> int:
+    """~4 characters per token, plus a few tokens of overhead per message."""
+    chars = sum(len(str(m.get("content") or "")) for m in messages)
+    return chars // 4 + 4 * len(messages) + 3
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: Optional[int] = None) -> int:
+    """
+    Cheap local estimate of what a request will cost against TPM:
+    the prompt estimate plus the completion budget (or a typical short reply).
+    """
+    return estimate_prompt_tokens(messages) + (max_tokens if max_tokens else 200)
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """'1s', '6m0s', '20ms', '0.5' -> seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(n) * scale[u] for n, u in parts)
+
+
+class TokenBucket:
+    """Continuous-refill bucket; `limit` is the budget per minute."""
+
+    def __init__(self, limit: float):
+        self.level = 0.0
+        self.updated = time.monotonic()
+        self.set_limit(limit)
+        self.level = self.capacity
+
+    def set_limit(self, limit: float):
+        self.limit = float(limit)
+        self.rate = self.limit * HEADROOM / 60.0
+        self.capacity = max(1.0, self.rate * BURST_SECONDS)
+        self.level = min(self.level, self.capacity)
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+class RateLimiter:
+    """Thread-safe RPM + TPM limiter usable from threads and asyncio tasks."""
+
+    def __init__(self, rpm: float = DEFAULT_RPM, tpm: float = DEFAULT_TPM):
+        self._lock = threading.Lock()
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0
+        self.consecutive_429 = 0
+        self.waited = 0.0
+        self.rate_limited = 0
+
+    # ---------------------------
+    # pacing
+    # ---------------------------
+    def _try_take(self, tokens: int) -> float:
+        """Take budget for one request, or return how long to wait first."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            wait = max(self.requests.wait_for(1), self.tokens.wait_for(tokens))
+            if wait > 0:
+                return wait
+            self.requests.level -= 1
+            self.tokens.level -= min(tokens, self.tokens.capacity)
+            return 0.0
+
+    def acquire(self, tokens: int):
+        while True:
+            wait = self._try_take(tokens)
+            if wait <= 0:
+                return
+            self.waited += wait
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int):
+        while True:
+            wait = self._try_take(tokens)
+            if wait <= 0:
+                return
+            self.waited += wait
+            await asyncio.sleep(wait)
+
+    def settle(self, estimated: int, usage) -> None:
+        """Correct the token bucket once the real usage is known."""
+        actual = getattr(usage, "total_tokens", None) if usage is not None else None
+        if actual is None:
+            return
+        with self._lock:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated - actual)
+
+    # ---------------------------
+    # server feedback
+    # ---------------------------
+    def update_from_headers(self, headers, status: Optional[int] = None) -> None:
+        """Apply x-ratelimit-* and Retry-After headers from any response."""
+        if headers is None:
+            headers = {}
+        get = headers.get
+        with self._lock:
+            now = time.monotonic()
+
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                limit = get(f"x-ratelimit-limit-{kind}")
+                if limit:
+                    try:
+                        if float(limit) != bucket.limit:
+                            bucket.set_limit(float(limit))
+                    except ValueError:
+                        pass
+                remaining = get(f"x-ratelimit-remaining-{kind}")
+                if remaining is not None:
+                    try:
+                        bucket.refill(now)
+                        bucket.level = min(bucket.level, float(remaining) * HEADROOM)
+                    except ValueError:
+                        pass
+                    if remaining in ("0", 0):
+                        reset = parse_duration(get(f"x-ratelimit-reset-{kind}"))
+                        if reset:
+                            self.blocked_until = max(self.blocked_until, now + reset)
+
+            retry_after = None
+            if get("retry-after-ms"):
+                retry_after = (parse_duration(get("retry-after-ms")) or 0) / 1000.0
+            elif get("retry-after"):
+                retry_after = parse_duration(get("retry-after"))
+
+            if status == 429:
+                self.rate_limited += 1
+                self.consecutive_429 += 1
+                if retry_after is None:
+                    retry_after = min(MAX_PENALTY, 2.0 ** self.consecutive_429)
+            elif status is None:
+                self.consecutive_429 = 0
+
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def stats(self) -> Dict:
+        return {
+            "rpm_limit": self.requests.limit,
+            "tpm_limit": self.tokens.limit,
+            "rate_limited": self.rate_limited,
+            "wait_seconds_total": round(self.waited, 2),  # summed over callers
+        }
+
+
+# ---------------------------
+# process-wide instance
+# ---------------------------
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def configure_limiter(rpm: Optional[float] = None, tpm: Optional[float] = None) -> RateLimiter:
+    """(Re)create the shared limiter; None falls back to env / defaults."""
+    global _limiter
+    with _limiter_lock:
+        _limiter = RateLimiter(
+            rpm=rpm or float(os.getenv("OPENAI_RPM", DEFAULT_RPM)),
+            tpm=tpm or float(os.getenv("OPENAI_TPM", DEFAULT_TPM)),
+        )
+        return _limiter
+
+
+def get_limiter() -> RateLimiter:
+    if _limiter is None:
+        return configure_limiter()
+    return _limiter
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    return getattr(e, "status_code", None) == 429
+
+
+def _error_headers(e: Exception):
+    response = getattr(e, "response", None)
+    return getattr(response, "headers", None)
+
+
+def limited_create(client, **kwargs):
+    """client.chat.completions.create(**kwargs), paced by the shared limiter."""
+    limiter = get_limiter()
+    estimated = estimate_tokens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+    limiter.acquire(estimated)
+    try:
+        raw = client.chat.completions.with_raw_response.create(**kwargs)
+    except Exception as e:
+        limiter.update_from_headers(_error_headers(e), status=getattr(e, "status_code", None) or -1)
+        raise
+    limiter.update_from_headers(raw.headers)
+    resp = raw.parse()
+    limiter.settle(estimated, getattr(resp, "usage", None))
+    return resp
+
+
+async def alimited_create(client, **kwargs):
+    """Async twin of limited_create for AsyncOpenAI clients."""
+    limiter = get_limiter()
+    estimated = estimate_tokens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+    await limiter.acquire_async(estimated)
+    try:
+        raw = await client.chat.completions.with_raw_response.create(**kwargs)
+    except Exception as e:
+        limiter.update_from_headers(_error_headers(e), status=getattr(e, "status_code", None) or -1)
+        raise
+    limiter.update_from_headers(raw.headers)
+    resp = raw.parse()
+    limiter.settle(estimated, getattr(resp, "usage", None))
+    return resp
@@ -0,0 +1,183 @@
+"""
+Content-addressed on-disk cache for chat completions.
+
+A response is stored under the SHA-256 of everything that determines it:
+model, messages and sampling parameters (temperature, seed, max_tokens,
+...). Re-running a runner with the same inputs then costs a SQLite lookup
+instead of an API call, and `replay=True` turns every miss into an error
+so outputs can be regenerated fully offline.
+
+Usage:
+------
+from response_cache import configure_cache, cache_lookup, cache_store
+
+configure_cache("Cache/responses.sqlite", replay=False, max_age_days=30)
+
+key, hit = cache_lookup(MODEL_NAME, messages, temperature=0.7)
+if hit is not None:
+    return hit
+text = ...call the API...
+return cache_store(key, text, MODEL_NAME)
+
+With no cache configured, cache_lookup returns (None, None) and
+cache_store is a pass-through, so call sites need no special casing.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_CACHE_PATH = os.path.join("Cache", "responses.sqlite")
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a request has no cached response."""
+
+
+def cache_key(model: str, messages: List[Dict], **params) -> str:
+    """Stable hash of a request; params with value None are ignored."""
+    payload = {
+        "model": model,
+        "messages": messages,
+        "params": {k: v for k, v in sorted(params.items()) if v is not None},
+    }
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed cache; safe to share between threads and processes."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, replay: bool = False,
+                 max_entries: Optional[int] = None, max_age_days: Optional[float] = None):
+        self.path = path
+        self.replay = replay
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT,"
+            " content TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._db.commit()
+        self.evict()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+        if row is None and self.replay:
+            raise CacheMiss(f"No cached response for request {key[:12]}… (replay mode)")
+        return row[0] if row else None
+
+    def put(self, key: str, model: Optional[str], content: str):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, model, content, now, now),
+            )
+            self._db.commit()
+
+    def evict(self) -> int:
+        """Drop entries older than max_age_days, then least-recently-used beyond max_entries."""
+        removed = 0
+        with self._lock:
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                removed += self._db.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,)).rowcount
+            if self.max_entries is not None:
+                removed += self._db.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+            self._db.commit()
+        return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+            "entries": len(self),
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# ---------------------------
+# process-wide instance
+# ---------------------------
+_cache: Optional[ResponseCache] = None
+
+
+def configure_cache(path: Optional[str] = DEFAULT_CACHE_PATH, replay: bool = False,
+                    max_entries: Optional[int] = None,
+                    max_age_days: Optional[float] = None) -> Optional[ResponseCache]:
+    """Enable the shared cache (path=None disables it)."""
+    global _cache
+    _cache = ResponseCache(path, replay, max_entries, max_age_days) if path else None
+    return _cache
+
+
+def get_cache() -> Optional[ResponseCache]:
+    return _cache
+
+
+def cache_lookup(model: str, messages: List[Dict], **params) -> Tuple[Optional[str], Optional[str]]:
+    """(key, cached text) — (None, None) when caching is off."""
+    if _cache is None:
+        return None, None
+    key = cache_key(model, messages, **params)
+    return key, _cache.get(key)
+
+
+def cache_store(key: Optional[str], content: str, model: Optional[str] = None) -> str:
+    """Remember a successful response; returns `content` unchanged."""
+    if _cache is not None and key is not None:
+        _cache.put(key, model, content)
+    return content
+
+
+def add_cache_args(parser):
+    """--cache / --replay / eviction flags shared by the runners."""
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_PATH, default=None,
+                        help=f"reuse identical responses from a SQLite cache (default path: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--replay", action="store_true",
+                        help="serve everything from the cache; a miss is an error (implies --cache)")
+    parser.add_argument("--cache-max-entries", type=int, default=None)
+    parser.add_argument("--cache-max-age-days", type=float, default=None)
+
+
+def configure_cache_from_args(args) -> Optional[ResponseCache]:
+    path = args.cache or (DEFAULT_CACHE_PATH if args.replay else None)
+    return configure_cache(path, args.replay, args.cache_max_entries, args.cache_max_age_days)
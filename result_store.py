@@ -0,0 +1,319 @@
+"""
+Columnar result store: every questionnaire answer and casual-chat turn the
+runners save, as one row of a Parquet dataset, so analysis can scan columns
+instead of opening one JSON file per persona and instrument.
+
+Rows (STORE_COLUMNS):
+- run_id, ts            the metrics run id (call_metrics) and write time;
+- persona, phase        phase is "questionnaire", "structured" (--structured
+                        answers), "casual" or "therapist" (run_combined_sessions.py);
+- scale, question_id    questionnaire rows (scale also on the per-instrument
+                        chats of scale_sessions.py);
+- turn                  conversation rows, 1-based;
+- speaker, text         "persona", "friend" or "therapist" and what they said
+                        (a dead-lettered answer is "", as in the JSON files);
+- tokens, latency_s     completion tokens and latency of the call that wrote
+                        the text, from the per-call metrics; null where no
+                        single call did (structured answers share one call,
+                        turns resumed from an earlier process), 0 tokens for
+                        responses served from the response cache.
+
+The JSON files are still written; the store is an extra sink. Rows are
+buffered and written as a new part file (part-<run_id>-<pid>-<n>.parquet)
+every FLUSH_ROWS rows and on close, so queue workers and shards can share
+one store. Nothing is updated in place: a retried item or a re-run chat
+adds rows, and read_results keeps the latest answer per item and the latest
+transcript per persona.
+
+Needs pyarrow (pip install pyarrow); without it --store stops the runner at
+start-up and everything else works as before.
+
+Usage:
+------
+python all_in_one.py --store                 # Conversations/results.parquet
+python result_store.py Conversations         # backfill from existing JSON files
+
+from result_store import read_results
+df = read_results("Conversations/results.parquet", phase="questionnaire",
+                  columns=["persona", "scale", "question_id", "text"])
+"""
+
+from __future__ import annotations
+import argparse
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from call_metrics import get_metrics
+from transcript_jsonl import is_transcript, load_transcript
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only the store needs it
+    pa = pq = None
+
+DEFAULT_STORE_PATH = os.path.join("Conversations", "results.parquet")
+FLUSH_ROWS = 5000
+
+STORE_COLUMNS = ["run_id", "ts", "persona", "phase", "scale", "question_id", "turn",
+                 "speaker", "text", "tokens", "latency_s"]
+# One answer or turn; later rows with the same key replace earlier ones
+ROW_KEY = ["persona", "phase", "scale", "question_id", "turn"]
+
+
+def store_schema():
+    return pa.schema([
+        ("run_id", pa.string()),
+        ("ts", pa.string()),
+        ("persona", pa.string()),
+        ("phase", pa.string()),
+        ("scale", pa.string()),
+        ("question_id", pa.int64()),
+        ("turn", pa.int64()),
+        ("speaker", pa.string()),
+        ("text", pa.string()),
+        ("tokens", pa.int64()),
+        ("latency_s", pa.float64()),
+    ])
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("the result store writes Parquet and needs pyarrow: pip install pyarrow")
+
+
+class ResultStore:
+    """Buffered Parquet writer; safe to share between threads."""
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH, run_id: Optional[str] = None,
+                 flush_rows: int = FLUSH_ROWS):
+        _require_pyarrow()
+        self.path = path
+        self.run_id = run_id or get_metrics().run_id
+        self.flush_rows = flush_rows
+        self.rows_written = 0
+        self.parts = 0
+        self._rows: List[Dict] = []
+        self._calls: Dict[Tuple, Tuple[int, Optional[float]]] = {}
+        self._seen = 0
+        self._log = None
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _call_stats(self, key: Tuple) -> Tuple[Optional[int], Optional[float]]:
+        """(completion tokens, latency) of the last successful call for `key` this run."""
+        log = get_metrics()
+        if log is not self._log:
+            self._log, self._seen = log, 0
+        records = log.records
+        for rec in records[self._seen:]:
+            if rec["ok"]:
+                self._calls[tuple(rec.get(k) for k in ROW_KEY)] = (rec["completion_tokens"], rec["latency_s"])
+        self._seen = len(records)
+        return self._calls.pop(key, (None, None))
+
+    def add_answers(self, persona: str, scale: str, questions: List[Dict], answers: List[str],
+                    phase: str = "questionnaire") -> None:
+        """One row per answer of a saved Q&A file (or of the items patched into it)."""
+        ts = datetime.utcnow().isoformat() + "Z"
+        with self._lock:
+            for q, answer in zip(questions, answers):
+                # a structured call answers the whole scale, so no item has its own tokens / latency
+                tokens, latency = self._call_stats((persona, phase, scale, q["question_id"], None)) \
+                    if phase != "structured" else (None, None)
+                self._rows.append({"run_id": self.run_id, "ts": ts, "persona": persona, "phase": phase,
+                                   "scale": scale, "question_id": q["question_id"], "turn": None,
+                                   "speaker": "persona", "text": answer, "tokens": tokens, "latency_s": latency})
+            self._flush_if_full()
+
+    def add_turns(self, persona: str, turns: List[Dict], phase: str = "casual",
+                  scale: Optional[str] = None) -> None:
+        """One row per turn of a finished transcript ({"speaker", "text"} as saved)."""
+        ts = datetime.utcnow().isoformat() + "Z"
+        with self._lock:
+            for i, t in enumerate(turns, start=1):
+                tokens, latency = self._call_stats((persona, phase, scale, None, i))
+                speaker = "persona" if t["speaker"] == persona else t["speaker"].lower()
+                self._rows.append({"run_id": self.run_id, "ts": ts, "persona": persona, "phase": phase,
+                                   "scale": scale, "question_id": None, "turn": i, "speaker": speaker,
+                                   "text": t["text"], "tokens": tokens, "latency_s": latency})
+            self._flush_if_full()
+
+    def _flush_if_full(self):
+        if len(self._rows) >= self.flush_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._rows:
+            return
+        table = pa.Table.from_pylist(self._rows, schema=store_schema())
+        name = f"part-{self.run_id}-{os.getpid()}-{self.parts:05d}.parquet"
+        tmp = os.path.join(self.path, f".{name}.tmp")
+        pq.write_table(table, tmp)
+        os.replace(tmp, os.path.join(self.path, name))   # readers never see a half-written part
+        self.parts += 1
+        self.rows_written += len(self._rows)
+        self._rows = []
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"rows": self.rows_written + len(self._rows), "parts": self.parts, "path": self.path}
+
+    def close(self):
+        self.flush()
+
+
+# ---------------------------
+# reading
+# ---------------------------
+def _latest(df: pd.DataFrame) -> pd.DataFrame:
+    """Latest row per answer / turn, and only the latest of each persona's transcripts."""
+    df = df.sort_values("ts", kind="stable")
+    df = df.drop_duplicates(ROW_KEY, keep="last")
+    chat = df["turn"].notna()
+    newest = df.loc[chat].groupby(["persona", "phase", "scale"], dropna=False)["ts"].transform("max")
+    stale = chat & (df["ts"] < newest.reindex(df.index))
+    return df.loc[~stale]
+
+
+def read_results(path: str = DEFAULT_STORE_PATH, phase: Optional[str] = None, scale: Optional[str] = None,
+                 columns: Optional[List[str]] = None, latest: bool = True) -> pd.DataFrame:
+    """
+    Rows of the store as a DataFrame, optionally one phase / scale and a subset of
+    columns (only those are read). latest=False keeps superseded rows too.
+    Sorted by persona, then scale / question_id or turn.
+    """
+    filters = [(col, "==", value) for col, value in (("phase", phase), ("scale", scale)) if value is not None]
+    wanted = list(columns or STORE_COLUMNS)
+    read = wanted + [c for c in ROW_KEY + ["ts"] if c not in wanted] if latest else wanted
+    if not os.path.isdir(path) or not any(f.endswith(".parquet") for f in os.listdir(path)):
+        return pd.DataFrame(columns=wanted)
+    df = pd.read_parquet(path, columns=read, filters=filters or None)
+    for col in ("question_id", "turn", "tokens"):
+        if col in df.columns:
+            df[col] = df[col].astype("Int64")
+    if latest:
+        df = _latest(df)
+    order = [c for c in ("persona", "phase", "scale", "question_id", "turn") if c in df.columns]
+    return df.sort_values(order, kind="stable")[wanted].reset_index(drop=True)
+
+
+# ---------------------------
+# backfill from JSON files
+# ---------------------------
+def import_conversations(conv_dir: str, store: ResultStore) -> Dict[str, int]:
+    """
+    Add the Q&A and conversation JSON files under `conv_dir` (a runner's
+    Conversations/) to `store`; files that don't parse are skipped. Returns
+    files per phase.
+    """
+    counts = {"questionnaire": 0, "structured": 0, "casual": 0, "skipped": 0}
+    folders = []
+    for scale in sorted(os.listdir(conv_dir)) if os.path.isdir(conv_dir) else []:
+        folders.append((os.path.join(conv_dir, scale, "Question based Conversation"), scale, "questionnaire"))
+        folders.append((os.path.join(conv_dir, scale, "Structured Conversation"), scale, "structured"))
+        folders.append((os.path.join(conv_dir, scale, "Normal Conversation"), scale, "casual"))
+    folders.append((os.path.join(conv_dir, "Casual"), None, "casual"))
+
+    for folder, scale, phase in folders:
+        if not os.path.isdir(folder):
+            continue
+        for fname in sorted(os.listdir(folder)):
+            if not is_transcript(fname):
+                continue
+            try:
+                data = load_transcript(os.path.join(folder, fname))
+                if phase == "casual":
+                    store.add_turns(data["character"], data["turns"], scale=scale)
+                else:
+                    items = data["Common Questions"]
+                    # older Q&A files have no "character": it's the key beside "Consultant"
+                    name = data.get("character") or next(k for k in items[0] if k != "Consultant")
+                    store.add_answers(name, data.get("scale", scale),
+                                      [{"question_id": i} for i in range(1, len(items) + 1)],
+                                      [row.get(name, "") for row in items], phase)
+            except (OSError, ValueError, KeyError, TypeError, AttributeError, IndexError, StopIteration):
+                counts["skipped"] += 1
+                continue
+            counts[phase] += 1
+    return counts
+
+
+# ---------------------------
+# process-wide instance
+# ---------------------------
+_store: Optional[ResultStore] = None
+
+
+def configure_store(path: Optional[str] = DEFAULT_STORE_PATH) -> Optional[ResultStore]:
+    """Enable the shared store (path=None disables it)."""
+    global _store
+    _store = ResultStore(path) if path else None
+    return _store
+
+
+def get_store() -> Optional[ResultStore]:
+    return _store
+
+
+def store_answers(persona: str, scale: str, questions: List[Dict], answers: List[str],
+                  phase: str = "questionnaire") -> None:
+    """ResultStore.add_answers on the shared store; a no-op when the store is off."""
+    if _store is not None:
+        _store.add_answers(persona, scale, questions, answers, phase)
+
+
+def store_turns(persona: str, turns: List[Dict], phase: str = "casual", scale: Optional[str] = None) -> None:
+    if _store is not None:
+        _store.add_turns(persona, turns, phase, scale)
+
+
+def close_store() -> Optional[Dict]:
+    """Write buffered rows; the store's stats, or None when it is off."""
+    if _store is None:
+        return None
+    _store.close()
+    return _store.stats()
+
+
+def add_store_args(parser):
+    """--store flag shared by the runners."""
+    parser.add_argument("--store", nargs="?", const=DEFAULT_STORE_PATH, default=None,
+                        help=f"also write every answer and turn to a Parquet dataset (default path: "
+                             f"{DEFAULT_STORE_PATH}; needs pyarrow)")
+
+
+def configure_store_from_args(args) -> Optional[ResultStore]:
+    try:
+        return configure_store(args.store)
+    except ImportError as e:
+        raise SystemExit(f"--store: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Add existing Conversations/ JSON files to a result store")
+    parser.add_argument("conversations", nargs="?", default="Conversations",
+                        help="a runner's Conversations folder (default: Conversations)")
+    parser.add_argument("--store", default=None,
+                        help="store folder (default: results.parquet inside the Conversations folder)")
+    args = parser.parse_args(argv)
+
+    path = args.store or os.path.join(args.conversations, os.path.basename(DEFAULT_STORE_PATH))
+    try:
+        store = ResultStore(path, run_id="import-" + datetime.utcnow().strftime("%Y%m%dT%H%M%SZ"))
+    except ImportError as e:
+        raise SystemExit(str(e))
+    counts = import_conversations(args.conversations, store)
+    store.close()
+    print(f"Imported {counts} -> {path} ({store.stats()['rows']} rows)")
+
+if __name__ == "__main__":
+    main()
@@ -152,22 +152,11 @@ echo   Running ALL sessions...
 echo ==============================
 echo.
 
-if exist "run_phq9_sessions.py" (
-  python run_phq9_sessions.py
-) else (
-  echo [WARN] run_phq9_sessions.py not found. Skipping PHQ-9.
-)
-
-if exist "run_asrm_sessions.py" (
-  python run_asrm_sessions.py
-) else (
-  echo [WARN] run_asrm_sessions.py not found. Skipping ASRM.
-)
-
-if exist "run_gad7_sessions.py" (
-  python run_gad7_sessions.py
+REM One pass over the personas for every instrument in CommonQuestions\
+if exist "scale_sessions.py" (
+  python scale_sessions.py
 ) else (
-  echo [WARN] run_gad7_sessions.py not found. Skipping GAD-7.
+  echo [ERROR] scale_sessions.py not found in %cd%
 )
 
 goto menu
@@ -1,11 +1,22 @@
+import argparse
 import json
 import os
 import time
 import random
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
 from openai import OpenAI
 
+from call_metrics import add_metrics_args, configure_metrics_from_args, record_call, report_metrics
+from conversation_context import ConversationContext
+from dead_letter import CallFailed, DeadLetterQueue
+from generation_budget import add_budget_args, budget_params, configure_budgets_from_args, report_budgets
+from rate_limiter import is_rate_limit_error, limited_create
+from response_cache import add_cache_args, cache_lookup, cache_store, configure_cache_from_args
+from result_store import add_store_args, close_store, configure_store_from_args, store_answers, store_turns
+from sharding import add_shard_args, configure_shard_from_args
+from transcript_jsonl import TranscriptWriter, add_transcript_args, load_transcript, save_transcript
+
 # ========================
 # Config
 # ========================
@@ -14,14 +25,25 @@ CHARACTERS_PATH = "Characters/characters.json"
 QUESTIONS_PATH = "CommonQuestions/questions.json"
 PHQ9_DIR = "PHQ9 Conversation"
 THERAPY_DIR = "Normal Conversation"
+DEAD_LETTER_PATH = os.path.join("Conversations", "dead_letter_combined.jsonl")
 ROUNDS_PER_CHARACTER = 20  # therapist↔persona; 20 rounds = 40 utterances total
+CONTEXT_TOKENS = 800  # token budget of the recent-turns window in conversation prompts
+TRANSCRIPT_FORMAT = "json"  # "jsonl": answers and turns appended as they happen (--transcript-format)
 
 # Create output dirs
 os.makedirs(PHQ9_DIR, exist_ok=True)
 os.makedirs(THERAPY_DIR, exist_ok=True)
 
-# Initialize client (expects OPENAI_API_KEY in env; safer for Git)
-client = OpenAI()
+# Initialize client (expects OPENAI_API_KEY in env; safer for Git).
+# No SDK retries: call_chat retries through the shared rate limiter instead.
+client = OpenAI(max_retries=0)
+
+# PHQ-9 items and therapist sessions whose call failed after all retries; the
+# answer is left empty (never "[ERROR] ...") and --retry-failed re-runs them
+dead_letters = DeadLetterQueue(DEAD_LETTER_PATH)
+
+# Labels for the per-call metrics records; main() sets persona and phase as it goes.
+call_context = {"persona": None, "phase": None, "scale": "PHQ9", "question_id": None, "turn": None}
 
 # Therapist PHQ-9 paraphrases to guide the casual session
 PHQ9_PARAPHRASES = [
@@ -44,61 +66,118 @@ def safe_name(s: str) -> str:
 def backoff_sleep(attempt: int):
     time.sleep(1.25 + random.random() * (1.25 + attempt))
 
-def call_chat(messages: List[Dict], temperature: float = 0.7) -> str:
-    """Wrapper with simple retry/backoff."""
+def transcript_path(folder: str, name: str) -> str:
+    return os.path.join(folder, f"{safe_name(name)}.{TRANSCRIPT_FORMAT}")
+
+def new_writer(path: str, data: Dict, character: str) -> Optional[TranscriptWriter]:
+    """Append-only writer for --transcript-format jsonl (None: the JSON file is written at the end)."""
+    return TranscriptWriter(path, data, character) if TRANSCRIPT_FORMAT == "jsonl" else None
+
+def finish_transcript(path: str, data: Dict, writer: Optional[TranscriptWriter]):
+    if writer is not None:
+        writer.finish(data)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+def call_chat(messages: List[Dict], temperature: float = 0.7, role: Optional[str] = None) -> str:
+    """
+    Wrapper with simple retry/backoff. `role` picks the max_tokens / stop budget.
+    Raises CallFailed when the retries run out.
+    """
+    params = {"temperature": temperature, **budget_params(role)}
+    meta = {**call_context, "role": role}
+    key, hit = cache_lookup(MODEL_NAME, messages, **params)
+    if hit is not None:
+        record_call(meta, MODEL_NAME, source="cache")
+        return hit
+    started = time.perf_counter()
     for attempt in range(3):
         try:
-            resp = client.chat.completions.create(
+            resp = limited_create(
+                client,
                 model=MODEL_NAME,
                 messages=messages,
-                temperature=temperature
+                **params,
             )
-            return resp.choices[0].message.content.strip()
+            record_call(meta, MODEL_NAME, getattr(resp, "usage", None),
+                        latency=time.perf_counter() - started, retries=attempt,
+                        finish_reason=resp.choices[0].finish_reason)
+            return cache_store(key, resp.choices[0].message.content.strip(), MODEL_NAME)
         except Exception as e:
             if attempt == 2:
-                return f"[ERROR] {type(e).__name__}: {e}"
-            backoff_sleep(attempt)
+                record_call(meta, MODEL_NAME, latency=time.perf_counter() - started,
+                            retries=attempt, error_type=type(e).__name__)
+                raise CallFailed(e, attempts=attempt + 1)
+            if not is_rate_limit_error(e):  # 429s: the shared limiter already paused
+                backoff_sleep(attempt)
 
 # -----------------------------
 # 1) PHQ-9 INTERVIEW (per persona)
 # -----------------------------
-def run_phq9_interview(persona: dict, questions: List[Dict]) -> Dict:
+def question_ids(questions: List[Dict]) -> List:
+    return [q.get("question_id", i) for i, q in enumerate(questions, start=1)]
+
+def ask_item(persona: dict, question: str, question_id) -> str:
     """
-    Asks all PHQ-9 questions to the persona using their system prompt.
-    Returns a dict: {"Common Questions": [{ "Consultant": q, "<Name>": answer }, ...]}
+    One PHQ-9 item. A call that fails after all retries is dead-lettered
+    and leaves an empty answer (scored as missing).
     """
-    character_name = persona["name"]
-    system_prompt = persona["system_prompt"]
-
-    results = {"Common Questions": []}
-
-    for q in questions:
-        user_question = q["content"]
-        answer = call_chat(
+    call_context["question_id"] = question_id
+    try:
+        return call_chat(
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": persona["system_prompt"]},
                 {
                     "role": "user",
                     "content": (
-                        f"{user_question}\n\n"
+                        f"{question}\n\n"
                         "Please answer naturally in your own words. "
                         "If it fits, you may include a brief rating line like 'Rating: 0–3' "
                         "(0=Not at all, 1=Several days, 2=More than half the days, 3=Nearly every day)."
                     )
                 }
             ],
-            temperature=0.7
+            temperature=0.7,
+            role="answer"
         )
+    except CallFailed as e:
+        dead_letters.record(e, persona["name"], "questionnaire", scale="PHQ9", question_id=question_id)
+        return ""
+
+def interview_incomplete(qa: Dict, name: str) -> bool:
+    """True if an item has no answer (it was dead-lettered); the therapist session waits for it."""
+    return any(not row.get(name) for row in qa["Common Questions"])
+
+def run_phq9_interview(persona: dict, questions: List[Dict]) -> Dict:
+    """
+    Asks all PHQ-9 questions to the persona using their system prompt.
+    Returns a dict: {"Common Questions": [{ "Consultant": q, "<Name>": answer }, ...]}
+    """
+    character_name = persona["name"]
+
+    results = {"Common Questions": []}
+    phq_path = transcript_path(PHQ9_DIR, character_name)
+    writer = new_writer(phq_path, results, character_name)
+
+    ids = question_ids(questions)
+    for q, question_id in zip(questions, ids):
+        user_question = q["content"]
+        answer = ask_item(persona, user_question, question_id)
 
         results["Common Questions"].append({
             "Consultant": user_question,
             character_name: answer
         })
+        if writer is not None:
+            writer.qa(question_id, user_question, answer)
+
+    call_context["question_id"] = None
 
     # Save to PHQ9 Conversation folder
-    phq_path = os.path.join(PHQ9_DIR, f"{safe_name(character_name)}.json")
-    with open(phq_path, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    finish_transcript(phq_path, results, writer)
+    store_answers(character_name, "PHQ9", [{"question_id": i} for i in ids],
+                  [row[character_name] for row in results["Common Questions"]])
 
     return results  # so we can feed it to therapist session
 
@@ -107,14 +186,9 @@ def run_phq9_interview(persona: dict, questions: List[Dict]) -> Dict:
 # -----------------------------
 def generate_therapist_reply(conv_history, next_topic_hint: str) -> str:
     """
-    conv_history: list of {"role": "Therapist"/"Persona", "content": "..."}
+    conv_history: ConversationContext of {"role": "Therapist"/"Persona", "content": "..."} turns
     next_topic_hint: PHQ-9 topic paraphrase to weave in
     """
-    transcript = []
-    for turn in conv_history[-20:]:
-        transcript.append(f"{turn['role']}: {turn['content']}")
-    transcript_text = "\n".join(transcript).strip()
-
     system_prompt = (
         "You are a warm, empathetic licensed therapist. "
         "Your goal is to gently understand how the client has been feeling and screen for depressive symptoms "
@@ -125,7 +199,7 @@ def generate_therapist_reply(conv_history, next_topic_hint: str) -> str:
     )
 
     user_message = (
-        f"Recent conversation (last turns):\n\n{transcript_text}\n\n"
+        f"Recent conversation (last turns):\n\n{conv_history.render()}\n\n"
         f"Your next prompt topic to weave in naturally: {next_topic_hint}\n\n"
         "Respond as the Therapist. Keep it to 1–2 short sentences and end with a gentle question."
     )
@@ -135,40 +209,47 @@ def generate_therapist_reply(conv_history, next_topic_hint: str) -> str:
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_message}
         ],
-        temperature=0.7
+        temperature=0.7,
+        role="therapist"
     )
 
 def generate_persona_reply(persona_system_prompt: str, conv_history, therapist_msg: str) -> str:
-    transcript = []
-    for turn in conv_history[-20:]:
-        transcript.append(f"{turn['role']}: {turn['content']}")
-    transcript.append(f"Therapist: {therapist_msg}")
-    transcript_text = "\n".join(transcript).strip()
-
-    persona_system = (
-        f"{persona_system_prompt}\n\n"
+    transcript_text = f"{conv_history.render()}\nTherapist: {therapist_msg}"
+
+    # Persona prompt and instructions first, unchanged between calls, so the prefix is cacheable.
+    instructions = (
         "Reply as yourself in a natural, conversational tone (1–3 short sentences). "
         "Be honest and human. Avoid overly long paragraphs."
     )
 
     user_message = (
-        f"The therapist just said: {therapist_msg}\n\n"
         f"Recent context:\n{transcript_text}\n\n"
+        f"The therapist just said: {therapist_msg}\n\n"
         "Please reply as the Persona in 1–3 short sentences."
     )
 
     return call_chat(
         messages=[
-            {"role": "system", "content": persona_system},
+            {"role": "system", "content": persona_system_prompt},
+            {"role": "system", "content": instructions},
             {"role": "user", "content": user_message}
         ],
-        temperature=0.8
+        temperature=0.8,
+        role="persona"
     )
 
-def run_therapist_session(persona: dict, phq9_transcript: Dict) -> Dict:
+def commit_turn(transcript: Dict, conv_history, writer: Optional[TranscriptWriter],
+                speaker: str, role: str, text: str):
+    transcript["turns"].append({"speaker": speaker, "text": text})
+    conv_history.append({"role": role, "content": text})
+    if writer is not None:
+        writer.turn(speaker, role, text)
+
+def run_therapist_session(persona: dict, phq9_transcript: Dict) -> Optional[Dict]:
     """
     Runs a 20-round therapist↔persona session, seeded with PHQ-9 context.
-    Returns full therapist transcript dict and saves to Normal Conversation folder.
+    Returns full therapist transcript dict and saves to Normal Conversation folder;
+    None (nothing saved) if a turn is dead-lettered, --retry-failed runs it again.
     """
     character_name = persona["name"]
     persona_system_prompt = persona["system_prompt"]
@@ -191,84 +272,207 @@ def run_therapist_session(persona: dict, phq9_transcript: Dict) -> Dict:
         "turns": []
     }
 
-    conv_history = [{"role": "Therapist", "content": f"Thanks for sharing earlier. {PHQ9_PARAPHRASES[0]}"}]
-
-    # Therapist initial message includes subtle acknowledgement of intake
-    t0 = call_chat(
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You are a warm, empathetic licensed therapist. "
-                    "Use the provided intake background to personalize your next question. "
-                    "1–2 sentences, casual tone, end with a gentle question. "
-                    "Do not mention PHQ-9 or 'intake forms' explicitly."
-                ),
-            },
-            {"role": "user", "content": f"{background}\n\nStart with a gentle opener referencing something minor from above."}
-        ],
-        temperature=0.65
-    )
-    transcript["turns"].append({"speaker": "Therapist", "text": t0})
-    conv_history[-1]["content"] = t0  # replace seed with actual output
-
-    # Persona reply
-    p0 = generate_persona_reply(persona_system_prompt, conv_history, t0)
-    transcript["turns"].append({"speaker": character_name, "text": p0})
-    conv_history.append({"role": "Persona", "content": p0})
-
-    # Remaining rounds
-    for r in range(1, ROUNDS_PER_CHARACTER):
-        topic = PHQ9_PARAPHRASES[r % len(PHQ9_PARAPHRASES)]
-        t_msg = generate_therapist_reply(conv_history, topic)
-        transcript["turns"].append({"speaker": "Therapist", "text": t_msg})
-        conv_history.append({"role": "Therapist", "content": t_msg})
+    conv_history = ConversationContext(budget_tokens=CONTEXT_TOKENS)
+    out_path = transcript_path(THERAPY_DIR, character_name)
+    writer = new_writer(out_path, transcript, character_name)
 
-        p_msg = generate_persona_reply(persona_system_prompt, conv_history, t_msg)
-        transcript["turns"].append({"speaker": character_name, "text": p_msg})
-        conv_history.append({"role": "Persona", "content": p_msg})
+    try:
+        # Therapist initial message includes subtle acknowledgement of intake
+        call_context["turn"] = 1
+        t0 = call_chat(
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "You are a warm, empathetic licensed therapist. "
+                        "Use the provided intake background to personalize your next question. "
+                        "1–2 sentences, casual tone, end with a gentle question. "
+                        "Do not mention PHQ-9 or 'intake forms' explicitly."
+                    ),
+                },
+                {"role": "user", "content": f"{background}\n\nStart with a gentle opener referencing something minor from above."}
+            ],
+            temperature=0.65,
+            role="opener"
+        )
+        commit_turn(transcript, conv_history, writer, "Therapist", "Therapist", t0)
+
+        # Persona reply
+        call_context["turn"] = 2
+        p0 = generate_persona_reply(persona_system_prompt, conv_history, t0)
+        commit_turn(transcript, conv_history, writer, character_name, "Persona", p0)
+
+        # Remaining rounds
+        for r in range(1, ROUNDS_PER_CHARACTER):
+            topic = PHQ9_PARAPHRASES[r % len(PHQ9_PARAPHRASES)]
+            call_context["turn"] = len(transcript["turns"]) + 1
+            t_msg = generate_therapist_reply(conv_history, topic)
+            commit_turn(transcript, conv_history, writer, "Therapist", "Therapist", t_msg)
+
+            call_context["turn"] = len(transcript["turns"]) + 1
+            p_msg = generate_persona_reply(persona_system_prompt, conv_history, t_msg)
+            commit_turn(transcript, conv_history, writer, character_name, "Persona", p_msg)
+    except CallFailed as e:
+        dead_letters.record(e, character_name, "therapist", scale="PHQ9", turn=call_context["turn"])
+        print(f"    {character_name}: therapist session failed at turn {call_context['turn']}; "
+              "rerun with --retry-failed")
+        return None
+    finally:
+        call_context["turn"] = None
 
     transcript["finished_at"] = datetime.utcnow().isoformat() + "Z"
 
     # Save to Normal Conversation folder
-    out_path = os.path.join(THERAPY_DIR, f"{safe_name(character_name)}.json")
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(transcript, f, indent=2, ensure_ascii=False)
+    finish_transcript(out_path, transcript, writer)
+    store_turns(character_name, transcript["turns"], phase="therapist", scale="PHQ9")
 
     return transcript
 
 # -----------------------------
-# 3) MAIN: Loop personas → PHQ-9 → Therapist
+# 3) RETRY dead-lettered units
 # -----------------------------
-def main():
+def retry_failed(personas: List[dict], questions: List[Dict]):
+    """
+    Re-run only the units in the dead-letter queue: failed PHQ-9 items are
+    re-asked and patched into their saved files, then the persona's therapist
+    session runs again once every item has an answer. Units of personas this
+    run does not select (another --shard) stay queued.
+    """
+    records = dead_letters.take()
+    if not records:
+        print("No failed units to retry.")
+        return
+
+    by_name = {p["name"]: p for p in personas}
+    units: Dict[str, set] = {}
+    retried = 0
+    for rec in records:
+        if rec["persona"] not in by_name:
+            dead_letters.record_raw(rec["persona"], rec["phase"], rec["error_type"], rec["error"],
+                                    rec["attempts"], scale=rec["scale"], question_id=rec["question_id"],
+                                    turn=rec["turn"])
+            continue
+        retried += 1
+        items = units.setdefault(rec["persona"], set())
+        if rec["phase"] == "questionnaire":
+            items.add(rec["question_id"])
+    print(f"Retrying {retried} failed units across {len(units)} personas...\n")
+
+    ids = question_ids(questions)
+    for name, failed_items in units.items():
+        persona = by_name[name]
+        print(f"--- {name} (retry) ---")
+        call_context["persona"] = name
+        call_context["phase"] = "questionnaire"
+        path = transcript_path(PHQ9_DIR, name)
+        if os.path.exists(path):
+            qa = load_transcript(path)
+            for idx, (q, question_id) in enumerate(zip(questions, ids)):
+                if question_id in failed_items:
+                    answer = ask_item(persona, q["content"], question_id)
+                    qa["Common Questions"][idx][name] = answer
+                    store_answers(name, "PHQ9", [{"question_id": question_id}], [answer])
+            call_context["question_id"] = None
+            save_transcript(path, qa, ids)
+        else:
+            qa = run_phq9_interview(persona, questions)
+
+        if interview_incomplete(qa, name):
+            continue
+        call_context["phase"] = "therapist"
+        run_therapist_session(persona, qa)
+
+    dead_letters.finish_retry()
+
+def report_failures():
+    if dead_letters.recorded:
+        print(f"\n⚠️  {dead_letters.recorded} failed units recorded in {DEAD_LETTER_PATH}; "
+              "rerun with --retry-failed.")
+
+# -----------------------------
+# 4) MAIN: Loop personas → PHQ-9 → Therapist
+# -----------------------------
+def main(argv=None):
+    global PHQ9_DIR, THERAPY_DIR, TRANSCRIPT_FORMAT, DEAD_LETTER_PATH, dead_letters
+    parser = argparse.ArgumentParser(description="PHQ-9 interview + therapist session runner")
+    add_shard_args(parser)
+    add_cache_args(parser)
+    add_budget_args(parser)
+    add_metrics_args(parser)
+    add_store_args(parser)
+    add_transcript_args(parser)
+    parser.add_argument("--retry-failed", action="store_true",
+                        help=f"re-run only the units recorded in {DEAD_LETTER_PATH}")
+    args = parser.parse_args(argv)
+    TRANSCRIPT_FORMAT = args.transcript_format
+    started_at = datetime.utcnow().isoformat() + "Z"
+    shard = configure_shard_from_args(args)
+    if shard is not None:
+        PHQ9_DIR, THERAPY_DIR = shard.path(PHQ9_DIR), shard.path(THERAPY_DIR)
+        os.makedirs(PHQ9_DIR, exist_ok=True)
+        os.makedirs(THERAPY_DIR, exist_ok=True)
+        DEAD_LETTER_PATH = shard.path(DEAD_LETTER_PATH)
+        dead_letters = DeadLetterQueue(DEAD_LETTER_PATH)
+        if args.store:
+            args.store = shard.path(args.store)
+    cache = configure_cache_from_args(args)
+    configure_metrics_from_args(args)
+    configure_budgets_from_args(args)
+    configure_store_from_args(args)
+
     # Load personas and questions
     with open(CHARACTERS_PATH, "r", encoding="utf-8") as f:
         characters_data = json.load(f)
     personas = characters_data["characters"]
+    if shard is not None:
+        total = len(personas)
+        personas = shard.select(personas)
+        print(f"Shard {shard.spec}: {len(personas)} of {total} personas -> {shard.root}")
 
     with open(QUESTIONS_PATH, "r", encoding="utf-8") as f:
         questions_data = json.load(f)
     questions = questions_data["questions"]
 
-    saved = {"phq9": [], "therapy": []}
-
-    for persona in personas:
-        # PHQ-9 interview
-        phq9_results = run_phq9_interview(persona, questions)
-        phq9_path = os.path.join(PHQ9_DIR, f"{safe_name(persona['name'])}.json")
-        saved["phq9"].append(phq9_path)
-
-        # Therapist session, seeded with PHQ-9 results (same persona/system prompt)
-        _ = run_therapist_session(persona, phq9_results)
-        therapy_path = os.path.join(THERAPY_DIR, f"{safe_name(persona['name'])}.json")
-        saved["therapy"].append(therapy_path)
-
-    print("\n✅ Saved PHQ-9 conversations:")
-    for p in saved["phq9"]:
-        print(f"- {p}")
-    print("\n✅ Saved Therapist conversations:")
-    for p in saved["therapy"]:
-        print(f"- {p}")
+    if args.retry_failed:
+        retry_failed(personas, questions)
+    else:
+        saved = {"phq9": [], "therapy": []}
+
+        for persona in personas:
+            call_context["persona"] = persona["name"]
+            # PHQ-9 interview
+            call_context["phase"] = "questionnaire"
+            phq9_results = run_phq9_interview(persona, questions)
+            phq9_path = transcript_path(PHQ9_DIR, persona["name"])
+            saved["phq9"].append(phq9_path)
+            if interview_incomplete(phq9_results, persona["name"]):
+                print(f"    {persona['name']}: therapist session deferred until failed items are retried")
+                continue
+
+            # Therapist session, seeded with PHQ-9 results (same persona/system prompt)
+            call_context["phase"] = "therapist"
+            if run_therapist_session(persona, phq9_results) is not None:
+                therapy_path = transcript_path(THERAPY_DIR, persona["name"])
+                saved["therapy"].append(therapy_path)
+
+        print("\n✅ Saved PHQ-9 conversations:")
+        for p in saved["phq9"]:
+            print(f"- {p}")
+        print("\n✅ Saved Therapist conversations:")
+        for p in saved["therapy"]:
+            print(f"- {p}")
+    if cache is not None:
+        print(f"\nCache: {cache.stats()}")
+    store = close_store()
+    if store is not None:
+        print(f"\nResult store: {store['rows']} rows in {store['path']}")
+    report_budgets(report_metrics())
+    report_failures()
+    if shard is not None:
+        completed = [p["name"] for p in personas
+                     if os.path.exists(transcript_path(THERAPY_DIR, p["name"]))]
+        path = shard.record_run("run_combined_sessions", ["PHQ9"], personas, completed, started_at)
+        print(f"\nShard manifest: {path} (combine shards with merge_shards.py)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,504 @@
+"""
+Interview + friend conversation runner for any set of instruments.
+
+For every persona and every selected instrument (CommonQuestions/*.json,
+see instruments.py) this asks the instrument's items, saves them under
+Conversations/<SCALE>/Question based Conversation, then runs a 20-round
+friend ↔ persona chat seeded with those answers and saves it under
+Conversations/<SCALE>/Normal Conversation.
+
+All instruments run in one pass over the personas, in one process, with
+one client (one connection pool), one response cache and one metrics log.
+run_phq9_sessions.py, run_gad7_sessions.py and run_asrm_sessions.py are
+this runner with a single instrument selected.
+
+Usage:
+------
+python scale_sessions.py                          # every instrument in CommonQuestions/
+python scale_sessions.py --instruments PHQ9,GAD7  # a subset
+python scale_sessions.py --cache --instruments ASRM
+python scale_sessions.py --retry-failed           # re-run only the dead-lettered units
+
+A call that still fails after its retries is not saved as the persona's
+answer or turn: the unit goes to Conversations/dead_letter_sessions.jsonl
+(see dead_letter.py), a failed item is saved as an empty answer, and that
+persona's friend chat for the instrument waits for --retry-failed.
+"""
+
+import argparse
+import json
+import os
+import time
+import random
+from datetime import datetime
+from typing import List, Dict, Optional
+from pathlib import Path
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from call_metrics import add_metrics_args, configure_metrics_from_args, record_call, report_metrics
+from conversation_context import ConversationContext
+from dead_letter import CallFailed, DeadLetterQueue
+from generation_budget import add_budget_args, budget_params, configure_budgets_from_args, report_budgets
+from instruments import Instrument, add_instrument_args, load_instruments_from_args
+from rate_limiter import is_rate_limit_error, limited_create
+from response_cache import add_cache_args, cache_lookup, cache_store, configure_cache_from_args
+from result_store import add_store_args, close_store, configure_store_from_args, store_answers, store_turns
+from sharding import add_shard_args, configure_shard_from_args
+from transcript_jsonl import TranscriptWriter, add_transcript_args, load_transcript, save_transcript
+
+# ========================
+# Config
+# ========================
+MODEL_NAME = "gpt-4o-mini"
+CHARACTERS_PATH = "Characters/characters.json"
+INSTRUMENTS_DIR = "CommonQuestions"
+BASE_CONV_DIR = "Conversations"
+DEAD_LETTER_PATH = os.path.join(BASE_CONV_DIR, "dead_letter_sessions.jsonl")
+
+ROUNDS_PER_CHARACTER = 20  # friend↔persona; 20 rounds = 40 utterances total
+CONTEXT_TOKENS = 800  # token budget of the recent-turns window in conversation prompts
+BACKGROUND_ITEMS = 12  # answers quoted in the friend's background
+TRANSCRIPT_FORMAT = "json"  # "jsonl": answers and turns appended as they happen (--transcript-format)
+
+# Load .env explicitly (so it works no matter the working dir)
+load_dotenv(Path(__file__).parent / ".env")
+
+# Initialize client (reads OPENAI_API_KEY from env).
+# No SDK retries: call_chat retries through the shared rate limiter instead.
+client = OpenAI(max_retries=0)
+
+# Interview items and friend chats whose call failed after all retries
+dead_letters = DeadLetterQueue(DEAD_LETTER_PATH)
+
+# Labels for the per-call metrics records; main() sets persona, phase and scale as it goes,
+# the interview and the chat the question_id / turn of each call.
+call_context = {"persona": None, "phase": None, "scale": None, "question_id": None, "turn": None}
+
+# Prompt wording for the interview and the friend chat. Placeholders are
+# filled with str.format. PHQ-9 keeps the wording its original runner used;
+# every other instrument (GAD-7, ASRM, new ones) uses the default set.
+DEFAULT_PROMPTS = {
+    "interview": (
+        "{question}\n\n"
+        "Please answer naturally in your own words. If it fits, include a brief rating like "
+        "{rating_hint}."
+    ),
+    "friend_system": (
+        "You are a close friend who genuinely cares and listens well. "
+        "You're warm, casual, and supportive — not a therapist. "
+        "You remember what the person shared earlier, and you ask about it gently. "
+        "Keep replies 1–2 short sentences. Avoid clinical language."
+    ),
+    "friend_user": (
+        "Recent chat (last turns):\n\n{transcript}\n\n"
+        "Next thing to ask about casually: {topic}\n\n"
+        "Respond as the Friend in 1–2 caring sentences."
+    ),
+    "persona_instructions": (
+        "Reply as yourself to a trusted friend in a casual, human tone (1–3 sentences). "
+        "Be authentic and expressive."
+    ),
+    "persona_user": (
+        "Recent context:\n{transcript}\n\n"
+        "Your friend just said: {friend_msg}\n\n"
+        "Reply naturally as yourself."
+    ),
+    "opener_system": (
+        "You are a caring friend. Use the background to make your first message personal and kind. "
+        "1–2 sentences; keep it natural."
+    ),
+    "opener_user": "{background}\n\nStart with something gentle and personal.",
+    "friend_profile": "A caring, supportive close friend who listens and asks gentle questions.",
+}
+
+SESSION_PROMPTS = {
+    "PHQ9": {
+        **DEFAULT_PROMPTS,
+        "interview": "{question}\n\nPlease answer naturally. You may include a PHQ-9 rating like {rating_hint}.",
+        "friend_system": (
+            "You are a caring close friend (not a clinician). Be warm and brief (1–2 sentences). "
+            "Ask about how they’re doing based on what they said earlier."
+        ),
+        "friend_user": "Recent chat:\n{transcript}\n\nNext gentle topic: {topic}\nRespond as the Friend.",
+        "persona_instructions": "Reply to your close friend in 1–3 casual sentences.",
+        "persona_user": "Context:\n{transcript}\n\nYour friend said: {friend_msg}\n\nReply naturally.",
+        "opener_system": "You are a caring friend. Use the background to personalize your first message (1–2 warm sentences).",
+        "opener_user": "{background}\n\nStart gentle and personal.",
+        "friend_profile": "A caring, supportive close friend.",
+    },
+}
+
+# -----------------------
+# Utils
+# -----------------------
+def safe_name(s: str) -> str:
+    out = "".join(c if c.isalnum() or c in "-_." else "_" for c in s)
+    return out.strip("._") or "conversation"
+
+def backoff_sleep(attempt: int):
+    time.sleep(1.25 + random.random() * (1.25 + attempt))
+
+def prompts_for(inst: Instrument) -> Dict[str, str]:
+    return SESSION_PROMPTS.get(inst.name, DEFAULT_PROMPTS)
+
+def qa_dir(inst: Instrument) -> str:
+    return os.path.join(BASE_CONV_DIR, inst.name, "Question based Conversation")
+
+def friend_dir(inst: Instrument) -> str:
+    return os.path.join(BASE_CONV_DIR, inst.name, "Normal Conversation")
+
+def transcript_path(folder: str, name: str) -> str:
+    return os.path.join(folder, f"{safe_name(name)}.{TRANSCRIPT_FORMAT}")
+
+def new_writer(path: str, data: Dict, character: str) -> Optional[TranscriptWriter]:
+    """Append-only writer for --transcript-format jsonl (None: the JSON file is written at the end)."""
+    return TranscriptWriter(path, data, character) if TRANSCRIPT_FORMAT == "jsonl" else None
+
+def finish_transcript(path: str, data: Dict, writer: Optional[TranscriptWriter]):
+    if writer is not None:
+        writer.finish(data)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+def call_chat(messages: List[Dict], temperature: float = 0.7, role: Optional[str] = None) -> str:
+    """
+    Retry/backoff wrapper; `role` picks the max_tokens / stop budget and labels
+    the metrics. Raises CallFailed when the retries run out.
+    """
+    params = {"temperature": temperature, **budget_params(role)}
+    meta = {**call_context, "role": role}
+    key, hit = cache_lookup(MODEL_NAME, messages, **params)
+    if hit is not None:
+        record_call(meta, MODEL_NAME, source="cache")
+        return hit
+    started = time.perf_counter()
+    for attempt in range(3):
+        try:
+            resp = limited_create(
+                client,
+                model=MODEL_NAME,
+                messages=messages,
+                **params,
+            )
+            record_call(meta, MODEL_NAME, getattr(resp, "usage", None),
+                        latency=time.perf_counter() - started, retries=attempt,
+                        finish_reason=resp.choices[0].finish_reason)
+            return cache_store(key, resp.choices[0].message.content.strip(), MODEL_NAME)
+        except Exception as e:
+            if attempt == 2:
+                record_call(meta, MODEL_NAME, latency=time.perf_counter() - started,
+                            retries=attempt, error_type=type(e).__name__)
+                raise CallFailed(e, attempts=attempt + 1)
+            if not is_rate_limit_error(e):  # 429s: the shared limiter already paused
+                backoff_sleep(attempt)
+
+# -----------------------
+# 1) Interview (Q&A)
+# -----------------------
+def ask_item(persona: dict, inst: Instrument, q: Dict) -> str:
+    """
+    One interview item. A call that fails after all retries is
+    dead-lettered and leaves an empty answer (scored as missing).
+    """
+    call_context["question_id"] = q["question_id"]
+    try:
+        return call_chat(
+            messages=[
+                {"role": "system", "content": persona["system_prompt"]},
+                {"role": "user",
+                 "content": prompts_for(inst)["interview"].format(question=q["content"],
+                                                                  rating_hint=inst.rating_hint)}
+            ],
+            temperature=0.7,
+            role="answer"
+        )
+    except CallFailed as e:
+        dead_letters.record(e, persona["name"], "questionnaire", scale=inst.name, question_id=q["question_id"])
+        return ""
+
+def interview_incomplete(qa: Dict, name: str) -> bool:
+    """True if an item has no answer (it was dead-lettered); the friend chat waits for it."""
+    return any(not row.get(name) for row in qa["Common Questions"])
+
+def run_interview(persona: dict, inst: Instrument) -> Dict:
+    """
+    Ask all of the instrument's questions using the persona's system prompt.
+    Return: {"Common Questions": [{ "Consultant": q, "<Name>": answer }, ...]}
+    """
+    character_name = persona["name"]
+
+    results = {"Common Questions": []}
+    out_path = transcript_path(qa_dir(inst), character_name)
+    writer = new_writer(out_path, results, character_name)
+    for q in inst.questions:
+        answer = ask_item(persona, inst, q)
+        results["Common Questions"].append({
+            "Consultant": q["content"],
+            character_name: answer
+        })
+        if writer is not None:
+            writer.qa(q["question_id"], q["content"], answer)
+
+    call_context["question_id"] = None
+
+    finish_transcript(out_path, results, writer)
+    store_answers(character_name, inst.name, inst.questions,
+                  [row[character_name] for row in results["Common Questions"]])
+    return results
+
+# -----------------------
+# 2) Friend conversation
+# -----------------------
+def generate_friend_reply(prompts: Dict[str, str], conv_history, next_topic_hint: str) -> str:
+    user_message = prompts["friend_user"].format(transcript=conv_history.render(), topic=next_topic_hint)
+    return call_chat(
+        messages=[{"role": "system", "content": prompts["friend_system"]},
+                  {"role": "user", "content": user_message}],
+        temperature=0.8,
+        role="friend"
+    )
+
+def generate_persona_reply(prompts: Dict[str, str], persona_system_prompt: str,
+                           conv_history, friend_msg: str) -> str:
+    transcript_text = f"{conv_history.render()}\nFriend: {friend_msg}"
+
+    # Persona prompt and instructions first, unchanged between calls, so the prefix is cacheable.
+    user_message = prompts["persona_user"].format(transcript=transcript_text, friend_msg=friend_msg)
+    return call_chat(
+        messages=[{"role": "system", "content": persona_system_prompt},
+                  {"role": "system", "content": prompts["persona_instructions"]},
+                  {"role": "user", "content": user_message}],
+        temperature=0.8,
+        role="persona"
+    )
+
+def commit_turn(transcript: Dict, conv_history, writer: Optional[TranscriptWriter],
+                speaker: str, role: str, text: str):
+    transcript["turns"].append({"speaker": speaker, "text": text})
+    conv_history.append({"role": role, "content": text})
+    if writer is not None:
+        writer.turn(speaker, role, text)
+
+def run_friend_conversation(persona: dict, inst: Instrument, qa_transcript: Dict) -> Optional[Dict]:
+    """
+    20-round friend↔persona chat seeded with the instrument's answers.
+    Returns None (nothing saved) if a turn is dead-lettered; --retry-failed
+    runs the chat again from the start.
+    """
+    character_name = persona["name"]
+    persona_system_prompt = persona["system_prompt"]
+    prompts = prompts_for(inst)
+
+    # Build background from the Q&A
+    lines = []
+    for row in qa_transcript["Common Questions"]:
+        q = row.get("Consultant", "")
+        a = row.get(character_name, "").replace("\n", " ").strip()
+        lines.append(f"- Q: {q} | A: {a}")
+    background = "What you know from earlier:\n" + "\n".join(lines[:BACKGROUND_ITEMS])
+
+    transcript = {
+        "character": character_name,
+        "friend_profile": prompts["friend_profile"],
+        "model": MODEL_NAME,
+        "turn_limit": ROUNDS_PER_CHARACTER,
+        "started_at": datetime.utcnow().isoformat() + "Z",
+        "turns": []
+    }
+
+    conv_history = ConversationContext(budget_tokens=CONTEXT_TOKENS)
+    out_path = transcript_path(friend_dir(inst), character_name)
+    writer = new_writer(out_path, transcript, character_name)
+
+    try:
+        # Friend opener using background
+        call_context["turn"] = 1
+        f0 = call_chat(
+            messages=[
+                {"role": "system", "content": prompts["opener_system"]},
+                {"role": "user", "content": prompts["opener_user"].format(background=background)}
+            ],
+            temperature=0.7,
+            role="opener"
+        )
+        commit_turn(transcript, conv_history, writer, "Friend", "Friend", f0)
+
+        # Persona reply
+        call_context["turn"] = 2
+        p0 = generate_persona_reply(prompts, persona_system_prompt, conv_history, f0)
+        commit_turn(transcript, conv_history, writer, character_name, "Persona", p0)
+
+        # Continue chat
+        for r in range(1, ROUNDS_PER_CHARACTER):
+            topic = inst.paraphrases[r % len(inst.paraphrases)]
+            call_context["turn"] = len(transcript["turns"]) + 1
+            f_msg = generate_friend_reply(prompts, conv_history, topic)
+            commit_turn(transcript, conv_history, writer, "Friend", "Friend", f_msg)
+
+            call_context["turn"] = len(transcript["turns"]) + 1
+            p_msg = generate_persona_reply(prompts, persona_system_prompt, conv_history, f_msg)
+            commit_turn(transcript, conv_history, writer, character_name, "Persona", p_msg)
+    except CallFailed as e:
+        dead_letters.record(e, character_name, "casual", scale=inst.name, turn=call_context["turn"])
+        print(f"    {character_name}: {inst.name} friend chat failed at turn {call_context['turn']}; "
+              "rerun with --retry-failed")
+        return None
+    finally:
+        call_context["turn"] = None
+
+    transcript["finished_at"] = datetime.utcnow().isoformat() + "Z"
+    finish_transcript(out_path, transcript, writer)
+    store_turns(character_name, transcript["turns"], scale=inst.name)
+
+    return transcript
+
+# -----------------------
+# 3) Retry dead-lettered units
+# -----------------------
+def retry_failed(personas: List[dict], instruments: Dict[str, Instrument]):
+    """
+    Re-run only the units in the dead-letter queue: failed interview items are
+    re-asked and patched into their saved files, then the persona's friend chat
+    for that instrument runs again once every item has an answer. Units of
+    instruments or personas this run does not select stay queued.
+    """
+    records = dead_letters.take()
+    if not records:
+        print("No failed units to retry.")
+        return
+
+    by_name = {p["name"]: p for p in personas}
+    units: Dict[tuple, set] = {}
+    retried = 0
+    for rec in records:
+        if rec["scale"] not in instruments or rec["persona"] not in by_name:
+            dead_letters.record_raw(rec["persona"], rec["phase"], rec["error_type"], rec["error"],
+                                    rec["attempts"], scale=rec["scale"], question_id=rec["question_id"],
+                                    turn=rec["turn"])
+            continue
+        retried += 1
+        items = units.setdefault((rec["persona"], rec["scale"]), set())
+        if rec["phase"] == "questionnaire":
+            items.add(rec["question_id"])
+    print(f"Retrying {retried} failed units across {len(units)} persona/instrument pairs...\n")
+
+    for (name, scale), failed_items in units.items():
+        persona, inst = by_name[name], instruments[scale]
+        print(f"--- {name} / {inst.title} (retry) ---")
+        call_context["persona"], call_context["scale"] = name, scale
+        call_context["phase"] = "questionnaire"
+        path = transcript_path(qa_dir(inst), name)
+        if os.path.exists(path):
+            qa = load_transcript(path)
+            for idx, q in enumerate(inst.questions):
+                if q["question_id"] in failed_items:
+                    answer = ask_item(persona, inst, q)
+                    qa["Common Questions"][idx][name] = answer
+                    store_answers(name, scale, [q], [answer])
+            call_context["question_id"] = None
+            save_transcript(path, qa, [q["question_id"] for q in inst.questions])
+        else:
+            qa = run_interview(persona, inst)
+
+        if interview_incomplete(qa, name):
+            continue
+        call_context["phase"] = "casual"
+        run_friend_conversation(persona, inst, qa)
+
+    dead_letters.finish_retry()
+
+def report_failures():
+    if dead_letters.recorded:
+        print(f"\n⚠️  {dead_letters.recorded} failed units recorded in {DEAD_LETTER_PATH}; "
+              "rerun with --retry-failed.")
+
+# -----------------------
+# 4) MAIN
+# -----------------------
+def main(argv=None, description: str = "Interview + friend conversation runner for any set of instruments"):
+    global BASE_CONV_DIR, TRANSCRIPT_FORMAT, DEAD_LETTER_PATH, dead_letters
+    parser = argparse.ArgumentParser(description=description)
+    add_instrument_args(parser)
+    add_shard_args(parser)
+    add_cache_args(parser)
+    add_budget_args(parser)
+    add_metrics_args(parser)
+    add_store_args(parser)
+    add_transcript_args(parser)
+    parser.add_argument("--retry-failed", action="store_true",
+                        help=f"re-run only the units recorded in {DEAD_LETTER_PATH}")
+    args = parser.parse_args(argv)
+    TRANSCRIPT_FORMAT = args.transcript_format
+    instruments = load_instruments_from_args(args, INSTRUMENTS_DIR)
+    started_at = datetime.utcnow().isoformat() + "Z"
+    shard = configure_shard_from_args(args)
+    if shard is not None:
+        BASE_CONV_DIR = shard.path(BASE_CONV_DIR)
+        DEAD_LETTER_PATH = shard.path(DEAD_LETTER_PATH)
+        dead_letters = DeadLetterQueue(DEAD_LETTER_PATH)
+        if args.store:
+            args.store = shard.path(args.store)
+    cache = configure_cache_from_args(args)
+    configure_metrics_from_args(args)
+    configure_budgets_from_args(args)
+    configure_store_from_args(args)
+
+    for inst in instruments.values():
+        if not inst.paraphrases:
+            raise SystemExit(f"{inst.path}: no \"paraphrases\" for the friend conversation")
+        os.makedirs(qa_dir(inst), exist_ok=True)
+        os.makedirs(friend_dir(inst), exist_ok=True)
+
+    with open(CHARACTERS_PATH, "r", encoding="utf-8") as f:
+        personas = json.load(f)["characters"]
+    if shard is not None:
+        total = len(personas)
+        personas = shard.select(personas)
+        print(f"Shard {shard.spec}: {len(personas)} of {total} personas -> {shard.root}")
+
+    if args.retry_failed:
+        retry_failed(personas, instruments)
+    else:
+        saved = {name: {"qa": [], "friend": []} for name in instruments}
+
+        # One pass over the personas; each runs every selected instrument in turn.
+        for persona in personas:
+            call_context["persona"] = persona["name"]
+            for name, inst in instruments.items():
+                call_context["scale"] = name
+                call_context["phase"] = "questionnaire"
+                qa = run_interview(persona, inst)
+                saved[name]["qa"].append(transcript_path(qa_dir(inst), persona["name"]))
+                if interview_incomplete(qa, persona["name"]):
+                    print(f"    {persona['name']}: {inst.name} friend chat deferred until failed items are retried")
+                    continue
+
+                call_context["phase"] = "casual"
+                if run_friend_conversation(persona, inst, qa) is not None:
+                    saved[name]["friend"].append(transcript_path(friend_dir(inst), persona["name"]))
+
+        for name, inst in instruments.items():
+            print(f"\n✅ Saved {inst.title} question-based conversations:")
+            for p in saved[name]["qa"]:
+                print(f"- {p}")
+            print(f"\n✅ Saved {inst.title} friend conversations:")
+            for p in saved[name]["friend"]:
+                print(f"- {p}")
+    if cache is not None:
+        print(f"\nCache: {cache.stats()}")
+    store = close_store()
+    if store is not None:
+        print(f"\nResult store: {store['rows']} rows in {store['path']}")
+    report_budgets(report_metrics())
+    report_failures()
+    if shard is not None:
+        completed = [p["name"] for p in personas
+                     if all(os.path.exists(transcript_path(friend_dir(inst), p["name"]))
+                            for inst in instruments.values())]
+        path = shard.record_run("scale_sessions", instruments, personas, completed, started_at)
+        print(f"\nShard manifest: {path} (combine shards with merge_shards.py)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Persistent index of scored PHQ-9 transcripts, so re-analysis only reads
+and scores files that are new or changed.
+
+Each file is keyed by its absolute path and remembered with its size,
+mtime and SHA-1 plus the score_character_file result (or the error a
+malformed file raised). On the next scan:
+- same size and mtime             -> the stored result, without opening the file;
+- different stat, same SHA-1      -> the stored result (e.g. a copied or touched file);
+- otherwise                       -> parsed and scored again.
+Results are also re-scored when the scoring rules change (anchors, cues,
+explicit patterns or SCORER_REVISION), and rows of files that disappeared
+from a scanned folder are dropped. Files modified in the last couple of
+seconds are always hashed next time, since a later write within the same
+mtime tick would not change their stat.
+
+Usage:
+------
+from score_index import ScoreIndex
+from phq9_tools import analyze_results_folder
+
+index = ScoreIndex()                                   # Cache/scores.sqlite
+summary, detail = analyze_results_folder("PHQ9 Conversation", index=index)
+index.stats()   # {"unchanged": 9990, "rehashed": 0, "scored": 10, "removed": 0, ...}
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import phq9_tools
+from phq9_tools import PHQ9_ITEMS, _character_conversation, map_chunks, score_character_data
+from transcript_jsonl import is_transcript, parse_transcript
+
+DEFAULT_INDEX_PATH = os.path.join("Cache", "scores.sqlite")
+# Bump when scoring code changes in a way the fingerprinted rules below don't show
+SCORER_REVISION = 1
+# A file modified this recently may change again within the same mtime tick
+RACY_SECONDS = 2.0
+
+
+def scorer_fingerprint() -> str:
+    """Hash of everything that decides a score; stored results from other rules are re-scored."""
+    rules = [
+        SCORER_REVISION,
+        PHQ9_ITEMS,
+        phq9_tools.ANCHOR_TO_SCORE,
+        [p.pattern for p in phq9_tools.EXPLICIT_SCORE_PATTERNS],
+        {str(k): v for k, v in phq9_tools.FUZZY_CUES.items()},
+        phq9_tools.Q9_RISK,
+        phq9_tools.Q9_DENIALS,
+    ]
+    return hashlib.sha1(json.dumps(rules, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _score_bytes(raw: bytes, path: str) -> Tuple[Optional[Dict], Optional[str]]:
+    """(score_character_file result, None) or (None, error) for a file's content."""
+    try:
+        return score_character_data(*_character_conversation(parse_transcript(raw.decode("utf-8"), path), path)), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def _score_chunk(files: List[Tuple[bytes, str]]) -> List[Tuple[Optional[Dict], Optional[str]]]:
+    return [_score_bytes(raw, path) for raw, path in files]
+
+
+class ScoreIndex:
+    """SQLite-backed index of scored transcripts; safe to share between threads and processes."""
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        self.scorer = scorer_fingerprint()
+        self.counts = {"unchanged": 0, "rehashed": 0, "scored": 0, "removed": 0}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            " path TEXT PRIMARY KEY,"
+            " folder TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " sha1 TEXT NOT NULL,"
+            " scorer TEXT NOT NULL,"
+            " character TEXT,"
+            " scores TEXT,"          # JSON list, one score (or null) per PHQ9_ITEMS entry
+            " answers TEXT,"         # JSON list of the matching answers
+            " total INTEGER,"
+            " missing INTEGER,"
+            " error TEXT,"
+            " indexed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS scores_folder ON scores (folder)")
+        self._db.commit()
+
+    def _stored(self, folder: str) -> Dict[str, Tuple]:
+        rows = self._db.execute(
+            "SELECT path, size, mtime_ns, sha1, scorer, character, scores, answers, total, missing, error"
+            " FROM scores WHERE folder = ?", (folder,))
+        return {row[0]: row[1:] for row in rows}
+
+    def scored_files(self, results_dir: str, answers: bool = True,
+                     workers: Optional[int] = 1) -> List[Tuple[str, Optional[Dict], Optional[str]]]:
+        """
+        phq9_tools.scored_files for `results_dir`, reading only new or changed files.
+        answers=False leaves the items' answer text out of stored results (faster; scores only).
+        workers > 1 scores the new or changed files in that many processes (0 = one per CPU).
+        """
+        folder = os.path.abspath(results_dir)
+        now = time.time()
+        out = []
+        misses = []   # (position in out, path, stat, sha1, raw)
+        writes = []
+        with self._lock:
+            stored = self._stored(folder)
+            seen = set()
+            with os.scandir(folder) as it:
+                entries = sorted((e for e in it if is_transcript(e.name) and e.is_file()),
+                                 key=lambda e: e.name)
+            for entry in entries:
+                path = os.path.join(folder, entry.name)
+                seen.add(path)
+                st = entry.stat()
+                row = stored.get(path)
+                if row is not None and row[3] == self.scorer and row[:2] == (st.st_size, st.st_mtime_ns):
+                    self.counts["unchanged"] += 1
+                    out.append((entry.name, *self._result(row, answers)))
+                    continue
+
+                with open(path, "rb") as f:
+                    raw = f.read()
+                sha1 = hashlib.sha1(raw).hexdigest()
+                if row is not None and row[3] == self.scorer and row[2] == sha1:
+                    self.counts["rehashed"] += 1
+                    result, error = self._result(row, answers=True)
+                    writes.append(self._row(path, folder, st, sha1, result, error, now))
+                    out.append((entry.name, result, error))
+                else:
+                    self.counts["scored"] += 1
+                    misses.append((len(out), path, st, sha1, raw))
+                    out.append(None)
+
+            scored = map_chunks(_score_chunk, [(raw, path) for _, path, _, _, raw in misses], workers)
+            for (pos, path, st, sha1, _), (result, error) in zip(misses, scored):
+                writes.append(self._row(path, folder, st, sha1, result, error, now))
+                out[pos] = (os.path.basename(path), result, error)
+
+            gone = [p for p in stored if p not in seen]
+            self._db.executemany(
+                "INSERT OR REPLACE INTO scores (path, folder, size, mtime_ns, sha1, scorer, character,"
+                " scores, answers, total, missing, error, indexed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", writes)
+            self._db.executemany("DELETE FROM scores WHERE path = ?", [(p,) for p in gone])
+            self._db.commit()
+            self.counts["removed"] += len(gone)
+        return out
+
+    def _row(self, path: str, folder: str, st: os.stat_result, sha1: str,
+             result: Optional[Dict], error: Optional[str], now: float) -> Tuple:
+        size = st.st_size
+        # a racily-clean stat is stored as unknown, so the next scan hashes the file
+        mtime_ns = -1 if now - st.st_mtime < RACY_SECONDS else st.st_mtime_ns
+        if result is None:
+            return (path, folder, size, mtime_ns, sha1, self.scorer, None, None, None, None, None, error, now)
+        return (path, folder, size, mtime_ns, sha1, self.scorer, result["character"],
+                json.dumps([item["score"] for item in result["items"]]),
+                json.dumps([item["answer"] for item in result["items"]], ensure_ascii=False),
+                result["total_score"], result["missing"], None, now)
+
+    @staticmethod
+    def _result(row: Tuple, answers: bool) -> Tuple[Optional[Dict], Optional[str]]:
+        """Rebuild the score_character_file result stored in an index row."""
+        character, scores, answer_json, total, missing, error = row[4:]
+        if error is not None:
+            return None, error
+        texts = json.loads(answer_json) if answers else [None] * len(PHQ9_ITEMS)
+        items = [{"question_id": idx, "question": question, "answer": answer, "score": score}
+                 for idx, (question, answer, score) in enumerate(zip(PHQ9_ITEMS, texts, json.loads(scores)), start=1)]
+        return {"character": character, "items": items, "total_score": total, "missing": missing}, None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def stats(self) -> Dict:
+        return {**self.counts, "entries": len(self)}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
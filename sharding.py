@@ -0,0 +1,130 @@
+"""
+Deterministic persona sharding across processes and machines.
+
+`--shard i/N` (1 <= i <= N) keeps the personas whose name hashes to shard
+i. The hash is SHA-1 of the UTF-8 name, not Python's per-process hash(),
+so every machine assigns a persona to the same shard whatever the order
+of characters.json. A sharded run writes everything it would write
+under the working directory (Conversations/, Metrics/, Batch/) under
+Shards/<i>-of-<N>/ instead, and records what it ran in that folder's
+manifest.json. merge_shards.py copies the shards back into one tree
+and checks that every persona was completed exactly once.
+
+Usage:
+------
+from sharding import add_shard_args, configure_shard_from_args
+
+shard = configure_shard_from_args(args)       # None without --shard
+personas = shard.select(personas) if shard else personas
+out_dir = shard.path("Conversations") if shard else "Conversations"
+...
+shard.record_run("all_in_one", instruments, personas, completed, started_at)
+
+python all_in_one.py --shard 1/4 --in-flight 32    # machine 1 of 4
+python scale_sessions.py --shard 3/4               # machine 3 of 4
+python merge_shards.py                             # after copying Shards/ to one machine
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+SHARDS_DIR = "Shards"
+MANIFEST_NAME = "manifest.json"
+_SPEC = re.compile(r"^\s*(\d+)\s*/\s*(\d+)\s*$")
+
+
+def shard_index(name: str, count: int) -> int:
+    """1-based shard of a persona name among `count` shards."""
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()
+    return int(digest[:15], 16) % count + 1
+
+
+class Shard:
+    """Shard `index` of `count`; owns its personas and an output folder under `base_dir`."""
+
+    def __init__(self, index: int, count: int, base_dir: str = SHARDS_DIR):
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"Expected 1 <= i <= N, got {index}/{count}")
+        self.index = index
+        self.count = count
+        self.base_dir = base_dir
+
+    @property
+    def spec(self) -> str:
+        return f"{self.index}/{self.count}"
+
+    @property
+    def root(self) -> str:
+        return os.path.join(self.base_dir, f"{self.index}-of-{self.count}")
+
+    def path(self, relative: str) -> str:
+        """An output path of an unsharded run, moved into this shard's folder (absolute paths stay)."""
+        return os.path.join(self.root, relative)
+
+    def owns(self, name: str) -> bool:
+        return shard_index(name, self.count) == self.index
+
+    def select(self, personas: List[Dict]) -> List[Dict]:
+        """This shard's personas, in their characters.json order."""
+        return [p for p in personas if self.owns(p["name"])]
+
+    def record_run(self, runner: str, instruments: Iterable[str], personas: List[Dict],
+                   completed: Iterable[str], started_at: str) -> str:
+        """Append one run to manifest.json: what was assigned and which personas finished."""
+        path = os.path.join(self.root, MANIFEST_NAME)
+        manifest = read_manifest(path) or {"shard": self.spec, "index": self.index,
+                                           "count": self.count, "runs": []}
+        manifest["runs"].append({
+            "runner": runner,
+            "instruments": list(instruments),
+            "assigned": [p["name"] for p in personas],
+            "completed": list(completed),
+            "started_at": started_at,
+            "finished_at": datetime.utcnow().isoformat() + "Z",
+        })
+        os.makedirs(self.root, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        return path
+
+
+def parse_shard(value: Optional[str], base_dir: str = SHARDS_DIR) -> Optional[Shard]:
+    """'2/4' -> Shard(2, 4); None / '' -> None (no sharding)."""
+    if not value:
+        return None
+    m = _SPEC.match(value)
+    if not m:
+        raise ValueError(f"Expected i/N, got {value!r}")
+    return Shard(int(m.group(1)), int(m.group(2)), base_dir)
+
+
+def read_manifest(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def add_shard_args(parser):
+    """--shard / --shards-dir flags shared by the runners."""
+    parser.add_argument("--shard", default=None, metavar="I/N",
+                        help="run only the personas whose name hashes to shard I of N (1-based); "
+                             f"outputs go to {SHARDS_DIR}/<I>-of-<N>/")
+    parser.add_argument("--shards-dir", default=SHARDS_DIR,
+                        help=f"parent folder of the per-shard outputs (default: {SHARDS_DIR})")
+
+
+def configure_shard_from_args(args) -> Optional[Shard]:
+    """The --shard Shard (None without it); per-call metrics move into its folder too."""
+    try:
+        shard = parse_shard(args.shard, args.shards_dir)
+    except ValueError as e:
+        raise SystemExit(f"--shard: {e}")
+    if shard is not None and getattr(args, "metrics", None):
+        args.metrics = shard.path(args.metrics)
+    return shard
@@ -0,0 +1,139 @@
+"""
+Streaming chat completions with time-to-first-token and early stop.
+
+The runners ask for short, well-delimited answers: questionnaire items end
+with a "Choice: <option>" line, conversational turns are 1–3 sentences.
+When streaming, a stop policy watches the accumulated text and the stream
+is closed as soon as the answer is complete. Everything after that point
+would only be extra completion tokens and latency.
+
+Usage:
+------
+from streaming import ChoiceAnchor, SentenceLimit, read_stream
+
+stream = client.chat.completions.create(..., stream=True, stream_options={"include_usage": True})
+result = read_stream(stream, ChoiceAnchor(["Not at all", "Several days", ...]), started=t0)
+result.text, result.ttft, result.chunks, result.stopped
+usage = stream_usage(result, messages)   # estimated when the stream was cut
+
+A policy is any callable taking the text so far and returning the index to
+cut at (or None to keep reading); its `name` becomes part of the response
+cache key, because a cut answer differs from the full one.
+"""
+
+from __future__ import annotations
+import re
+import time
+from typing import Dict, List, Optional
+
+from rate_limiter import estimate_prompt_tokens
+
+
+class ChoiceAnchor:
+    """Stop once a 'Choice: <option>' line names one of `labels` in full."""
+
+    def __init__(self, labels: List[str]):
+        self.name = "choice"
+        alternatives = "|".join(re.escape(l) for l in sorted(labels, key=len, reverse=True))
+        # the label must be followed by something that cannot extend it (newline, punctuation, ...)
+        self._pattern = re.compile(rf"choice\s*:\s*\**\s*(?:{alternatives})\b(?=[^\w ]|\s+\S)", re.IGNORECASE)
+
+    def __call__(self, text: str) -> Optional[int]:
+        m = self._pattern.search(text)
+        return m.end() if m else None
+
+
+class SentenceLimit:
+    """Stop after `n` complete sentences (a terminator followed by whitespace)."""
+
+    _END = re.compile(r"[.!?]+[\"')\]]*(?=\s)")
+
+    def __init__(self, n: int):
+        self.n = n
+        self.name = f"sentences:{n}"
+
+    def __call__(self, text: str) -> Optional[int]:
+        ends = 0
+        for m in self._END.finditer(text):
+            ends += 1
+            if ends == self.n:
+                return m.end()
+        return None
+
+
+class StreamResult:
+    def __init__(self):
+        self.parts: List[str] = []
+        self.ttft: Optional[float] = None
+        self.chunks = 0          # content chunks received (~ completion tokens)
+        self.usage = None        # only present if the stream ran to the end
+        self.stopped = False     # cut early by the policy
+        self.finish_reason = None  # from the last chunk; stays None when cut early
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+def _feed(result: StreamResult, chunk, stop_when, started: float) -> bool:
+    """Add one chunk; True when the policy says the answer is complete."""
+    if getattr(chunk, "usage", None) is not None:
+        result.usage = chunk.usage
+    choices = getattr(chunk, "choices", None) or []
+    if choices and choices[0].finish_reason:
+        result.finish_reason = choices[0].finish_reason
+    delta = choices[0].delta.content if choices and choices[0].delta else None
+    if not delta:
+        return False
+    if result.ttft is None:
+        result.ttft = time.perf_counter() - started
+    result.parts.append(delta)
+    result.chunks += 1
+    if stop_when is None:
+        return False
+    text = result.text
+    cut = stop_when(text)
+    if cut is None:
+        return False
+    result.parts = [text[:cut]]
+    result.stopped = True
+    return True
+
+
+def read_stream(stream, stop_when=None, started: Optional[float] = None) -> StreamResult:
+    """Consume a Stream[ChatCompletionChunk], closing it as soon as `stop_when` fires."""
+    started = time.perf_counter() if started is None else started
+    result = StreamResult()
+    try:
+        for chunk in stream:
+            if _feed(result, chunk, stop_when, started):
+                break
+    finally:
+        stream.close()
+    return result
+
+
+async def aread_stream(stream, stop_when=None, started: Optional[float] = None) -> StreamResult:
+    """Async twin of read_stream for AsyncStream."""
+    started = time.perf_counter() if started is None else started
+    result = StreamResult()
+    try:
+        async for chunk in stream:
+            if _feed(result, chunk, stop_when, started):
+                break
+    finally:
+        await stream.close()
+    return result
+
+
+def stream_usage(result: StreamResult, messages: List[Dict]):
+    """
+    Usage of a streamed call. The usage chunk only arrives when the stream
+    runs to the end; for a cut stream the prompt is estimated locally and
+    the completion counted as the content chunks received (about one token each).
+    """
+    if result.usage is not None:
+        return result.usage
+    return {"prompt_tokens": estimate_prompt_tokens(messages),
+            "completion_tokens": result.chunks,
+            "estimated": True}
@@ -0,0 +1,85 @@
+from instruments import load_instruments
+from phq9_tools import choice_item_scores, export_summary
+import os
+import pandas as pd
+
+# Compare per-item prompting ("Question based Conversation") with the
+# single-call JSON-schema mode ("Structured Conversation", all_in_one.py --structured).
+BASE_CONV_DIR = "Conversations"
+SCALES = list(load_instruments())
+PER_ITEM_FOLDER = "Question based Conversation"
+STRUCTURED_FOLDER = "Structured Conversation"
+ANALYSIS_DIR = "Analysis"
+
+os.makedirs(ANALYSIS_DIR, exist_ok=True)
+
+print("🔍 Comparing per-item and structured questionnaire answers...\n")
+
+item_rows = []
+total_rows = []
+for scale in SCALES:
+    per_item_dir = os.path.join(BASE_CONV_DIR, scale, PER_ITEM_FOLDER)
+    structured_dir = os.path.join(BASE_CONV_DIR, scale, STRUCTURED_FOLDER)
+    if not (os.path.isdir(per_item_dir) and os.path.isdir(structured_dir)):
+        print(f"⚠️  Skipping {scale}: need both '{per_item_dir}' and '{structured_dir}'")
+        continue
+
+    per_item = choice_item_scores(per_item_dir, scale)
+    structured = choice_item_scores(structured_dir, scale)
+    both = per_item.merge(structured, on=["character", "question_id"], suffixes=("_per_item", "_structured"))
+    both = both.dropna(subset=["score_per_item", "score_structured"])
+    if both.empty:
+        print(f"⚠️  Skipping {scale}: no characters answered in both modes")
+        continue
+
+    # Item level: mean score per mode, exact agreement, mean absolute difference.
+    both["agree"] = both["score_per_item"] == both["score_structured"]
+    both["abs_diff"] = (both["score_per_item"] - both["score_structured"]).abs()
+    items = both.groupby("question_id").agg(
+        n=("character", "count"),
+        mean_per_item=("score_per_item", "mean"),
+        mean_structured=("score_structured", "mean"),
+        exact_agreement=("agree", "mean"),
+        mean_abs_diff=("abs_diff", "mean"),
+    ).reset_index()
+    items.insert(0, "scale", scale)
+    item_rows.append(items)
+
+    # Total-score distribution per mode (characters with every item scored in both).
+    n_items = both["question_id"].nunique()
+    totals = both.groupby("character").agg(
+        n=("question_id", "count"),
+        per_item=("score_per_item", "sum"),
+        structured=("score_structured", "sum"),
+    )
+    totals = totals[totals["n"] == n_items]
+    for mode in ["per_item", "structured"]:
+        total_rows.append({
+            "scale": scale,
+            "mode": mode,
+            "characters": len(totals),
+            "mean": totals[mode].mean(),
+            "sd": totals[mode].std(),
+            "min": totals[mode].min(),
+            "max": totals[mode].max(),
+        })
+
+    print(f"{scale}: {len(both)} paired items, "
+          f"exact agreement {both['agree'].mean():.1%}, "
+          f"mean |diff| {both['abs_diff'].mean():.2f}")
+
+if not item_rows:
+    raise SystemExit("Nothing to compare yet — run all_in_one.py with and without --structured first.")
+
+df_items = pd.concat(item_rows, ignore_index=True).round(3)
+df_totals = pd.DataFrame(total_rows).round(3)
+
+items_csv = os.path.join(ANALYSIS_DIR, "structured_parity.csv")
+totals_csv = os.path.join(ANALYSIS_DIR, "structured_parity_totals.csv")
+export_summary(df_items, csv_path=items_csv)
+export_summary(df_totals, csv_path=totals_csv)
+
+print("\n" + df_totals.to_string(index=False))
+print("\n✅ Exports complete!")
+print(f"- {items_csv}")
+print(f"- {totals_csv}")
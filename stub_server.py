@@ -0,0 +1,497 @@
+"""
+Local OpenAI-compatible stand-in server for offline load testing.
+
+Speaks just enough of the API for every runner: /v1/chat/completions
+(plain, streamed and JSON-schema), /v1/files and /v1/batches. Replies are
+canned but in character and shaped like the real ones: questionnaire
+items end with a "Choice: <option>" line taken from the prompt's option
+list, the session runners' items carry a "Rating: N", structured requests
+get a schema-valid object and conversation turns are 1–3 sentences. The
+same request always gets the same reply, so cache and parity checks work.
+
+Timing and failures are configurable so throughput changes can be
+measured without spending money:
+- latency (time to first token): none, fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA (seconds);
+- token-rate emulation: completion tokens are produced at --tokens-per-sec
+  (streamed chunk by chunk, or added to the latency of a plain response);
+- error injection: --error-429 / --error-500 probabilities per request,
+  plus an optional --rpm capacity beyond which requests get a 429;
+- x-ratelimit-* headers advertise --rpm / --tpm so the client limiter
+  paces against the stand-in's capacity, not the account defaults.
+GET /stats returns the counters (requests, injected errors, tokens).
+
+Usage:
+------
+python stub_server.py --port 8765 --latency lognormal:0.4,0.5 --tokens-per-sec 80 --error-429 0.02
+OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub python all_in_one.py --in-flight 64
+
+from stub_server import StubConfig, start_server
+server = start_server(StubConfig(latency="fixed:0.05"), port=0)   # background thread
+server.url, server.stats()
+"""
+
+from __future__ import annotations
+import argparse
+import collections
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_PORT = 8765
+_TOKEN = re.compile(r"\s*\S+")
+_OPTIONS = re.compile(r"Choice:\s*<one of>\s*\n(.+)")
+_RATING = re.compile(r"Rating:\s*(\d)\s*[–-]\s*(\d)")
+
+# Canned sentences, picked deterministically per request
+ANSWER_OPENINGS = [
+    "Honestly, it's been a mixed few weeks for me.",
+    "I'd say it comes and goes, depending on the day.",
+    "It's hard to put into words, but I notice it more than I'd like.",
+    "Not really, most days I feel fairly okay about it.",
+    "Yeah, that's been on my mind quite a bit lately.",
+    "I try not to dwell on it, but it does creep in sometimes.",
+]
+ANSWER_DETAILS = [
+    "Work and sleep have both been a bit all over the place.",
+    "I keep telling myself it'll settle down soon.",
+    "My friends have noticed it more than I have, I think.",
+    "Some evenings are better than others.",
+    "It's mostly when I'm alone that it gets to me.",
+]
+FRIEND_LINES = [
+    "Hey, I've been thinking about you — how have things been this week?",
+    "That sounds like a lot to carry.",
+    "I'm really glad you told me that.",
+    "Have you had any time for yourself lately?",
+    "How's your sleep been holding up?",
+    "You don't have to have it all figured out, you know.",
+]
+PERSONA_LINES = [
+    "Thanks for asking, it means more than you know.",
+    "It's been up and down, honestly.",
+    "I've been trying to keep busy so I don't overthink everything.",
+    "Some days I feel fine and then it just hits me out of nowhere.",
+    "I guess I haven't really talked about it with anyone.",
+    "Maybe I should get out more, like we used to.",
+]
+
+
+def count_tokens(text: str) -> int:
+    """Whitespace-delimited pieces; the same unit the stream is chunked in."""
+    return len(_TOKEN.findall(text))
+
+
+def prompt_tokens(messages: List[Dict]) -> int:
+    """Same estimate as rate_limiter.estimate_prompt_tokens."""
+    chars = sum(len(str(m.get("content") or "")) for m in messages)
+    return chars // 4 + 4 * len(messages) + 3
+
+
+class LatencyModel:
+    """Time to first token, from a spec like 'lognormal:0.4,0.5'."""
+
+    def __init__(self, spec: str = "none"):
+        self.spec = spec
+        kind, _, args = spec.partition(":")
+        values = [float(v) for v in args.split(",") if v.strip()]
+        expected = {"none": 0, "fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(values) != expected[kind]:
+            raise ValueError(f"Bad latency spec {spec!r}; use none, fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+        self.kind = kind
+        self.values = values
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "none":
+            return 0.0
+        if self.kind == "fixed":
+            return self.values[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.values)
+        median, sigma = self.values
+        return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+
+class StubConfig:
+    def __init__(self, latency: str = "none", tokens_per_sec: Optional[float] = None,
+                 error_429: float = 0.0, error_500: float = 0.0, retry_after_ms: int = 250,
+                 rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 batch_seconds: float = 0.0, seed: Optional[int] = None):
+        self.latency = LatencyModel(latency)
+        self.tokens_per_sec = tokens_per_sec
+        self.error_429 = error_429
+        self.error_500 = error_500
+        self.retry_after_ms = retry_after_ms
+        self.rpm = rpm            # None: unlimited capacity
+        self.tpm = tpm
+        self.batch_seconds = batch_seconds
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+    def draw(self) -> Tuple[float, float]:
+        """(uniform draw for error injection, time to first token)."""
+        with self.rng_lock:
+            return self.rng.random(), self.latency.sample(self.rng)
+
+
+# ---------------------------
+# canned completions
+# ---------------------------
+def _request_rng(body: Dict) -> random.Random:
+    blob = json.dumps([body.get("messages"), body.get("response_format")], sort_keys=True, ensure_ascii=False)
+    return random.Random(int(hashlib.sha1(blob.encode("utf-8")).hexdigest()[:12], 16))
+
+
+def _answer(rng: random.Random) -> str:
+    return f"{rng.choice(ANSWER_OPENINGS)} {rng.choice(ANSWER_DETAILS)}"
+
+
+def _pick_option(rng: random.Random, n: int) -> int:
+    """Skewed towards the low end of the scale, like a mostly-healthy population."""
+    return min(n - 1, int(rng.expovariate(1.2)))
+
+
+def structured_reply(schema: Dict, rng: random.Random) -> str:
+    out = {}
+    for key, prop in schema.get("properties", {}).items():
+        enum = prop.get("properties", {}).get("choice", {}).get("enum") or [""]
+        out[key] = {"answer": _answer(rng), "choice": enum[_pick_option(rng, len(enum))]}
+    return json.dumps(out, ensure_ascii=False)
+
+
+def canned_reply(body: Dict) -> str:
+    """Deterministic in-character reply to a chat completion request."""
+    rng = _request_rng(body)
+    fmt = body.get("response_format") or {}
+    if fmt.get("type") == "json_schema":
+        return structured_reply(fmt["json_schema"]["schema"], rng)
+
+    messages = body.get("messages") or []
+    user = next((str(m.get("content") or "") for m in reversed(messages) if m.get("role") == "user"), "")
+    options = _OPTIONS.search(user)
+    if options:
+        labels = [o.strip().rstrip(".") for o in options.group(1).split("|")]
+        reply = f"{_answer(rng)}\nChoice: {labels[_pick_option(rng, len(labels))]}"
+        # models often keep talking after the Choice line (what --stream's early stop cuts off)
+        return reply + f"\n\n{rng.choice(ANSWER_DETAILS)}" if rng.random() < 0.3 else reply
+    rating = _RATING.search(user)
+    if rating:
+        low, high = int(rating.group(1)), int(rating.group(2))
+        return f"{_answer(rng)} Rating: {low + _pick_option(rng, high - low + 1)}"
+
+    systems = [str(m.get("content") or "") for m in messages if m.get("role") == "system"]
+    speaker_is_friend = len(systems) == 1 and re.search(r"friend|therapist", systems[0], re.IGNORECASE)
+    pool = FRIEND_LINES if speaker_is_friend else PERSONA_LINES
+    return " ".join(rng.sample(pool, rng.randint(1, 3 if pool is PERSONA_LINES else 2)))
+
+
+def apply_limits(text: str, stop: Optional[List[str]], max_tokens: Optional[int]) -> Tuple[str, str]:
+    """Cut at the first stop sequence, then at max_tokens -> (text, finish_reason)."""
+    if isinstance(stop, str):
+        stop = [stop]
+    cuts = [text.find(s) for s in stop or [] if s and s in text]
+    if cuts:
+        text = text[:min(cuts)]
+    pieces = _TOKEN.findall(text)
+    if max_tokens and len(pieces) > max_tokens:
+        return "".join(pieces[:max_tokens]), "length"
+    return text, "stop"
+
+
+def completion(body: Dict, cached: int = 0) -> Dict:
+    text, finish = apply_limits(canned_reply(body), body.get("stop"), body.get("max_tokens"))
+    prompt = prompt_tokens(body.get("messages") or [])
+    completion_tokens = count_tokens(text)
+    return {
+        "id": "chatcmpl-" + uuid.uuid4().hex[:24],
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish}],
+        "usage": {"prompt_tokens": prompt, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt + completion_tokens,
+                  "prompt_tokens_details": {"cached_tokens": min(cached, prompt)}},
+    }
+
+
+# ---------------------------
+# server state
+# ---------------------------
+class StubState:
+    """Counters, the request window for --rpm, prompt-prefix cache, files and batches."""
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.counts = collections.Counter()
+        self.window = collections.deque()   # (time, tokens) of requests in the last 60 s
+        self.prefixes = set()
+        self.files: Dict[str, str] = {}
+        self.batches: Dict[str, Dict] = {}
+
+    def admit(self, tokens: int) -> Tuple[bool, Dict[str, str]]:
+        """Record a request against the 60 s window; False if it exceeds --rpm / --tpm."""
+        cfg = self.config
+        now = time.monotonic()
+        with self.lock:
+            while self.window and now - self.window[0][0] > 60:
+                self.window.popleft()
+            used_requests = len(self.window)
+            used_tokens = sum(t for _, t in self.window)
+            over = ((cfg.rpm is not None and used_requests + 1 > cfg.rpm)
+                    or (cfg.tpm is not None and used_tokens + tokens > cfg.tpm))
+            if not over:
+                self.window.append((now, tokens))
+                used_requests += 1
+                used_tokens += tokens
+        rpm = cfg.rpm or 1_000_000
+        tpm = cfg.tpm or 1_000_000_000
+        headers = {
+            "x-ratelimit-limit-requests": str(int(rpm)),
+            "x-ratelimit-limit-tokens": str(int(tpm)),
+            "x-ratelimit-remaining-requests": str(max(0, int(rpm - used_requests))),
+            "x-ratelimit-remaining-tokens": str(max(0, int(tpm - used_tokens))),
+        }
+        return not over, headers
+
+    def cached_prefix(self, messages: List[Dict]) -> int:
+        """Emulated prompt caching: a repeated first message counts, in 128-token steps from 1024."""
+        if not messages:
+            return 0
+        first = str(messages[0].get("content") or "")
+        key = hashlib.sha1(first.encode("utf-8")).hexdigest()
+        with self.lock:
+            seen = key in self.prefixes
+            self.prefixes.add(key)
+        tokens = len(first) // 4
+        return (tokens // 128) * 128 if seen and tokens >= 1024 else 0
+
+    def count(self, **fields):
+        with self.lock:
+            self.counts.update(fields)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return dict(self.counts)
+
+
+def _multipart_file(raw: bytes, content_type: str) -> bytes:
+    """The 'file' part of a multipart/form-data upload."""
+    m = re.search(r"boundary=\"?([^\";]+)\"?", content_type)
+    if not m:
+        return raw
+    for part in raw.split(b"--" + m.group(1).encode()):
+        head, sep, data = part.partition(b"\r\n\r\n")
+        if sep and b'name="file"' in head:
+            return data[:-2] if data.endswith(b"\r\n") else data
+    return b""
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: StubState = None  # set by make_server
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, obj, headers: Optional[Dict[str, str]] = None,
+              content_type: str = "application/json"):
+        data = obj if isinstance(obj, bytes) else json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, kind: str, message: str, headers: Optional[Dict[str, str]] = None):
+        self._send(status, {"error": {"message": message, "type": kind, "param": None, "code": kind}}, headers)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("content-length") or 0))
+
+    # ---------------------------
+    # routes
+    # ---------------------------
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/stats":
+            return self._send(200, self.state.stats())
+        if path == "/v1/models":
+            return self._send(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}]})
+        m = re.fullmatch(r"/v1/files/([^/]+)/content", path)
+        if m and m.group(1) in self.state.files:
+            return self._send(200, self.state.files[m.group(1)].encode("utf-8"), content_type="application/octet-stream")
+        m = re.fullmatch(r"/v1/batches/([^/]+)", path)
+        if m and m.group(1) in self.state.batches:
+            return self._send(200, self.state.batches[m.group(1)])
+        self._error(404, "not_found", f"No route {path}")
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        raw = self._body()
+        if path == "/v1/chat/completions":
+            return self.chat(json.loads(raw or b"{}"))
+        if path == "/v1/files":
+            return self.upload(raw)
+        if path == "/v1/batches":
+            return self.create_batch(json.loads(raw or b"{}"))
+        self._error(404, "not_found", f"No route {path}")
+
+    def chat(self, body: Dict):
+        state, cfg = self.state, self.state.config
+        state.count(requests=1)
+        draw, ttft = cfg.draw()
+        admitted, headers = state.admit(prompt_tokens(body.get("messages") or []) + (body.get("max_tokens") or 200))
+        retry = {"retry-after-ms": str(cfg.retry_after_ms)}
+        if not admitted:
+            state.count(capacity_429=1)
+            return self._error(429, "rate_limit_exceeded", "Stub capacity exceeded (--rpm/--tpm)", {**headers, **retry})
+        if draw < cfg.error_429:
+            state.count(injected_429=1)
+            return self._error(429, "rate_limit_exceeded", "Injected rate limit", {**headers, **retry})
+        if draw < cfg.error_429 + cfg.error_500:
+            state.count(injected_500=1)
+            return self._error(500, "server_error", "Injected server error", headers)
+
+        resp = completion(body, state.cached_prefix(body.get("messages") or []))
+        usage = resp["usage"]
+        state.count(ok=1, prompt_tokens=usage["prompt_tokens"], completion_tokens=usage["completion_tokens"])
+        per_token = 1.0 / cfg.tokens_per_sec if cfg.tokens_per_sec else 0.0
+        if body.get("stream"):
+            state.count(streamed=1)
+            return self.stream(body, resp, ttft, per_token, headers)
+        time.sleep(ttft + per_token * usage["completion_tokens"])
+        self._send(200, resp, headers)
+
+    def stream(self, body: Dict, resp: Dict, ttft: float, per_token: float, headers: Dict[str, str]):
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("connection", "close")
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        base = {"id": resp["id"], "object": "chat.completion.chunk", "created": resp["created"], "model": resp["model"]}
+        choice = resp["choices"][0]
+
+        def event(obj):
+            self.wfile.write(b"data: " + json.dumps(obj).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+        try:
+            time.sleep(ttft)
+            for piece in _TOKEN.findall(choice["message"]["content"]):
+                event({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+                if per_token:
+                    time.sleep(per_token)
+            event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": choice["finish_reason"]}]})
+            if (body.get("stream_options") or {}).get("include_usage"):
+                event({**base, "choices": [], "usage": resp["usage"]})
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.state.count(stream_cancelled=1)  # the client stopped reading (early stop)
+
+    def upload(self, raw: bytes):
+        file_id = "file-" + uuid.uuid4().hex[:24]
+        data = _multipart_file(raw, self.headers.get("content-type", ""))
+        self.state.files[file_id] = data.decode("utf-8")
+        self._send(200, {"id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                         "filename": "requests.jsonl", "purpose": "batch", "status": "processed"})
+
+    def create_batch(self, body: Dict):
+        state = self.state
+        batch_id = "batch_" + uuid.uuid4().hex[:24]
+        lines = [json.loads(l) for l in state.files.get(body.get("input_file_id"), "").splitlines() if l.strip()]
+        batch = {"id": batch_id, "object": "batch", "endpoint": body.get("endpoint"),
+                 "input_file_id": body.get("input_file_id"), "completion_window": body.get("completion_window"),
+                 "status": "in_progress", "created_at": int(time.time()), "output_file_id": None,
+                 "error_file_id": None, "request_counts": {"total": len(lines), "completed": 0, "failed": 0}}
+        state.batches[batch_id] = batch
+        state.count(batches=1, batch_requests=len(lines))
+
+        def run():
+            time.sleep(state.config.batch_seconds)
+            out = [json.dumps({"id": "batch_req_" + uuid.uuid4().hex[:12], "custom_id": line["custom_id"],
+                               "response": {"status_code": 200, "request_id": uuid.uuid4().hex,
+                                            "body": completion(line["body"])},
+                               "error": None}) for line in lines]
+            output_id = "file-" + uuid.uuid4().hex[:24]
+            state.files[output_id] = "\n".join(out)
+            batch.update(status="completed", output_file_id=output_id,
+                         request_counts={"total": len(lines), "completed": len(lines), "failed": 0})
+        threading.Thread(target=run, daemon=True).start()
+        self._send(200, batch)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def stats(self) -> Dict:
+        return self.RequestHandlerClass.state.stats()
+
+
+def make_server(config: StubConfig, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> StubServer:
+    handler = type("BoundStubHandler", (StubHandler,), {"state": StubState(config)})
+    return StubServer((host, port), handler)
+
+
+def start_server(config: StubConfig, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> StubServer:
+    """Serve on a daemon thread (port=0 picks a free port); stop with server.shutdown()."""
+    server = make_server(config, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_stub_args(parser):
+    """Latency / token-rate / error-injection flags shared by stub_server.py and loadgen.py."""
+    parser.add_argument("--latency", default="none",
+                        help="time to first token: none, fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA (seconds)")
+    parser.add_argument("--tokens-per-sec", type=float, default=None,
+                        help="emulated generation speed; completion tokens add 1/rate seconds each")
+    parser.add_argument("--error-429", type=float, default=0.0, help="probability of an injected 429 per request")
+    parser.add_argument("--error-500", type=float, default=0.0, help="probability of an injected 500 per request")
+    parser.add_argument("--retry-after-ms", type=int, default=250, help="Retry-After sent with 429s")
+    parser.add_argument("--rpm", type=float, default=None, help="emulated capacity, requests/minute (default: unlimited)")
+    parser.add_argument("--tpm", type=float, default=None, help="emulated capacity, tokens/minute (default: unlimited)")
+    parser.add_argument("--batch-seconds", type=float, default=0.0, help="how long a batch stays in_progress")
+    parser.add_argument("--seed", type=int, default=None, help="seed for latency and error draws")
+
+
+def config_from_args(args) -> StubConfig:
+    try:
+        return StubConfig(args.latency, args.tokens_per_sec, args.error_429, args.error_500, args.retry_after_ms,
+                          args.rpm, args.tpm, args.batch_seconds, args.seed)
+    except ValueError as e:
+        raise SystemExit(f"--latency: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in for offline load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    add_stub_args(parser)
+    args = parser.parse_args(argv)
+    server = make_server(config_from_args(args), args.host, args.port)
+    print(f"Stub server on {server.url} (latency {args.latency}, "
+          f"429 {args.error_429:.1%}, 500 {args.error_500:.1%}); Ctrl-C to stop")
+    print(f"  OPENAI_BASE_URL={server.url} OPENAI_API_KEY=stub python all_in_one.py ...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{server.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+JSONL transcript format: one event per line, appended as the conversation
+happens, plus streaming readers and a converter to and from the JSON layout
+the runners have always written.
+
+A Q&A file (<SCALE>/Question based Conversation/<name>.jsonl):
+{"event": "header", "kind": "questionnaire", "scale": "PHQ9", "character": "Jane Doe"}
+{"event": "qa", "question_id": 1, "question": "Little interest ...?", "answer": "..."}
+...
+{"event": "footer", "count": 9}
+
+A conversation (Casual/<name>.jsonl):
+{"event": "header", "kind": "casual", "character": "Jane Doe", "friend_profile": ..., "started_at": ...}
+{"event": "turn", "turn": 1, "speaker": "Friend", "role": "Friend", "text": "..."}
+...
+{"event": "footer", "count": 80, "finished_at": "..."}
+
+Header fields are the JSON file's top-level fields before its list, footer
+fields the ones after it, so converting JSON -> JSONL -> JSON gives the same
+file (older Q&A files without "character" gain one). A file without a footer
+is still being written (or its run died): load_transcript refuses it unless
+require_footer=False, iter_transcripts skips it, and iter_answers / iter_turns
+yield what it holds so far. All readers stop at a torn last line.
+
+Runners that build a transcript as they go append it with TranscriptWriter:
+each event is fsync'd to <name>.jsonl.part as it happens, and finish() adds
+the footer and moves the file into place.
+
+The readers are generators: iter_transcripts / iter_answers / iter_turns hold
+one file's events at a time and walk a folder with os.scandir, so memory
+stays flat however many files a run directory holds (files come in directory
+order, not sorted).
+
+Usage:
+------
+from transcript_jsonl import TranscriptWriter, iter_answers, load_transcript, save_transcript
+
+writer = TranscriptWriter("Conversations/Casual/Jane_Doe.jsonl", transcript)   # header from its fields
+writer.turn("Friend", "Friend", "Hey, how have you been?")
+writer.finish(transcript)                                                      # footer, then moved into place
+
+for persona, scale, question_id, question, answer in iter_answers("Conversations/PHQ9/Question based Conversation"):
+    ...
+data = load_transcript("Conversations/Casual/Jane_Doe.jsonl")   # same dict as the .json file
+save_transcript("Conversations/Casual/Jane_Doe.jsonl", data)
+
+python transcript_jsonl.py to-jsonl Conversations               # convert every transcript in place
+python transcript_jsonl.py to-json Conversations --keep         # back again, keeping the .jsonl files
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from turn_journal import TurnJournal
+
+TRANSCRIPT_EXTENSIONS = (".json", ".jsonl")
+# The list that holds a file's items, per kind
+ITEMS_KEY = {"questionnaire": "Common Questions", "casual": "turns"}
+
+
+def is_transcript(fname: str) -> bool:
+    return fname.lower().endswith(TRANSCRIPT_EXTENSIONS)
+
+
+# ---------------------------
+# events <-> JSON layout
+# ---------------------------
+def header_event(data: Dict, kind: str, character: Optional[str] = None) -> Dict:
+    """
+    The header of `data` (JSON layout): its top-level fields before the item list.
+    A Q&A header always names its persona: `character`, or the key beside "Consultant".
+    """
+    fields = {}
+    for key, value in data.items():
+        if key == ITEMS_KEY[kind]:
+            break
+        fields[key] = value
+    if kind == "questionnaire" and "character" not in fields:
+        fields["character"] = character or qa_character(data[ITEMS_KEY[kind]])
+    return {"event": "header", "kind": kind, **fields}
+
+
+def footer_event(data: Dict, kind: str) -> Dict:
+    """The footer of `data`: the item count and the top-level fields after the item list."""
+    keys = list(data)
+    after = keys[keys.index(ITEMS_KEY[kind]) + 1:]
+    return {"event": "footer", "count": len(data[ITEMS_KEY[kind]]), **{k: data[k] for k in after}}
+
+
+def qa_character(rows: List[Dict]) -> Optional[str]:
+    """The persona of a Q&A list: the key beside "Consultant"."""
+    for key in rows[0] if rows else []:
+        if key != "Consultant":
+            return key
+    return None
+
+
+def qa_event(question_id, question: str, answer: str) -> Dict:
+    return {"event": "qa", "question_id": question_id, "question": question, "answer": answer}
+
+
+def turn_event(turn: int, speaker: str, role: str, text: str) -> Dict:
+    return {"event": "turn", "turn": turn, "speaker": speaker, "role": role, "text": text}
+
+
+def transcript_kind(data: Dict) -> str:
+    return "casual" if "turns" in data else "questionnaire"
+
+
+def to_events(data: Dict, question_ids: Optional[List] = None) -> Iterator[Dict]:
+    """JSON layout -> events; Q&A items are numbered 1.. unless `question_ids` are given."""
+    kind = transcript_kind(data)
+    header = header_event(data, kind)
+    yield header
+    if kind == "questionnaire":
+        name = header["character"]
+        rows = data["Common Questions"]
+        for question_id, row in zip(question_ids or range(1, len(rows) + 1), rows):
+            yield qa_event(question_id, row.get("Consultant", ""), row.get(name, ""))
+    else:
+        for i, t in enumerate(data["turns"], start=1):
+            role = "Persona" if t["speaker"] == data.get("character") else t["speaker"]
+            yield turn_event(i, t["speaker"], role, t["text"])
+    yield footer_event(data, kind)
+
+
+def from_events(events) -> Tuple[Dict, bool]:
+    """Events -> (JSON layout dict, complete); complete is False without a footer."""
+    data: Dict = {}
+    items: List[Dict] = []
+    kind, name, footer = None, None, None
+    for event in events:
+        tag = event.get("event")
+        if tag == "header":
+            kind = event.get("kind", "casual")
+            data = {k: v for k, v in event.items() if k not in ("event", "kind")}
+            name = data.get("character")
+        elif tag == "qa":
+            items.append({"Consultant": event["question"], name: event["answer"]})
+        elif tag == "turn":
+            speaker = event.get("speaker") or ("Friend" if event.get("role") == "Friend" else name)
+            items.append({"speaker": speaker, "text": event["text"]})
+        elif tag == "footer":
+            footer = {k: v for k, v in event.items() if k not in ("event", "count")}
+    if kind is None:
+        raise ValueError("no header event")
+    data[ITEMS_KEY[kind]] = items
+    data.update(footer or {})
+    return data, footer is not None
+
+
+# ---------------------------
+# files
+# ---------------------------
+def iter_lines(lines) -> Iterator[Dict]:
+    """Events of JSONL lines; stops at a torn (unparsable) line."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            return  # torn write from a crash; everything before it is good
+
+
+def iter_events(path: str) -> Iterator[Dict]:
+    """Events of one .jsonl transcript, read line by line."""
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter_lines(f)
+
+
+def parse_transcript(text: str, path: str) -> Dict:
+    """JSON layout of a transcript file's content; `path` decides the format."""
+    if path.lower().endswith(".jsonl"):
+        data, complete = from_events(iter_lines(text.splitlines()))
+        if not complete:
+            raise ValueError(f"{path} has no footer (still being written?)")
+        return data
+    return json.loads(text)
+
+
+def load_transcript(path: str, require_footer: bool = True) -> Dict:
+    """A .json or .jsonl transcript in the JSON layout."""
+    if path.lower().endswith(".jsonl"):
+        data, complete = from_events(iter_events(path))
+        if require_footer and not complete:
+            raise ValueError(f"{path} has no footer (still being written?)")
+        return data
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_transcript(path: str, data: Dict, question_ids: Optional[List] = None):
+    """Write `data` (JSON layout) as .json or .jsonl by extension, via a temp file."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        if path.lower().endswith(".jsonl"):
+            for event in to_events(data, question_ids):
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        else:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class TranscriptWriter:
+    """
+    A .jsonl transcript appended event by event while the conversation runs.
+    Events are fsync'd to <path>.part (a TurnJournal); finish() adds the footer
+    and moves it to `path`, so a crash never leaves a footer-less file under
+    the final name. A stale .part from a crashed run is discarded.
+    """
+
+    def __init__(self, path: str, data: Dict, character: Optional[str] = None):
+        self.path = path
+        self.kind = transcript_kind(data)
+        self.count = 0
+        self.journal = TurnJournal(f"{path}.part")
+        self.journal.remove()
+        self.journal.append(header_event(data, self.kind, character))
+
+    def qa(self, question_id, question: str, answer: str):
+        self._add(qa_event(question_id, question, answer))
+
+    def turn(self, speaker: str, role: str, text: str):
+        self._add(turn_event(self.count + 1, speaker, role, text))
+
+    def _add(self, event: Dict):
+        self.journal.append(event)
+        self.count += 1
+
+    def finish(self, data: Dict):
+        """Append the footer (`data`'s fields after its item list) and move the file into place."""
+        self.journal.append(footer_event(data, self.kind))
+        os.replace(self.journal.path, self.path)
+
+
+def add_transcript_args(parser):
+    """--transcript-format flag for the runners."""
+    parser.add_argument("--transcript-format", choices=["json", "jsonl"], default="json",
+                        help="jsonl: one event per line, appended as the conversation happens (see transcript_jsonl.py)")
+
+
+# ---------------------------
+# streaming over folders
+# ---------------------------
+def iter_transcript_paths(folder: str) -> Iterator[str]:
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if is_transcript(entry.name) and entry.is_file():
+                yield entry.path
+
+
+def iter_transcripts(folder: str, skip_errors: bool = True) -> Iterator[Tuple[str, Dict]]:
+    """(path, JSON layout) of every .json / .jsonl transcript in `folder`, one file at a time."""
+    for path in iter_transcript_paths(folder):
+        try:
+            yield path, load_transcript(path)
+        except (OSError, ValueError):
+            if not skip_errors:
+                raise
+
+
+def _file_events(path: str) -> Iterator[Dict]:
+    """Events of a .json or .jsonl file (a .json file is converted in memory)."""
+    if path.lower().endswith(".jsonl"):
+        return iter_events(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return to_events(json.load(f))
+
+
+def iter_answers(folder: str, scale: Optional[str] = None) -> Iterator[Tuple[str, str, int, str, str]]:
+    """
+    (persona, scale, question_id, question, answer) of every Q&A transcript in
+    `folder`. Answers of a .jsonl file are yielded as they are read, so files
+    without a footer contribute what they hold so far; unreadable files are skipped.
+    """
+    for path in iter_transcript_paths(folder):
+        try:
+            name, file_scale = None, scale
+            for event in _file_events(path):
+                if event.get("event") == "header":
+                    name, file_scale = event.get("character"), event.get("scale", scale)
+                elif event.get("event") == "qa":
+                    yield name, file_scale, event["question_id"], event["question"], event["answer"]
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+
+
+def iter_turns(folder: str) -> Iterator[Tuple[str, int, str, str]]:
+    """(persona, turn, speaker, text) of every conversation transcript in `folder`."""
+    for path in iter_transcript_paths(folder):
+        try:
+            name = None
+            for event in _file_events(path):
+                if event.get("event") == "header":
+                    name = event.get("character")
+                elif event.get("event") == "turn":
+                    yield name, event["turn"], event["speaker"], event["text"]
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+
+
+# ---------------------------
+# converter
+# ---------------------------
+def convert_tree(root: str, to: str, keep: bool = False) -> Dict[str, int]:
+    """
+    Convert every transcript under `root` (a file or a folder, recursively) to
+    `to` ("json" or "jsonl"), next to the original; the original is removed
+    unless `keep`. Files that don't parse, and .jsonl files without a footer,
+    are left alone.
+    """
+    src_ext, dst_ext = (".jsonl", ".json") if to == "json" else (".json", ".jsonl")
+    counts = {"converted": 0, "skipped": 0}
+    paths = [root] if os.path.isfile(root) else (
+        os.path.join(d, f) for d, _, files in os.walk(root) for f in sorted(files))
+    for path in paths:
+        if not path.lower().endswith(src_ext):
+            continue
+        try:
+            data = load_transcript(path)
+            kind = transcript_kind(data)
+            if not isinstance(data.get(ITEMS_KEY[kind]), list):
+                raise ValueError("not a transcript")
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            counts["skipped"] += 1
+            continue
+        save_transcript(path[:-len(src_ext)] + dst_ext, data)
+        if not keep:
+            os.remove(path)
+        counts["converted"] += 1
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert transcripts between the JSON and JSONL layouts")
+    parser.add_argument("to", choices=["to-jsonl", "to-json"])
+    parser.add_argument("paths", nargs="+", help="transcript files or folders (searched recursively)")
+    parser.add_argument("--keep", action="store_true", help="keep the original files")
+    args = parser.parse_args(argv)
+    to = args.to.split("-", 1)[1]
+    for root in args.paths:
+        print(f"{root}: {convert_tree(root, to, args.keep)}")
+
+if __name__ == "__main__":
+    main()
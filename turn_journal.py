@@ -0,0 +1,67 @@
+"""
+Append-only per-conversation journal.
+
+Each event is one JSON line, flushed and fsync'd as soon as it is written,
+so a crash or Ctrl-C loses at most the turn that was in flight. A torn
+last line (the process died mid-write) is ignored on read.
+
+Usage:
+------
+from turn_journal import TurnJournal
+
+journal = TurnJournal("Conversations/Journal/Casual/Jane_Doe.jsonl")
+header, turns = journal.read()          # (None, []) if nothing journaled yet
+if header is None:
+    journal.append({"event": "header", "started_at": ...})
+journal.append({"event": "turn", "speaker": "Friend", "text": "..."})
+journal.remove()                         # once the final transcript is saved
+"""
+
+from __future__ import annotations
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+
+class TurnJournal:
+    def __init__(self, path: str):
+        self.path = path
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def read(self) -> Tuple[Optional[Dict], List[Dict]]:
+        """Return (header event, turn events) committed so far."""
+        header, turns = None, []
+        if not self.exists():
+            return header, turns
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # torn write from a crash; everything before it is good
+                if event.get("event") == "header":
+                    header = event
+                elif event.get("event") == "turn":
+                    turns.append(event)
+        return header, turns
+
+    def append(self, event: Dict):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Drop a torn tail first so the new event starts on its own line.
+        if self.exists() and os.path.getsize(self.path) > 0:
+            with open(self.path, "rb+") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.seek(0)
+                    data = f.read()
+                    f.truncate(data.rfind(b"\n") + 1)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self):
+        if self.exists():
+            os.remove(self.path)
@@ -0,0 +1,324 @@
+"""
+Durable persona job queue in a SQLite file, shared by worker processes.
+
+Static sharding (--shard) fixes each machine's personas up front, so the
+machine that draws the long conversations finishes last while the others
+sit idle. With a queue, every worker pulls the next pending persona when
+it is free. A claimed job carries a lease that the worker's heartbeat
+thread keeps extending; if a worker dies, its lease runs out and the next
+claim puts the job back in play (resuming from the casual-chat journal).
+
+Jobs are keyed by (queue, key), so enqueueing is idempotent: every worker
+can be started with the same command, the first one fills the queue and
+the rest find the jobs already there. The database uses a rollback
+journal rather than WAL so it also works on a shared (network) filesystem;
+the write rate is a few statements per persona.
+
+Usage:
+------
+from work_queue import WorkQueue, Heartbeat
+
+queue = WorkQueue("Queue/jobs.sqlite")
+queue.enqueue("all_in_one", [(p["name"], {"persona": p["name"]}) for p in personas])
+for job in queue.jobs("all_in_one", worker_id()):   # ends when nothing is pending or running
+    with Heartbeat(queue, job) as hb:
+        ...run job.key...
+    if hb.lost or not queue.complete(job):   # or queue.fail(job, "error text")
+        ...another worker took the job over...
+
+python work_queue.py status                  # pending / running / done / failed, jobs per minute
+python work_queue.py requeue --failed        # put failed jobs back to pending
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_QUEUE_PATH = os.path.join("Queue", "jobs.sqlite")
+LEASE_SECONDS = 300        # a job whose lease is this old is reclaimed by the next claim
+HEARTBEAT_SECONDS = 30     # how often a running job's lease is extended
+MAX_ATTEMPTS = 3           # claims (incl. reclaims after a crash) before a job is marked failed
+HEARTBEAT_RETRY_SECONDS = 5  # retry delay after a heartbeat hit a database error (e.g. "database is locked")
+RATE_WINDOW_SECONDS = 600  # "recent" jobs-per-minute window of the status report
+
+STATES = ("pending", "running", "done", "failed")
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Job:
+    def __init__(self, row: sqlite3.Row):
+        self.id = row["id"]
+        self.queue = row["queue"]
+        self.key = row["key"]
+        self.payload = json.loads(row["payload"])
+        self.attempts = row["attempts"]
+        self.worker = row["worker"]
+
+    def __repr__(self):
+        return f"Job({self.queue}/{self.key}, attempt {self.attempts})"
+
+
+class WorkQueue:
+    """SQLite job table with leases; safe to share between threads and processes."""
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, lease_seconds: float = LEASE_SECONDS,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # autocommit; claims use explicit BEGIN IMMEDIATE so two workers never take the same job
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=60, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " queue TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " state TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " worker TEXT,"
+            " lease_until REAL,"
+            " enqueued_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " error TEXT,"
+            " UNIQUE (queue, key))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (queue, state, id)")
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn()
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            return result
+
+    def enqueue(self, queue: str, items: Iterable[Tuple[str, Dict]]) -> int:
+        """Add (key, payload) jobs; keys already in the queue are left alone. Returns the number added."""
+        now = time.time()
+        rows = [(queue, key, json.dumps(payload, ensure_ascii=False), now) for key, payload in items]
+
+        def insert():
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO jobs (queue, key, payload, enqueued_at) VALUES (?, ?, ?, ?)", rows)
+            return self._db.total_changes - before
+        return self._transaction(insert)
+
+    def reclaim_expired(self, queue: str) -> int:
+        """Jobs whose lease ran out go back to pending (or to failed after max_attempts)."""
+        now = time.time()
+
+        def reclaim():
+            expired = "queue = ? AND state = 'running' AND lease_until < ?"
+            failed = self._db.execute(
+                f"UPDATE jobs SET state = 'failed', worker = NULL, lease_until = NULL, finished_at = ?,"
+                f" error = 'lease expired after ' || attempts || ' attempts' WHERE {expired} AND attempts >= ?",
+                (now, queue, now, self.max_attempts)).rowcount
+            requeued = self._db.execute(
+                f"UPDATE jobs SET state = 'pending', worker = NULL, lease_until = NULL WHERE {expired}",
+                (queue, now)).rowcount
+            return failed + requeued
+        return self._transaction(reclaim)
+
+    def claim(self, queue: str, worker: str) -> Optional[Job]:
+        """Lease the oldest pending job to `worker`, or None when nothing is pending."""
+        self.reclaim_expired(queue)
+        now = time.time()
+
+        def take():
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE queue = ? AND state = 'pending' ORDER BY id LIMIT 1", (queue,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET state = 'running', worker = ?, attempts = attempts + 1, lease_until = ?,"
+                " started_at = COALESCE(started_at, ?), error = NULL WHERE id = ?",
+                (worker, now + self.lease_seconds, now, row["id"]))
+            return Job(self._db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+        return self._transaction(take)
+
+    def jobs(self, queue: str, worker: str, poll: float = HEARTBEAT_SECONDS):
+        """
+        Yield claimed jobs until the queue is drained. While other workers
+        still hold jobs, keep polling: if one of them dies, its job is
+        reclaimed here once the lease runs out.
+        """
+        while True:
+            job = self.claim(queue, worker)
+            if job is not None:
+                yield job
+                continue
+            with self._lock:
+                running = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE queue = ? AND state = 'running'", (queue,)).fetchone()[0]
+            if not running:
+                return
+            time.sleep(poll)
+
+    def _owned_update(self, job: Job, sql: str, params: tuple) -> bool:
+        """Run an UPDATE on `job` only while this worker still holds its lease."""
+        with self._lock:
+            cur = self._db.execute(f"{sql} WHERE id = ? AND state = 'running' AND worker = ?",
+                                   params + (job.id, job.worker))
+        return cur.rowcount == 1
+
+    def heartbeat(self, job: Job) -> bool:
+        """Extend the lease; False if it expired and the job was reclaimed by someone else."""
+        return self._owned_update(job, "UPDATE jobs SET lease_until = ?",
+                                  (time.time() + self.lease_seconds,))
+
+    def complete(self, job: Job) -> bool:
+        return self._owned_update(job, "UPDATE jobs SET state = 'done', lease_until = NULL, finished_at = ?",
+                                  (time.time(),))
+
+    def fail(self, job: Job, error: str, retry: bool = True) -> bool:
+        """Record an error; the job goes back to pending unless `retry` is off or attempts ran out."""
+        state = "pending" if retry and job.attempts < self.max_attempts else "failed"
+        return self._owned_update(
+            job, "UPDATE jobs SET state = ?, worker = NULL, lease_until = NULL, error = ?, finished_at = ?",
+            (state, error, time.time() if state == "failed" else None))
+
+    def release(self, job: Job) -> bool:
+        """Give the job back untouched (e.g. on Ctrl-C); the attempt is not counted."""
+        return self._owned_update(
+            job, "UPDATE jobs SET state = 'pending', worker = NULL, lease_until = NULL, attempts = attempts - 1", ())
+
+    def requeue(self, queue: Optional[str] = None, states: Iterable[str] = ("failed",)) -> int:
+        """Put jobs in `states` back to pending with a fresh attempt count."""
+        states = list(states)
+        where = f"state IN ({', '.join('?' for _ in states)})" + (" AND queue = ?" if queue else "")
+        params = tuple(states) + ((queue,) if queue else ())
+        with self._lock:
+            return self._db.execute(
+                "UPDATE jobs SET state = 'pending', attempts = 0, worker = NULL, lease_until = NULL,"
+                f" started_at = NULL, finished_at = NULL, error = NULL WHERE {where}", params).rowcount
+
+    def queues(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._db.execute("SELECT DISTINCT queue FROM jobs ORDER BY queue")]
+
+    def status(self, queue: str, window: float = RATE_WINDOW_SECONDS) -> Dict:
+        """Counts per state, expired leases, and jobs finished per minute (recent window and overall)."""
+        now = time.time()
+        with self._lock:
+            counts = dict.fromkeys(STATES, 0)
+            for row in self._db.execute("SELECT state, COUNT(*) FROM jobs WHERE queue = ? GROUP BY state", (queue,)):
+                counts[row[0]] = row[1]
+            expired = self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE queue = ? AND state = 'running' AND lease_until < ?",
+                (queue, now)).fetchone()[0]
+            workers = self._db.execute(
+                "SELECT COUNT(DISTINCT worker) FROM jobs WHERE queue = ? AND state = 'running'", (queue,)).fetchone()[0]
+            first, last = self._db.execute(
+                "SELECT MIN(started_at), MAX(finished_at) FROM jobs WHERE queue = ? AND state = 'done'",
+                (queue,)).fetchone()
+            recent = self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE queue = ? AND state = 'done' AND finished_at >= ?",
+                (queue, now - window)).fetchone()[0]
+        overall = counts["done"] / ((last - first) / 60) if counts["done"] and last > first else None
+        return {
+            **counts,
+            "expired_leases": expired,
+            "workers": workers,
+            "jobs_per_min_recent": round(recent / (window / 60), 2),
+            "jobs_per_min_overall": round(overall, 2) if overall is not None else None,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class Heartbeat:
+    """Context manager: a daemon thread extends `job`'s lease every `interval` seconds."""
+
+    def __init__(self, queue: WorkQueue, job: Job, interval: float = HEARTBEAT_SECONDS):
+        self.queue = queue
+        self.job = job
+        self.interval = interval
+        self.lost = False  # the lease expired and someone else may be running the job
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        wait = self.interval
+        while not self._stop.wait(wait):
+            try:
+                owned = self.queue.heartbeat(self.job)
+            except sqlite3.Error as e:
+                # transient (locked / busy database); the lease outlasts a few missed beats
+                print(f"⚠️  heartbeat for {self.job.key} failed ({e}); retrying")
+                wait = min(self.interval, HEARTBEAT_RETRY_SECONDS)
+                continue
+            wait = self.interval
+            if not owned:
+                self.lost = True
+                print(f"⚠️  lost the lease on {self.job.key}; another worker may take it over")
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+def add_queue_args(parser):
+    """--queue / --lease-seconds flags for runners that can pull persona jobs."""
+    parser.add_argument("--queue", nargs="?", const=DEFAULT_QUEUE_PATH, default=None, metavar="PATH",
+                        help="enqueue the personas once, then pull jobs from this SQLite queue until it is drained "
+                             f"(default path: {DEFAULT_QUEUE_PATH}); start as many workers as you like")
+    parser.add_argument("--lease-seconds", type=float, default=LEASE_SECONDS,
+                        help="a job not heartbeated for this long is reclaimed by another worker")
+
+
+def format_status(queue: str, status: Dict) -> str:
+    rate = status["jobs_per_min_overall"]
+    return (f"{queue}: {status['pending']} pending, {status['running']} running "
+            f"({status['workers']} workers, {status['expired_leases']} expired leases), "
+            f"{status['done']} done, {status['failed']} failed | "
+            f"{status['jobs_per_min_recent']} jobs/min last {RATE_WINDOW_SECONDS // 60} min, "
+            f"{rate if rate is not None else '-'} jobs/min overall")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or reset the persona job queue")
+    parser.add_argument("command", choices=["status", "requeue"])
+    parser.add_argument("--path", default=DEFAULT_QUEUE_PATH, help=f"queue file (default: {DEFAULT_QUEUE_PATH})")
+    parser.add_argument("--queue", default=None, help="one queue name (default: every queue in the file)")
+    parser.add_argument("--failed", action="store_true", help="requeue: failed jobs (the default)")
+    parser.add_argument("--done", action="store_true", help="requeue: finished jobs too, to run them again")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        raise SystemExit(f"No queue at {args.path}")
+    queue = WorkQueue(args.path)
+    if args.command == "requeue":
+        states = ["failed"] * (args.failed or not args.done) + ["done"] * args.done
+        print(f"Requeued {queue.requeue(args.queue, states)} jobs.")
+    for name in [args.queue] if args.queue else queue.queues():
+        print(format_status(name, queue.status(name)))
+
+if __name__ == "__main__":
+    main()